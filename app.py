@@ -1,17 +1,38 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session
+from flask import Flask, render_template, request, jsonify, send_from_directory, redirect, url_for, flash, session, Response, stream_with_context, g, after_this_request
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from sqlalchemy import create_engine, delete, make_url, select, update, event as sqlalchemy_event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession, make_transient_to_detached, object_session
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import glob
 import json
+import math
 import os
 import random
 import re
-from datetime import datetime
+import atexit
+import string
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 import uuid
 from dotenv import load_dotenv
-import google.generativeai as genai
+try:
+    import fcntl
+except ImportError:  # Windows - chat spool files are not locked
+    fcntl = None
 import logging
 import bcrypt
+import click
 
 # Load environment variables
 load_dotenv()
@@ -30,10 +51,78 @@ else:
 
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Engine tuning profiles, chosen with DB_ENGINE_PROFILE. SQLite pragmas run on every new
+# connection; PostgreSQL gets pool options plus a per-connection statement timeout.
+SQLITE_WAL_PRAGMAS = {
+    'journal_mode': 'WAL',        # readers no longer block the writer (and vice versa)
+    'synchronous': 'NORMAL',      # fsync at checkpoints, not every commit - safe with WAL
+    'busy_timeout': 5000,         # wait for the write lock instead of failing "database is locked"
+    'mmap_size': 268435456,       # 256 MB of the file read through memory mapping
+    'cache_size': -20000,         # ~20 MB page cache per connection
+}
+DB_ENGINE_PROFILES = {
+    # Driver and SQLAlchemy defaults - how the app ran before profiles existed
+    'baseline': {'sqlite_pragmas': {}, 'postgresql': {}},
+    # Long-running server processes
+    'server': {
+        'sqlite_pragmas': SQLITE_WAL_PRAGMAS,
+        'postgresql': {'pool_size': 10, 'max_overflow': 20, 'pool_timeout': 10, 'pool_pre_ping': True,
+                       'pool_recycle': 1800, 'statement_timeout_ms': 15000},
+    },
+    # Short-lived serverless instances (Vercel): few connections each, recycled quickly
+    'serverless': {
+        'sqlite_pragmas': SQLITE_WAL_PRAGMAS,
+        'postgresql': {'pool_size': 1, 'max_overflow': 2, 'pool_timeout': 10, 'pool_pre_ping': True,
+                       'pool_recycle': 300, 'statement_timeout_ms': 10000},
+    },
+}
+
+def engine_profile_settings(url, profile_name):
+    """(create_engine options, statements run on each new connection) for url under the named profile"""
+    profile = DB_ENGINE_PROFILES[profile_name]
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return {}, [f"PRAGMA {name}={value}" for name, value in profile['sqlite_pragmas'].items()]
+    if backend == 'postgresql':
+        options = dict(profile['postgresql'])
+        timeout_ms = options.pop('statement_timeout_ms', None)
+        return options, ([f"SET statement_timeout = {int(timeout_ms)}"] if timeout_ms else [])
+    return {}, []
+
+def tune_engine(engine, statements):
+    """Run the profile's statements on every new DBAPI connection the engine opens"""
+    if not statements:
+        return engine
+    
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+        dbapi_connection.commit()  # keep SET outside the first transaction's rollback
+    
+    sqlalchemy_event.listen(engine, 'connect', on_connect)
+    return engine
+
+def create_tuned_engine(url, profile_name, **kwargs):
+    """create_engine() with the named profile's options and per-connection statements"""
+    options, statements = engine_profile_settings(url, profile_name)
+    return tune_engine(create_engine(url, **{**options, **kwargs}), statements)
+
+db_engine_profile = os.getenv('DB_ENGINE_PROFILE') or ('serverless' if os.getenv('VERCEL') else 'server')
+if db_engine_profile not in DB_ENGINE_PROFILES:
+    print(f"⚠️ Unknown DB_ENGINE_PROFILE '{db_engine_profile}', using 'server'")
+    db_engine_profile = 'server'
+db_engine_options, db_connect_statements = engine_profile_settings(
+    app.config['SQLALCHEMY_DATABASE_URI'], db_engine_profile)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_engine_options
+
 CORS(app)
 
 # Initialize database and login manager
 db = SQLAlchemy(app)
+with app.app_context():
+    tune_engine(db.engine, db_connect_statements)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -61,7 +150,21 @@ class ChatHistory(db.Model):
     response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     mood = db.Column(db.String(50))
-    session_id = db.Column(db.String(100))
+    session_id = db.Column(db.String(100), index=True)
+    
+    # Every hot query filters by user and sorts by time (/profile, /user-insights)
+    __table_args__ = (db.Index('ix_chat_history_user_id_timestamp', 'user_id', 'timestamp'),)
+
+class UserChatStats(db.Model):
+    """Per-user ChatHistory counters, updated in the same transaction as each chat insert
+
+    The first /profile page reads this one row instead of aggregating the user's whole history.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_chats = db.Column(db.Integer, nullable=False, default=0)
+    active_days = db.Column(db.Integer, nullable=False, default=0)  # distinct ChatHistory.timestamp.date()
+    first_chat_at = db.Column(db.DateTime)
+    last_chat_at = db.Column(db.DateTime)
 
 class MoodEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,7 +174,10 @@ class MoodEntry(db.Model):
     mood_intensity = db.Column(db.Integer, nullable=False)  # 1-5 scale
     notes = db.Column(db.Text)  # Optional user notes
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    session_id = db.Column(db.String(100))  # For anonymous users
+    session_id = db.Column(db.String(100), index=True)  # For anonymous users
+    
+    # Latest entries per user (mood context, chat interface, mood history)
+    __table_args__ = (db.Index('ix_mood_entry_user_id_timestamp', 'user_id', 'timestamp'),)
     
     def to_dict(self):
         return {
@@ -84,9 +190,75 @@ class MoodEntry(db.Model):
             'user_id': self.user_id
         }
 
+# How positive each mood label is (0 = very negative, 1 = very positive); unknown labels count as neutral
+MOOD_VALENCE = {
+    'happy': 1.0, 'excited': 1.0, 'content': 0.8, 'calm': 0.7,
+    'hopeful': 0.9, 'grateful': 0.9, 'neutral': 0.5, 'tired': 0.3,
+    'bored': 0.4, 'confused': 0.3, 'worried': 0.2, 'stressed': 0.2,
+    'anxious': 0.1, 'sad': 0.1, 'angry': 0.0, 'frustrated': 0.1,
+    'depressed': 0.0, 'overwhelmed': 0.1
+}
+
+def mood_score(mood_label, mood_intensity):
+    """Emotion-aware mood score of one entry: positive moods rise with intensity, negative moods fall"""
+    valence = MOOD_VALENCE.get(mood_label.lower(), 0.5)
+    if valence >= 0.5:
+        return valence * mood_intensity
+    return valence * (11 - mood_intensity)
+
+def is_positive_mood(mood_label):
+    """Neutral or positive labels, where a low intensity means a mild mood rather than a low one"""
+    return MOOD_VALENCE.get((mood_label or '').lower(), 0.0) >= 0.5
+
+class MoodDailyRollup(db.Model):
+    """Per-user, per-day MoodEntry aggregates, updated in the same transaction as each entry
+
+    Mood analytics read these instead of raw entries, so long ranges cost O(days) not O(entries).
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)  # MoodEntry.timestamp.date()
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0.0)  # sum of mood_score()
+    min_intensity = db.Column(db.Integer)
+    max_intensity = db.Column(db.Integer)
+    label_counts = db.Column(db.Text, nullable=False, default='{}')  # JSON {mood_label: count}
+    
+    @classmethod
+    def empty(cls, user_id, day):
+        return cls(user_id=user_id, day=day, entry_count=0, score_sum=0.0, label_counts='{}')
+    
+    def add(self, mood_label, mood_intensity):
+        """Fold one mood entry into this day's aggregates"""
+        self.entry_count += 1
+        self.score_sum += mood_score(mood_label, mood_intensity)
+        self.min_intensity = mood_intensity if self.min_intensity is None else min(self.min_intensity, mood_intensity)
+        self.max_intensity = mood_intensity if self.max_intensity is None else max(self.max_intensity, mood_intensity)
+        labels = self.labels()
+        labels[mood_label] = labels.get(mood_label, 0) + 1
+        self.label_counts = json.dumps(labels, ensure_ascii=False, sort_keys=True)
+    
+    def labels(self):
+        return json.loads(self.label_counts or '{}')
+    
+    @property
+    def average_score(self):
+        return self.score_sum / self.entry_count if self.entry_count else 0.0
+
+class ConversationSession(db.Model):
+    """Conversation state shared across workers when SESSION_BACKEND=database (or in a SQLite file)"""
+    session_id = db.Column(db.String(100), primary_key=True)
+    state = db.Column(db.Text, nullable=False)  # JSON from ConversationState.to_dict()
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # time.time() of the last save
+
+class SchemaMigration(db.Model):
+    """Migrations from SCHEMA_MIGRATIONS already applied to this database"""
+    id = db.Column(db.String(100), primary_key=True)
+    description = db.Column(db.String(255))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_identity_cache.load(int(user_id))
 
 # Load AI responses and resources
 def load_data():
@@ -101,38 +273,718 @@ def load_data():
 
 responses_data, resources_data = load_data()
 
-class GeminiAI:
+class PhraseMatcher:
+    """Aho-Corasick automaton that finds every known phrase in a message in a single pass"""
+
+    def __init__(self, phrases):
+        self.phrases = frozenset(p for p in phrases if p)
+
+        # Build the keyword trie
+        goto = [{}]
+        outputs = [set()]
+        for phrase in self.phrases:
+            state = 0
+            for ch in phrase:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append(set())
+                state = nxt
+            outputs[state].add(phrase)
+
+        # Breadth-first pass that folds the failure links into a full transition
+        # table, so scanning costs exactly one dict lookup per character
+        rows = [dict(goto[0])] + [None] * (len(goto) - 1)
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                fail[nxt] = rows[fail[state]].get(ch, 0)
+                outputs[nxt] |= outputs[fail[nxt]]
+            rows[state] = {**rows[fail[state]], **goto[state]}
+
+        self._rows = rows
+        self._outputs = [tuple(out) for out in outputs]
+
+    def find(self, text):
+        """Return the set of phrases that occur anywhere in text"""
+        rows, outputs = self._rows, self._outputs
+        hits = set()
+        state = 0
+        for ch in text:
+            state = rows[state].get(ch, 0)
+            if outputs[state]:
+                hits.update(outputs[state])
+        return hits
+
+    def contains_any(self, text):
+        """Return True as soon as any phrase occurs in text"""
+        rows, outputs = self._rows, self._outputs
+        state = 0
+        for ch in text:
+            state = rows[state].get(ch, 0)
+            if outputs[state]:
+                return True
+        return False
+
+class CrisisDetector:
+    """Precompiled crisis phrase detector that runs before any DB, analysis or model work"""
+
+    # English, romanized Hindi and Devanagari variants of crisis language
+    CRISIS_PHRASES = [
+        'suicide', 'suicidal', 'kill myself', 'end it all', 'end my life', 'want to die', 'wanna die',
+        'better off dead', 'no reason to live',
+        'marna chahta', 'marna chahti', 'mar jana chahta', 'mar jana chahti', 'mar jaana chahta', 'mar jaana chahti',
+        'khudkushi', 'aatmahatya', 'atmahatya', 'jeena nahi chahta', 'jeena nahi chahti',
+        'zindagi se pareshan', 'jindagi se pareshan', 'zindagi khatam', 'khud ko khatam',
+        'मरना चाहता', 'मरना चाहती', 'मर जाना चाहता', 'मर जाना चाहती', 'आत्महत्या', 'खुदकुशी',
+        'जीना नहीं चाहता', 'जीना नहीं चाहती', 'जिंदगी से परेशान', 'जिन्दगी से परेशान', 'जिंदगी खत्म',
+    ]
+
+    # Used when resources.json has no crisis_support section
+    DEFAULT_HELPLINES = [
+        {'name': 'Aasra', 'contact': '91-9820466726', 'hours': '24/7'},
+        {'name': 'Sneha', 'contact': '91-44-24640050', 'hours': '24/7'},
+    ]
+
+    def __init__(self, crisis_support=None):
+        self.matcher = PhraseMatcher(self.normalize(phrase) for phrase in self.CRISIS_PHRASES)
+        self.response = self._build_response(crisis_support or {})
+
+    @staticmethod
+    def normalize(text):
+        """Lowercase, fold Devanagari spelling variants (nukta, chandrabindu) and collapse whitespace"""
+        text = unicodedata.normalize('NFC', text.lower())
+        text = text.replace('\u093c', '').replace('\u0901', '\u0902')
+        return ' '.join(text.split())
+
+    def is_crisis(self, message):
+        """Check whether a message contains crisis language"""
+        return self.matcher.contains_any(self.normalize(message))
+
+    def get_response(self):
+        """Prebuilt helpline response - a fresh copy so callers can add fields"""
+        return dict(self.response)
+
+    def _build_response(self, crisis_support):
+        helplines = crisis_support.get('items') or self.DEFAULT_HELPLINES
+        helpline_lines = []
+        for item in helplines:
+            line = f"• {item['name']}: {item['contact']}"
+            if item.get('hours'):
+                line += f" ({item['hours']})"
+            helpline_lines.append(line)
+
+        return {
+            'message': "मैं समझ सकता हूं कि आप बहुत कठिन समय से गुजर रहे हैं। आपकी जिंदगी मायने रखती है। 🤗\n\n🚨 तुरंत मदद:\n" +
+                       "\n".join(helpline_lines) + "\n• आप अकेले नहीं हैं।",
+            'context': 'crisis',
+            'urgent': True,
+            'source': 'local_crisis'
+        }
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for an upstream dependency
+
+    closed    - calls go through; failures inside the rolling window are counted
+    open      - tripped after failure_threshold failures; calls are rejected until reset_timeout passes
+    half_open - one probe call is let through; success closes the breaker, failure re-opens it
+    """
+
+    def __init__(self, failure_threshold=5, window_seconds=60, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.window_seconds = window_seconds
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = 'closed'
+        self.failure_times = deque()
+        self.opened_at = None
+        self.probe_started_at = None
+        self.trip_count = 0
+        self.success_count = 0
+        self.failure_count = 0
+        self.timeout_count = 0
+        self.rejected_count = 0
+
+    def allow_request(self):
+        """Check whether a call may go upstream right now"""
+        with self.lock:
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.probe_started_at = None
+
+            if self.state == 'closed':
+                return True
+            # Half-open lets a single probe through; a probe that never reports back
+            # is replaced after another reset_timeout
+            if self.state == 'half_open' and (self.probe_started_at is None or
+                                              now - self.probe_started_at >= self.reset_timeout):
+                self.probe_started_at = now
+                return True
+
+            self.rejected_count += 1
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.success_count += 1
+            if self.state == 'half_open':
+                self.state = 'closed'
+                self.failure_times.clear()
+                self.probe_started_at = None
+
+    def record_failure(self, timed_out=False):
+        with self.lock:
+            now = time.monotonic()
+            self.failure_count += 1
+            if timed_out:
+                self.timeout_count += 1
+
+            if self.state == 'half_open':
+                self._trip(now)
+                return
+
+            self.failure_times.append(now)
+            while self.failure_times and now - self.failure_times[0] > self.window_seconds:
+                self.failure_times.popleft()
+            if self.state == 'closed' and len(self.failure_times) >= self.failure_threshold:
+                self._trip(now)
+
+    def _trip(self, now):
+        self.state = 'open'
+        self.opened_at = now
+        self.probe_started_at = None
+        self.failure_times.clear()
+        self.trip_count += 1
+        print(f"⚠️ Circuit breaker opened (trip #{self.trip_count}) - using local responses")
+
+    def get_stats(self):
+        """Breaker state and counters for monitoring"""
+        with self.lock:
+            return {
+                'state': self.state,
+                'trip_count': self.trip_count,
+                'recent_failures': len(self.failure_times),
+                'failure_threshold': self.failure_threshold,
+                'window_seconds': self.window_seconds,
+                'reset_timeout': self.reset_timeout,
+                'successes': self.success_count,
+                'failures': self.failure_count,
+                'timeouts': self.timeout_count,
+                'rejected': self.rejected_count
+            }
+
+class ResponseCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss/eviction counters"""
+
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.skipped = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def update(self, key, func):
+        """Replace a live entry with func(value), renewing its TTL; absent or expired keys are left alone"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() >= entry[1]:
+                return False
+            self.entries[key] = (func(entry[0]), time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(key)
+            return True
+
+    def record_skip(self):
+        """Count a lookup that was not eligible for caching"""
+        with self.lock:
+            self.skipped += 1
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'skipped': self.skipped
+            }
+
+class UserIdentityCache:
+    """Short-TTL, size-bounded cache of User rows behind flask-login's user_loader
+
+    Entries are column snapshots; a hit rebuilds the User inside the request's session
+    without a SELECT, so attribute and relationship access behave exactly as before.
+    Each request also memoizes its users in `g`. Entries are dropped on logout and
+    whenever a User row is updated or deleted (other workers see changes within the TTL).
+    """
+
+    def __init__(self, max_entries=2048, ttl_seconds=30):
+        self.cache = ResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.lock = threading.Lock()
+        self.memo_hits = 0
+        self.invalidations = 0
+
+    def load(self, user_id):
+        memo = g.setdefault('_identity_cache_users', {})
+        if user_id in memo:
+            with self.lock:
+                self.memo_hits += 1
+            return memo[user_id]
+        
+        values = self.cache.get(user_id)
+        if values is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self.cache.put(user_id, {attr.key: getattr(user, attr.key)
+                                         for attr in User.__mapper__.column_attrs})
+        else:
+            user = self._attach(values)
+        memo[user_id] = user
+        return user
+
+    def _attach(self, values):
+        """Persistent User in the current session built from cached columns - no SQL"""
+        existing = db.session.identity_map.get(User.__mapper__.identity_key_from_primary_key([values['id']]))
+        if existing is not None:
+            return existing
+        user = User(**values)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        self.cache.invalidate(user_id)
+        if g:
+            g.pop('_identity_cache_users', None)
+        with self.lock:
+            self.invalidations += 1
+
+    def get_stats(self):
+        stats = self.cache.get_stats()
+        with self.lock:
+            stats.update({'memo_hits': self.memo_hits, 'invalidations': self.invalidations,
+                          'lookups_saved': stats['hits'] + self.memo_hits})
+        return stats
+
+user_identity_cache = UserIdentityCache(max_entries=int(os.getenv('USER_CACHE_SIZE', '2048')),
+                                        ttl_seconds=float(os.getenv('USER_CACHE_TTL_SECONDS', '30')))
+
+@sqlalchemy_event.listens_for(User, 'after_update')
+@sqlalchemy_event.listens_for(User, 'after_delete')
+def _invalidate_changed_user(mapper, connection, target):
+    # Drop now, and again after commit in case a concurrent request re-cached the old row meanwhile
+    user_identity_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@sqlalchemy_event.listens_for(OrmSession, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        user_identity_cache.invalidate(user_id)
+
+class SingleFlightTimeout(FuturesTimeoutError):
+    """Raised to a follower that gave up waiting for the leader (not the leader's own timeout)"""
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one upstream call
+
+    The first caller for a key becomes the leader and does the work; callers that
+    arrive while it is running wait for the leader's result (or its exception).
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            self.followers = 0
+
     def __init__(self):
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        self.use_gemini = os.getenv('USE_GEMINI_API', 'false').lower() == 'true'
-        self.model = None
-        
-        if self.use_gemini and self.api_key and self.api_key != 'demo_mode_no_api_key':
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.leader_count = 0
+        self.follower_count = 0
+        self.follower_timeouts = 0
+
+    def begin(self, key):
+        """Join the in-flight call for key, returning (call, is_leader)"""
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                call.followers += 1
+                self.follower_count += 1
+                return call, False
+            call = self.Call()
+            self.calls[key] = call
+            self.leader_count += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publish the leader's outcome and wake every follower"""
+        with self.lock:
+            if self.calls.get(key) is call:
+                del self.calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+
+    def wait(self, call, timeout):
+        """Wait for the leader - raises the leader's exception, or SingleFlightTimeout after timeout seconds"""
+        if not call.done.wait(timeout):
+            with self.lock:
+                self.follower_timeouts += 1
+            raise SingleFlightTimeout()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, func, timeout):
+        """Run func once for all concurrent callers with the same key"""
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return self.wait(call, timeout)
+
+        try:
+            result = func()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.calls),
+                'leaders': self.leader_count,
+                'followers': self.follower_count,
+                'follower_timeouts': self.follower_timeouts
+            }
+
+class ModelOverloadedError(Exception):
+    """Raised when the model call pool has no free slot and its wait queue is full or too slow"""
+
+class StreamInterruptedError(Exception):
+    """Raised when a Gemini stream fails after some of its text was already yielded"""
+
+class ModelCallPool:
+    """Bounded concurrency for model calls with a bounded, time-limited wait queue
+
+    At most max_concurrent calls run at once. Up to max_queue more callers wait
+    (first come, first served) for at most queue_timeout seconds; anyone beyond
+    that is turned away immediately so Flask threads are never parked on Gemini.
+    """
+
+    def __init__(self, max_concurrent=8, max_queue=16, queue_timeout=2.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+        self.abandoned_running = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self):
+        """Take a slot, waiting in the queue if needed - raises ModelOverloadedError when shedding load"""
+        start = time.monotonic()
+        with self.condition:
+            if self.active < self.max_concurrent and self.waiting == 0:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.max_queue:
+                self.rejected_full += 1
+                raise ModelOverloadedError('model call queue is full')
+
+            self.waiting += 1
+            self.queued += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            deadline = start + self.queue_timeout
             try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-1.5-flash')  # Updated model name
-                print("✅ Gemini AI initialized successfully")
-            except Exception as e:
-                print(f"⚠️ Gemini AI initialization failed: {e}")
-                self.use_gemini = False
-        else:
-            print("🔄 Running in local mode - Gemini API disabled")
-    
-    def get_gemini_response(self, user_message, context_info, conversation_history=None):
-        """Get intelligent response from Gemini API"""
-        if not self.use_gemini or not self.model:
-            return None
-        
+                while self.active >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected_timeout += 1
+                        raise ModelOverloadedError(f'no model slot within {self.queue_timeout}s')
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+
+            waited = time.monotonic() - start
+            self.active += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
         try:
-            # Create a natural, human-like response prompt
-            emotional_context = self._get_emotional_response_style(user_message, context_info.get('emotion', 'neutral'))
-            
-            prompt = f"""
-You are Sahara, a caring friend who understands Indian youth culture perfectly. You talk like a real person - not like a formal counselor or AI assistant. You're the friend someone would text when they're feeling overwhelmed.
+            yield
+        finally:
+            self.release()
 
-Current situation: "{user_message}"
-How the person seems to be feeling: {context_info.get('emotion', 'neutral')}
-Conversation flow: {conversation_history[-1] if conversation_history else "This is their first message to you"}
+    def hold_until_done(self, future):
+        """Keep the caller's slot occupied until an abandoned call really finishes
+
+        Called while the caller still holds its slot: the extra claim replaces it when the
+        caller releases, and is itself released when the future completes.
+        """
+        with self.condition:
+            self.active += 1
+            self.abandoned_running += 1
+        future.add_done_callback(lambda _: self._release_abandoned())
+
+    def _release_abandoned(self):
+        with self.condition:
+            self.abandoned_running -= 1
+        self.release()
+
+    def is_saturated(self):
+        """True when a new caller would be rejected straight away"""
+        with self.condition:
+            return self.active >= self.max_concurrent and self.waiting >= self.max_queue
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue_depth': self.max_queue,
+                'queue_timeout_seconds': self.queue_timeout,
+                'active': self.active,
+                'queue_depth': self.waiting,
+                'peak_queue_depth': self.peak_waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected_queue_full': self.rejected_full,
+                'rejected_queue_timeout': self.rejected_timeout,
+                'abandoned_running': self.abandoned_running,
+                'avg_queue_wait_ms': round(self.total_wait / self.queued * 1000, 2) if self.queued else 0,
+                'max_queue_wait_ms': round(self.max_wait * 1000, 2)
+            }
+
+# google.generativeai pulls in grpc/protobuf and dominates cold start, so it is imported on first model use
+genai = None
+
+def load_genai():
+    """Import the Gemini SDK on first use and return it"""
+    global genai
+    if genai is None:
+        import google.generativeai
+        genai = google.generativeai
+    return genai
+
+# NumPy is optional: it powers the long-horizon mood analytics and is only imported when they run
+numpy = None
+
+def load_numpy():
+    """Import NumPy on first use; None when it is not installed (analytics fall back to the scalar engine)"""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as numpy_module
+        except ImportError:
+            return None
+        numpy = numpy_module
+    return numpy
+
+class FakeGeminiError(Exception):
+    """Simulated upstream failure raised by FakeGeminiModel"""
+
+class FakeGeminiModel:
+    """Offline stand-in for genai.GenerativeModel with configurable latency, errors and reply length
+
+    Selected with GEMINI_BACKEND=fake so the whole chat pipeline (deadlines, breaker,
+    call pool, streaming) can be load tested without an API key or network noise.
+    """
+
+    LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal')
+    WORDS = ('yaar', 'I', 'hear', 'you', 'that', 'sounds', 'really', 'tough', 'bilkul', 'samajh',
+             'sakti', 'hoon', 'take', 'a', 'deep', 'breath', 'tum', 'akele', 'nahi', 'ho',
+             'one', 'step', 'at', 'time', 'kya', 'baat', 'karna', 'chahoge', 'about', 'it')
+
+    def __init__(self, latency_ms=800, latency_jitter_ms=200, distribution='lognormal',
+                 first_token_ratio=0.3, error_rate=0.0, reply_tokens=60, reply_tokens_jitter=20,
+                 chunk_tokens=8, seed=None):
+        if distribution not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.distribution = distribution
+        self.first_token_ratio = first_token_ratio
+        self.error_rate = error_rate
+        self.reply_tokens = reply_tokens
+        self.reply_tokens_jitter = reply_tokens_jitter
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        seed = os.getenv('FAKE_GEMINI_SEED')
+        return cls(
+            latency_ms=float(os.getenv('FAKE_GEMINI_LATENCY_MS', '800')),
+            latency_jitter_ms=float(os.getenv('FAKE_GEMINI_LATENCY_JITTER_MS', '200')),
+            distribution=os.getenv('FAKE_GEMINI_LATENCY_DISTRIBUTION', 'lognormal').lower(),
+            first_token_ratio=float(os.getenv('FAKE_GEMINI_FIRST_TOKEN_RATIO', '0.3')),
+            error_rate=float(os.getenv('FAKE_GEMINI_ERROR_RATE', '0')),
+            reply_tokens=int(os.getenv('FAKE_GEMINI_REPLY_TOKENS', '60')),
+            reply_tokens_jitter=int(os.getenv('FAKE_GEMINI_REPLY_TOKENS_JITTER', '20')),
+            chunk_tokens=int(os.getenv('FAKE_GEMINI_CHUNK_TOKENS', '8')),
+            seed=int(seed) if seed else None
+        )
+
+    class Response:
+        def __init__(self, text, prompt_tokens):
+            self.text = text
+            self.usage_metadata = FakeGeminiModel.Usage(prompt_tokens)
+
+    class Usage:
+        def __init__(self, prompt_token_count):
+            self.prompt_token_count = prompt_token_count
+
+    def _sample_latency(self):
+        """Total generation time in seconds drawn from the configured distribution"""
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        with self.rng_lock:
+            if self.distribution == 'fixed':
+                value = mean
+            elif self.distribution == 'uniform':
+                value = self.rng.uniform(mean - jitter, mean + jitter)
+            elif self.distribution == 'normal':
+                value = self.rng.gauss(mean, jitter)
+            else:
+                # Long right tail like a real API, with mean latency_ms and standard deviation jitter
+                if mean <= 0:
+                    value = 0.0
+                else:
+                    sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+                    value = self.rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+        return max(0.0, value) / 1000
+
+    def _sample_reply(self):
+        with self.rng_lock:
+            failed = self.rng.random() < self.error_rate
+            count = max(1, int(round(self.rng.gauss(self.reply_tokens, self.reply_tokens_jitter))))
+            words = [self.rng.choice(self.WORDS) for _ in range(count)]
+        return failed, words
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        """Same call shape as the SDK: a response with .text, or an iterator of chunks when stream=True"""
+        latency = self._sample_latency()
+        failed, words = self._sample_reply()
+        with self.rng_lock:
+            self.calls += 1
+            self.errors += failed
+        prompt_tokens = len(prompt) // 4
+
+        if not stream:
+            time.sleep(latency)
+            if failed:
+                raise FakeGeminiError("503 The model is overloaded (simulated)")
+            return self.Response(' '.join(words), prompt_tokens)
+        return self._stream(words, latency, failed, prompt_tokens)
+
+    def _stream(self, words, latency, failed, prompt_tokens):
+        time.sleep(latency * self.first_token_ratio)
+        if failed:
+            raise FakeGeminiError("503 The model is overloaded (simulated)")
+        chunks = [words[i:i + self.chunk_tokens] for i in range(0, len(words), self.chunk_tokens)]
+        per_chunk = latency * (1 - self.first_token_ratio) / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(per_chunk)
+            yield self.Response(' '.join(chunk) + ' ', prompt_tokens)
+
+    def get_stats(self):
+        with self.rng_lock:
+            return {
+                'calls': self.calls,
+                'simulated_errors': self.errors,
+                'latency_ms': self.latency_ms,
+                'latency_jitter_ms': self.latency_jitter_ms,
+                'distribution': self.distribution,
+                'error_rate': self.error_rate,
+                'reply_tokens': self.reply_tokens
+            }
+
+class GeminiAI:
+    # (cues, style) pairs checked in order - the first group with a matching cue wins
+    EMOTIONAL_STYLES = [
+        (['crying', 'रो रहा', 'devastated', 'heartbroken', 'टूट गया'],
+         "This person is really hurting. Be extra gentle and comforting. Lead with empathy."),
+        (['excited', 'happy', 'khush', 'great news', 'amazing'],
+         "They're sharing good news! Be genuinely excited for them and celebrate with them."),
+        (['confused', 'samajh nahi aa raha', "don't know", 'stuck'],
+         "They're feeling lost and need clarity. Help them think through it step by step, like a friend would."),
+        (['angry', 'frustrated', 'gussa', 'annoying', 'hate'],
+         "They're venting. Let them feel heard first, then gently help them process the anger."),
+        (['scared', 'nervous', 'डरा हुआ', 'anxious', 'worried'],
+         "They need reassurance. Be calming and help them feel less alone with their fears."),
+        (['tired', 'exhausted', 'बहुत थक गया', 'burn out'],
+         "They're emotionally or physically drained. Acknowledge how hard they're working and validate their tiredness."),
+    ]
+    DEFAULT_STYLE = "Respond naturally to what they're sharing. Match their energy level and be a supportive friend."
+
+    # Static persona sent once as the model's system instruction - per-call prompts only carry what changes
+    SAHARA_PERSONA = """You are Sahara, a caring friend who understands Indian youth culture perfectly. You talk like a real person - not like a formal counselor or AI assistant. You're the friend someone would text when they're feeling overwhelmed.
 
 BE A REAL FRIEND. Here's how:
 
@@ -162,56 +1014,1379 @@ CULTURAL UNDERSTANDING:
 - Understand joint family issues, arranged marriage pressure, career expectations
 
 Keep it to 2-3 short paragraphs. Sound like you're genuinely responding to a friend's message, not giving a counseling session.
+"""
 
-{emotional_context}
+    # Only short, generic messages are worth caching - long ones are unique and more likely personal
+    MAX_CACHEABLE_CHARS = 200
+    # Emails, links, phone/ID-like digit runs and self-identifying phrases are never cached
+    PII_PATTERN = re.compile(
+        r"[\w.+-]+@[\w-]+\.[\w.]+|https?://|www\.|@\w{3,}|\d[\d\s-]{5,}\d|"
+        r"\bmy name is\b|\bmera naam\b|\bi live (?:in|at)\b|\bmy (?:address|number|phone)\b",
+        re.IGNORECASE
+    )
+    CACHE_KEY_PUNCTUATION = str.maketrans({ch: ' ' for ch in string.punctuation + '।॥…“”‘’'})
 
-Respond naturally as Sahara:
-"""
-            
-            response = self.model.generate_content(prompt)
-            if response and response.text:
-                return {
-                    'message': response.text.strip(),
-                    'context': context_info.get('main_topic', 'gemini_response'),
-                    'source': 'gemini'
-                }
-        except Exception as e:
-            print(f"Gemini API error: {e}")
+    def __init__(self, crisis_detector=None):
+        self.api_key = os.getenv('GEMINI_API_KEY')
+        self.use_gemini = os.getenv('USE_GEMINI_API', 'false').lower() == 'true'
+        self.backend = os.getenv('GEMINI_BACKEND', 'gemini').lower()  # 'gemini' or 'fake'
+        self.model = None
+        self.model_pending = False
+        self.model_lock = threading.Lock()
+        
+        # Hard per-call deadline and circuit breaker so a slow or failing API never ties up a worker
+        self.timeout = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '8'))
+        
+        # Prompt size accounting - estimated before/after sizes plus the counts Gemini reports
+        self.persona_tokens = self._estimate_tokens(self.SAHARA_PERSONA)
+        self.token_lock = threading.Lock()
+        self.token_stats = {'calls': 0, 'dynamic_prompt_tokens': 0, 'reported_prompt_tokens': 0}
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', '5')),
+            window_seconds=float(os.getenv('GEMINI_BREAKER_WINDOW_SECONDS', '60')),
+            reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', '30'))
+        )
+        max_workers = int(os.getenv('GEMINI_MAX_WORKERS', '8'))
         
-        return None
+        # Bounded pool for model calls - when it is saturated chat answers locally (or 503s)
+        self.call_pool = ModelCallPool(
+            max_concurrent=int(os.getenv('GEMINI_MAX_CONCURRENT', str(max_workers))),
+            max_queue=int(os.getenv('GEMINI_QUEUE_DEPTH', '16')),
+            queue_timeout=float(os.getenv('GEMINI_QUEUE_WAIT_SECONDS', '2'))
+        )
+        # Every pool slot gets an executor thread, so an admitted call never waits behind another
+        self._executor = ThreadPoolExecutor(max_workers=max(max_workers, self.call_pool.max_concurrent),
+                                            thread_name_prefix='gemini')
+        self.overload_policy = os.getenv('GEMINI_OVERLOAD_POLICY', 'local').lower()  # 'local' or 'reject'
+        self.retry_after = int(os.getenv('GEMINI_RETRY_AFTER_SECONDS', '5'))
+        
+        # Identical requests in flight at the same moment share one upstream call
+        self.single_flight = SingleFlight()
+        self.single_flight_wait = float(os.getenv('GEMINI_SINGLE_FLIGHT_WAIT_SECONDS', str(self.timeout)))
+        
+        # Replies to common openers are reused instead of paying another round trip
+        self.crisis_detector = crisis_detector
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv('GEMINI_CACHE_SIZE', '512')),
+            ttl_seconds=float(os.getenv('GEMINI_CACHE_TTL_SECONDS', '3600'))
+        )
+        
+        if self.backend == 'fake':
+            # Local stand-in for offline load and latency testing - no API key or network needed
+            self.model = FakeGeminiModel.from_env()
+            self.use_gemini = True
+            print(f"🧪 Using fake Gemini backend ({self.model.distribution} latency "
+                  f"≈{self.model.latency_ms:.0f} ms, error rate {self.model.error_rate:.0%})")
+        elif self.use_gemini and self.api_key and self.api_key != 'demo_mode_no_api_key':
+            # The SDK is imported and the model built on the first chat that needs it
+            self.model_pending = True
+            print("⏳ Gemini AI enabled - SDK will load on first use")
+        else:
+            print("🔄 Running in local mode - Gemini API disabled")
     
-    def _get_emotional_response_style(self, message, emotion):
-        """Generate appropriate emotional response style based on user's state"""
-        message_lower = message.lower()
+    def _ensure_model(self):
+        """Return the model, importing the SDK and building it on first use"""
+        if self.model is not None or not self.model_pending:
+            return self.model
+        
+        with self.model_lock:
+            if self.model_pending:
+                try:
+                    sdk = load_genai()
+                    sdk.configure(api_key=self.api_key)
+                    self.model = sdk.GenerativeModel('gemini-1.5-flash',  # Updated model name
+                                                     system_instruction=self.SAHARA_PERSONA)
+                    print("✅ Gemini AI initialized successfully")
+                    print(f"📝 Persona ≈{self.persona_tokens} tokens moved to system instruction - "
+                          f"no longer rebuilt into every prompt")
+                except Exception as e:
+                    print(f"⚠️ Gemini AI initialization failed: {e}")
+                    self.use_gemini = False
+                self.model_pending = False
+        return self.model
+    
+    def get_gemini_response(self, user_message, context_info, conversation_history=None):
+        """Get intelligent response from Gemini API"""
+        if not self.use_gemini or not self._ensure_model():
+            return None
         
-        # Detect emotional intensity and context
-        if any(word in message_lower for word in ['crying', 'रो रहा', 'devastated', 'heartbroken', 'टूट गया']):
-            return "This person is really hurting. Be extra gentle and comforting. Lead with empathy."
+        cache_key = self._get_cache_key(user_message, context_info, conversation_history)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                return dict(cached)
+        
+        prompt = self._build_prompt(user_message, context_info, conversation_history)
+        
+        # Identical requests already in flight share one upstream call
+        try:
+            result = self.single_flight.do(cache_key or prompt,
+                                           lambda: self._generate_response(prompt, context_info, cache_key),
+                                           timeout=self.single_flight_wait)
+        except SingleFlightTimeout:
+            print(f"Gemini API: gave up waiting for in-flight duplicate after {self.single_flight_wait}s")
+            return None
+        except ModelOverloadedError as e:
+            print(f"⏳ Gemini call pool saturated ({e})")
+            if self.overload_policy == 'reject':
+                raise
+            return None
+        except Exception:
+            return None  # Already logged and counted by the leader (including its own timeout)
+        
+        return dict(result) if result else None
+    
+    def _generate_response(self, prompt, context_info, cache_key=None):
+        """Make one upstream call - only ever run by the single-flight leader"""
+        # The breaker is asked only once a slot is held, so a half-open probe is never
+        # claimed by a caller that is then turned away with ModelOverloadedError
+        with self.call_pool.slot():
+            if not self.breaker.allow_request():
+                return None
+            try:
+                response = self._call_with_deadline(self.model.generate_content, prompt,
+                                                    request_options={'timeout': self.timeout})
+            except FuturesTimeoutError:
+                self.breaker.record_failure(timed_out=True)
+                print(f"Gemini API timeout after {self.timeout}s")
+                raise
+            except Exception as e:
+                self.breaker.record_failure()
+                print(f"Gemini API error: {e}")
+                raise
+        
+        self.breaker.record_success()
+        self._record_token_usage(prompt, getattr(response, 'usage_metadata', None))
+        if response and response.text:
+            result = {
+                'message': response.text.strip(),
+                'context': context_info.get('main_topic', 'gemini_response'),
+                'source': 'gemini'
+            }
+            if cache_key:
+                self.response_cache.put(cache_key, dict(result))
+            return result
+        return None
+    
+    def stream_gemini_response(self, user_message, context_info, conversation_history=None):
+        """Stream response text from Gemini chunk by chunk as it is generated"""
+        if not self.use_gemini or not self._ensure_model():
+            return
         
-        elif any(word in message_lower for word in ['excited', 'happy', 'khush', 'great news', 'amazing']):
-            return "They're sharing good news! Be genuinely excited for them and celebrate with them."
+        cache_key = self._get_cache_key(user_message, context_info, conversation_history)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                yield cached['message']
+                return
         
-        elif any(word in message_lower for word in ['confused', 'samajh nahi aa raha', "don't know", 'stuck']):
-            return "They're feeling lost and need clarity. Help them think through it step by step, like a friend would."
+        prompt = self._build_prompt(user_message, context_info, conversation_history)
         
-        elif any(word in message_lower for word in ['angry', 'frustrated', 'gussa', 'annoying', 'hate']):
-            return "They're venting. Let them feel heard first, then gently help them process the anger."
+        # Followers of an identical in-flight request get the leader's full reply in one piece
+        flight, is_leader = self.single_flight.begin(cache_key or prompt)
+        if not is_leader:
+            try:
+                result = self.single_flight.wait(flight, self.single_flight_wait)
+            except SingleFlightTimeout:
+                print(f"Gemini API: gave up waiting for in-flight duplicate after {self.single_flight_wait}s")
+                return
+            except Exception:
+                return  # Already logged and counted by the leader (including its own timeout)
+            if result:
+                yield result['message']
+            return
+        
+        result = None
+        error = None
+        streamed_text = []
+        try:
+            with self.call_pool.slot():
+                if not self.breaker.allow_request():  # asked with a slot held, as in _generate_response
+                    return
+                # The deadline applies to every wait - the first chunk and each one after it
+                chunks = self._call_with_deadline(lambda: iter(self.model.generate_content(
+                    prompt, stream=True, request_options={'timeout': self.timeout})))
+                usage = None
+                while True:
+                    chunk = self._call_with_deadline(next, chunks, None)
+                    if chunk is None:
+                        break
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    if chunk.text:
+                        streamed_text.append(chunk.text)
+                        yield chunk.text
+            self.breaker.record_success()
+            self._record_token_usage(prompt, usage)
+            
+            if streamed_text:
+                result = {
+                    'message': ''.join(streamed_text).strip(),
+                    'context': context_info.get('main_topic', 'gemini_response'),
+                    'source': 'gemini'
+                }
+                if cache_key:
+                    self.response_cache.put(cache_key, dict(result))
+        except ModelOverloadedError as e:
+            error = e  # The stream is already open, so fall back to the local engine
+            print(f"⏳ Gemini call pool saturated ({e})")
+        except FuturesTimeoutError as e:
+            error = e
+            self.breaker.record_failure(timed_out=True)
+            print(f"Gemini API streaming timeout after {self.timeout}s")
+        except Exception as e:
+            error = e
+            self.breaker.record_failure()
+            print(f"Gemini API streaming error: {e}")
+        finally:
+            # Always release followers, even if the client disconnected mid-stream
+            self.single_flight.finish(cache_key or prompt, flight, result, error)
+        
+        # Text already went out, so the caller must know the reply is incomplete (never cached)
+        if error is not None and streamed_text:
+            raise StreamInterruptedError(f"stream failed after {len(streamed_text)} chunks") from error
+    
+    @staticmethod
+    def _estimate_tokens(text):
+        """Rough token estimate (~4 characters per token) for prompt size logging"""
+        return max(1, len(text) // 4)
+    
+    def _record_token_usage(self, prompt, usage_metadata=None):
+        """Log per-request prompt tokens against what the old persona-in-every-prompt layout would send"""
+        dynamic_tokens = self._estimate_tokens(prompt)
+        reported_tokens = getattr(usage_metadata, 'prompt_token_count', 0) or 0
+        with self.token_lock:
+            self.token_stats['calls'] += 1
+            self.token_stats['dynamic_prompt_tokens'] += dynamic_tokens
+            self.token_stats['reported_prompt_tokens'] += reported_tokens
+        
+        reported = f", Gemini reported {reported_tokens}" if reported_tokens else ""
+        print(f"Gemini prompt tokens: before ≈{dynamic_tokens + self.persona_tokens} "
+              f"(persona rebuilt per call), after ≈{dynamic_tokens} (dynamic part only){reported}")
+    
+    def get_token_stats(self):
+        """Average prompt size per call before and after moving the persona to the system instruction"""
+        with self.token_lock:
+            calls = self.token_stats['calls']
+            dynamic_avg = self.token_stats['dynamic_prompt_tokens'] / calls if calls else 0
+            return {
+                'calls': calls,
+                'persona_tokens_estimate': self.persona_tokens,
+                'avg_prompt_tokens_before_estimate': round(dynamic_avg + self.persona_tokens, 1) if calls else 0,
+                'avg_prompt_tokens_after_estimate': round(dynamic_avg, 1),
+                'avg_reported_prompt_tokens': round(self.token_stats['reported_prompt_tokens'] / calls, 1) if calls else 0
+            }
+    
+    def _get_cache_key(self, user_message, context_info, conversation_history=None):
+        """Cache key from the normalized message, detected emotion/topic and last turn - None if not cacheable"""
+        last_turn = conversation_history[-1] if conversation_history else ''
+        if not self._is_cacheable(user_message) or (last_turn and not self._is_cacheable(last_turn)):
+            self.response_cache.record_skip()
+            return None
         
-        elif any(word in message_lower for word in ['scared', 'nervous', 'डरा हुआ', 'anxious', 'worried']):
-            return "They need reassurance. Be calming and help them feel less alone with their fears."
+        return (self._normalize_for_cache(user_message),
+                context_info.get('emotion', 'neutral'),
+                context_info.get('main_topic'),
+                self._normalize_for_cache(last_turn),
+                context_info.get('conversation_summary', ''))
+    
+    def _is_cacheable(self, text):
+        """Never cache crisis or personally identifying content"""
+        if len(text) > self.MAX_CACHEABLE_CHARS or self.PII_PATTERN.search(text):
+            return False
+        if self.crisis_detector and self.crisis_detector.is_crisis(text):
+            return False
+        return True
+    
+    def _normalize_for_cache(self, text):
+        return ' '.join(text.lower().translate(self.CACHE_KEY_PUNCTUATION).split())
+    
+    def _call_with_deadline(self, func, *args, **kwargs):
+        """Run a model call on the Gemini executor and give up waiting after self.timeout seconds
+
+        Must be called with a call-pool slot held. A running call cannot be cancelled, so one
+        still running at the deadline keeps that slot until it finishes - abandoned calls count
+        against the concurrency limit instead of piling up unseen on the executor.
+        """
+        future = self._executor.submit(func, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            if not future.cancel():
+                self.call_pool.hold_until_done(future)
+            raise
+    
+    def get_status(self):
+        """Gemini availability and circuit breaker state for monitoring"""
+        return {
+            'gemini_enabled': self.use_gemini,
+            'backend': self.backend,
+            'model_loaded': self.model is not None,
+            'sdk_loaded': genai is not None,
+            'timeout_seconds': self.timeout,
+            'degraded': self.breaker.state != 'closed',
+            'circuit_breaker': self.breaker.get_stats(),
+            'response_cache': self.response_cache.get_stats(),
+            'single_flight': self.single_flight.get_stats(),
+            'call_pool': self.call_pool.get_stats(),
+            'prompt_tokens': self.get_token_stats(),
+            'fake_backend': self.model.get_stats() if isinstance(self.model, FakeGeminiModel) else None
+        }
+    
+    def should_shed_load(self):
+        """True when the reject policy is on and a new model call would be turned away"""
+        return self.overload_policy == 'reject' and self.use_gemini and self.call_pool.is_saturated()
+    
+    def _build_prompt(self, user_message, context_info, conversation_history=None):
+        """Create the per-request part of the prompt - the persona lives in the system instruction"""
+        emotional_context = self._get_emotional_response_style(user_message, context_info.get('emotion', 'neutral'),
+                                                               context_info.get('matched_phrases'))
         
-        elif any(word in message_lower for word in ['tired', 'exhausted', 'बहुत थक गया', 'burn out']):
-            return "They're emotionally or physically drained. Acknowledge how hard they're working and validate their tiredness."
+        # Rolling summary of the whole conversation, capped at SUMMARY_TOKEN_BUDGET
+        summary = context_info.get('conversation_summary')
+        summary_line = f"Conversation so far: {summary}\n" if summary else ""
         
+        prompt = f"""Current situation: "{user_message}"
+How the person seems to be feeling: {context_info.get('emotion', 'neutral')}
+Conversation flow: {conversation_history[-1] if conversation_history else "This is their first message to you"}
+{summary_line}
+{emotional_context}
+
+Respond naturally as Sahara:
+"""
+        return prompt
+    
+    def _get_emotional_response_style(self, message, emotion, matched_phrases=None):
+        """Generate appropriate emotional response style based on user's state"""
+        # Reuse the phrase matcher hits from message analysis when we have them
+        if matched_phrases is None:
+            message_lower = message.lower()
+            matched_phrases = {cue for cues, _ in self.EMOTIONAL_STYLES for cue in cues if cue in message_lower}
+
+        # Detect emotional intensity and context
+        for cues, style in self.EMOTIONAL_STYLES:
+            if not matched_phrases.isdisjoint(cues):
+                return style
+
+        return self.DEFAULT_STYLE
+
+class RingBuffer:
+    """Fixed-capacity buffer that overwrites its oldest item - much smaller than a deque for a few items"""
+
+    __slots__ = ('items', 'start', 'capacity')
+
+    def __init__(self, capacity):
+        self.items = []
+        self.start = 0
+        self.capacity = capacity
+
+    def append(self, item):
+        if len(self.items) < self.capacity:
+            self.items.append(item)
+        else:
+            self.items[self.start] = item
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        items, start = self.items, self.start
+        return iter(items[start:] + items[:start] if start else list(items))
+
+    def last(self, count):
+        """The newest count items, oldest first"""
+        return list(self)[-count:] if count > 0 else []
+
+class ConversationTurn:
+    """One stored user turn - topic and emotion are interned codes, timestamp is epoch seconds"""
+
+    __slots__ = ('user', 'topic', 'emotion', 'timestamp')
+
+    def __init__(self, user, topic, emotion, timestamp):
+        self.user = user
+        self.topic = topic
+        self.emotion = emotion
+        self.timestamp = timestamp
+
+def intern_code(value):
+    """Share one string object per topic/emotion code across every session"""
+    return sys.intern(value) if value else None
+
+class ConversationSummary:
+    """Rolling summary of a whole conversation - topics, emotional trajectory and key facts
+
+    Updated in O(1) per turn and rendered within a fixed token budget, so the prompt
+    stays the same size however long the conversation runs.
+    """
+
+    __slots__ = ('turns', 'topics', 'trajectory', 'facts')
+    MAX_RUNS = 8    # emotion runs kept, e.g. stressed×3 → anxious → hopeful×2
+    MAX_FACTS = 8   # most recently mentioned concerns and context clues
+
+    def __init__(self):
+        self.turns = 0
+        self.topics = {}
+        self.trajectory = []
+        self.facts = ()
+
+    def update(self, analysis):
+        self.turns += 1
+        topic = intern_code(analysis.get('main_topic'))
+        if topic:
+            self.topics[topic] = self.topics.get(topic, 0) + 1
+        
+        emotion = intern_code(analysis.get('emotion'))
+        if emotion:
+            if self.trajectory and self.trajectory[-1][0] is emotion:
+                self.trajectory[-1] = (emotion, self.trajectory[-1][1] + 1)
+            else:
+                self.trajectory.append((emotion, 1))
+                if len(self.trajectory) > self.MAX_RUNS:
+                    del self.trajectory[0]
+        
+        new_facts = [intern_code(fact) for fact in
+                     list(analysis.get('specific_concerns', ())) + list(analysis.get('context_clues', ())) if fact]
+        if new_facts:
+            facts = [fact for fact in self.facts if fact not in new_facts]
+            facts.extend(dict.fromkeys(new_facts))
+            self.facts = tuple(facts[-self.MAX_FACTS:])
+
+    def render(self, token_budget):
+        """Summary text of at most token_budget estimated tokens - oldest details are dropped first"""
+        if not self.turns:
+            return ''
+        topics = sorted(self.topics.items(), key=lambda item: -item[1])
+        runs, facts = list(self.trajectory), list(self.facts)
+        while True:
+            parts = [f"{self.turns} earlier message{'s' if self.turns != 1 else ''}"]
+            if topics:
+                parts.append('topics: ' + ', '.join(f"{topic}×{count}" if count > 1 else topic
+                                                    for topic, count in topics))
+            if runs:
+                parts.append('feelings: ' + ' → '.join(f"{emotion}×{count}" if count > 1 else emotion
+                                                       for emotion, count in runs))
+            if facts:
+                parts.append('mentioned: ' + ', '.join(facts))
+            text = '; '.join(parts)
+            if GeminiAI._estimate_tokens(text) <= token_budget:
+                return text
+            if facts:
+                facts.pop(0)
+            elif len(runs) > 1:
+                runs.pop(0)
+            elif len(topics) > 1:
+                topics.pop()
+            else:
+                return text[:token_budget * 4]
+
+    def to_dict(self):
+        return {'turns': self.turns, 'topics': self.topics,
+                'trajectory': [list(run) for run in self.trajectory], 'facts': list(self.facts)}
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.turns = data['turns']
+        summary.topics = {intern_code(topic): count for topic, count in data['topics'].items()}
+        summary.trajectory = [(intern_code(emotion), count) for emotion, count in data['trajectory']]
+        summary.facts = tuple(intern_code(fact) for fact in data['facts'])
+        return summary
+
+class ConversationState:
+    """One session's conversation state: a ring buffer of recent turns plus topics and rapport"""
+
+    __slots__ = ('messages', 'topics_discussed', 'rapport_level', 'summary', 'last_seen')
+
+    def __init__(self, max_turns=20):
+        self.messages = RingBuffer(max_turns)
+        self.topics_discussed = ()  # interned codes, at most one per context pattern
+        self.rapport_level = 0
+        self.summary = ConversationSummary()
+        self.last_seen = time.monotonic()
+
+    @property
+    def turn_count(self):
+        return len(self.messages)
+
+    @property
+    def emotional_journey(self):
+        return [turn.emotion for turn in self.messages]
+
+    def history(self, limit=3):
+        """The last limit user messages, oldest first"""
+        return [turn.user for turn in self.messages.last(limit)]
+
+    def record_turn(self, message, analysis):
+        topic = intern_code(analysis['main_topic'])
+        self.messages.append(ConversationTurn(message, topic, intern_code(analysis['emotion']), time.time()))
+        if topic and topic not in self.topics_discussed:
+            self.topics_discussed += (topic,)
+        self.rapport_level += 1
+        self.summary.update(analysis)
+
+    def to_dict(self):
+        """JSON-safe form for shared backends"""
+        return {
+            'messages': [{'user': turn.user, 'main_topic': turn.topic, 'emotion': turn.emotion,
+                          'timestamp': turn.timestamp} for turn in self.messages],
+            'topics_discussed': list(self.topics_discussed),
+            'rapport_level': self.rapport_level,
+            'summary': self.summary.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data, max_turns=20):
+        state = cls(max_turns)
+        for turn in data['messages']:
+            state.messages.append(ConversationTurn(turn['user'], intern_code(turn['main_topic']),
+                                                   intern_code(turn['emotion']), turn['timestamp']))
+        state.topics_discussed = tuple(intern_code(topic) for topic in data['topics_discussed'])
+        state.rapport_level = data['rapport_level']
+        if 'summary' in data:
+            state.summary = ConversationSummary.from_dict(data['summary'])
+        return state
+
+class SessionStore:
+    """In-process session backend with TTL expiry, an LRU cap and a ring buffer of recent turns per session
+
+    Sessions are kept in least-recently-used order, which is also last-activity order,
+    so expired sessions are always at the front and are swept without a full scan.
+    Every session backend offers load(session_id) and save(session_id, state) -
+    SaharaAI calls each once per chat turn.
+
+    With a snapshot_path, active sessions are written to a compact snapshot file on
+    shutdown (and every snapshot_interval seconds) and warm restored at startup: a
+    background thread indexes the file without blocking boot, and each session is
+    only decoded the first time it is used again. Each worker process writes its own
+    file (snapshot_path.<pid>) and a restore merges every worker's file, keeping the
+    most recent copy of each session; files older than the TTL are removed.
+    """
+
+    name = 'memory'
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, max_sessions=10000, ttl_seconds=3600, max_turns=20,
+                 snapshot_path=None, restore_wait_seconds=1.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        
+        self.snapshot_path = snapshot_path
+        self.restore_wait_seconds = restore_wait_seconds
+        self.restored = {}  # session_id -> (encoded state, last_seen) not yet used since restart
+        self.restore_ready = threading.Event()
+        self.snapshot_lock = threading.Lock()
+        self.restored_count = 0
+        self.restored_used = 0
+        self.restore_ms = 0.0
+        self.snapshots_written = 0
+        self.last_snapshot = {}
+        self.restore_ready.set()  # cleared while a warm restore is running
+
+    def _expire(self, now):
+        while self.sessions:
+            session_id, state = next(iter(self.sessions.items()))
+            if now - state.last_seen <= self.ttl_seconds:
+                break
+            del self.sessions[session_id]
+            self.expirations += 1
+
+    def _touch(self, session_id, now):
+        """Live state for session_id moved to most recent, or None - caller holds the lock"""
+        self._expire(now)
+        state = self.sessions.get(session_id)
+        if state is not None:
+            self.sessions.move_to_end(session_id)
+            state.last_seen = now
+        elif self.restored:
+            state = self._take_restored(session_id, now)
+        return state
+
+    def _take_restored(self, session_id, now):
+        """Decode a session from the startup snapshot on its first use - caller holds the lock"""
+        entry = self.restored.pop(session_id, None)
+        if entry is None:
+            return None
+        encoded, last_seen = entry
+        if now - last_seen > self.ttl_seconds:
+            self.expirations += 1
+            return None
+        state = ConversationState.from_dict(json.loads(encoded), self.max_turns)
+        state.last_seen = now
+        self.sessions[session_id] = state
+        self.restored_used += 1
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evictions += 1
+        return state
+
+    def __contains__(self, session_id):
+        with self.lock:
+            return self._touch(session_id, time.monotonic()) is not None
+
+    def __len__(self):
+        with self.lock:
+            self._expire(time.monotonic())
+            return len(self.sessions)
+
+    def load(self, session_id):
+        """The session's live state, or None if it is unknown or expired"""
+        if not self.restore_ready.is_set():
+            # Only while a restart is restoring - don't greet a mid-conversation user as new
+            self.restore_ready.wait(self.restore_wait_seconds)
+        with self.lock:
+            return self._touch(session_id, time.monotonic())
+
+    def save(self, session_id, state):
+        """Store state as the most recent session, evicting the least recent one beyond the cap"""
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            self.restored.pop(session_id, None)
+            state.last_seen = now
+            self.sessions[session_id] = state
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def get_history(self, session_id, limit=3):
+        """The last limit user messages of the session, oldest first"""
+        state = self.load(session_id)
+        return state.history(limit) if state is not None else []
+
+    def turn_count(self, session_id):
+        state = self.load(session_id)
+        return state.turn_count if state is not None else 0
+
+    def record_turn(self, session_id, message, analysis):
+        """Append one turn, creating the session if needed"""
+        state = self.load(session_id) or ConversationState(self.max_turns)
+        state.record_turn(message, analysis)
+        self.save(session_id, state)
+
+    def snapshot(self):
+        """Write all live sessions to snapshot_path - one tab-separated line per session, oldest first"""
+        if not self.snapshot_path:
+            return 0
+        started = time.perf_counter()
+        with self.snapshot_lock:
+            with self.lock:
+                now = time.monotonic()
+                self._expire(now)
+                live = list(self.sessions.items())
+                pending = list(self.restored.items())
+            
+            lines = [json.dumps({'version': self.SNAPSHOT_VERSION, 'saved_at': time.time()}) + '\n']
+            for session_id, (encoded, last_seen) in pending:
+                if now - last_seen <= self.ttl_seconds:
+                    lines.append(f"{json.dumps(session_id)}\t{now - last_seen:.3f}\t{encoded}\n")
+            for session_id, state in live:
+                try:
+                    encoded = json.dumps(state.to_dict(), ensure_ascii=False, separators=(',', ':'))
+                except RuntimeError:
+                    continue  # Changed by a request mid-copy - the next snapshot will have it
+                lines.append(f"{json.dumps(session_id)}\t{now - state.last_seen:.3f}\t{encoded}\n")
+            
+            # Per-process temp file and target, so concurrent workers never write the same file
+            worker_path = self.worker_snapshot_path()
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(worker_path)),
+                                             prefix=os.path.basename(worker_path) + '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                os.replace(temp_path, worker_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        
+        self.snapshots_written += 1
+        self.last_snapshot = {'sessions': len(lines) - 1, 'bytes': os.path.getsize(worker_path),
+                              'ms': round((time.perf_counter() - started) * 1000, 1)}
+        return len(lines) - 1
+
+    def worker_snapshot_path(self):
+        """The snapshot file this process writes - looked up per call, since workers may fork after import"""
+        return f"{self.snapshot_path}.{os.getpid()}"
+
+    def snapshot_files(self):
+        """Every worker's snapshot file, plus a single snapshot_path file from before per-worker files"""
+        prefix = self.snapshot_path + '.'
+        return [self.snapshot_path] + [path for path in glob.glob(glob.escape(prefix) + '*')
+                                       if path[len(prefix):].isdigit()]
+
+    def _read_snapshot(self, path, now):
+        """session_id -> (encoded state, last_seen) for the sessions in one snapshot file still within the TTL"""
+        with open(path, encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != self.SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {header.get('version')}")
+            offline = max(0.0, time.time() - header['saved_at'])
+            entries = {}
+            for line in f:
+                session_id, idle, encoded = line.rstrip('\n').split('\t', 2)
+                idle = float(idle) + offline
+                if idle <= self.ttl_seconds:
+                    entries[json.loads(session_id)] = (encoded, now - idle)
+            return entries
+
+    def restore(self):
+        """Index every worker's snapshot file - sessions are decoded lazily on first use"""
+        started = time.perf_counter()
+        try:
+            now = time.monotonic()
+            entries = {}
+            files = 0
+            for path in self.snapshot_files():
+                try:
+                    if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                        os.remove(path)  # every session in it has expired
+                        continue
+                    found = self._read_snapshot(path, now)
+                except FileNotFoundError:
+                    continue  # never written, or removed by another worker
+                except Exception as e:
+                    print(f"⚠️ Session snapshot restore failed for {path}: {e}")
+                    continue
+                files += 1
+                # A session handled by several workers keeps its most recent copy
+                for session_id, entry in found.items():
+                    if session_id not in entries or entry[1] > entries[session_id][1]:
+                        entries[session_id] = entry
+            
+            # Keep the most recent sessions up to the cap
+            if len(entries) > self.max_sessions:
+                entries = dict(sorted(entries.items(), key=lambda item: item[1][1])[-self.max_sessions:])
+            with self.lock:
+                for session_id, entry in entries.items():
+                    if session_id not in self.sessions:
+                        self.restored[session_id] = entry
+                self.restored_count = len(self.restored)
+            if files:
+                print(f"♻️ Restored {self.restored_count} conversation sessions from {files} snapshot file(s)")
+        except Exception as e:
+            print(f"⚠️ Session snapshot restore failed: {e}")
+        finally:
+            self.restore_ms = (time.perf_counter() - started) * 1000
+            self.restore_ready.set()
+
+    def start_persistence(self, interval_seconds=0):
+        """Warm restore in the background, snapshot on exit and optionally on a timer"""
+        if not self.snapshot_path:
+            return
+        self.restore_ready.clear()
+        threading.Thread(target=self.restore, name='session-restore', daemon=True).start()
+        atexit.register(self._safe_snapshot)
+        if interval_seconds > 0:
+            def snapshot_periodically():
+                while True:
+                    time.sleep(interval_seconds)
+                    self._safe_snapshot()
+            threading.Thread(target=snapshot_periodically, name='session-snapshot', daemon=True).start()
+
+    def _safe_snapshot(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            print(f"⚠️ Session snapshot failed: {e}")
+
+    def approximate_bytes(self, sample_size=200):
+        """Estimated memory held by all sessions, extrapolated from a sample of the most recent ones"""
+        with self.lock:
+            count = len(self.sessions)
+            sample = [state for _, state in zip(range(sample_size), reversed(self.sessions.values()))]
+            sampled = sum(_deep_sizeof(state) for state in sample)
+        return int(sampled / len(sample) * count) if sample else 0
+
+    def get_stats(self):
+        with self.lock:
+            self._expire(time.monotonic())
+            sessions = len(self.sessions)
+            turns = sum(state.turn_count for state in self.sessions.values())
+            stats = {
+                'backend': self.name,
+                'sessions': sessions,
+                'turns': turns,
+                'max_sessions': self.max_sessions,
+                'max_turns_per_session': self.max_turns,
+                'ttl_seconds': self.ttl_seconds,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'restore_pending': len(self.restored),
+                'restored_sessions': self.restored_count,
+                'restored_used': self.restored_used,
+                'restore_ms': round(self.restore_ms, 1),
+                'snapshots_written': self.snapshots_written,
+                'last_snapshot': self.last_snapshot
+            }
+        stats['approx_bytes'] = self.approximate_bytes()
+        stats['approx_bytes_per_session'] = stats['approx_bytes'] // sessions if sessions else 0
+        return stats
+
+class SQLSessionBackend:
+    """Session backend on a SQL table shared by every worker - a SQLite file or the app database
+
+    A chat turn costs two statements, one SELECT and one upsert, both on the request path:
+    save() commits before it returns, so the next request - in any worker or serverless
+    invocation - sees the turn. That is one more than the one-round-trip budget: the read
+    has to precede the reply, and serving it from a per-worker copy of the row would give
+    the reply stale history whenever a session's turns land on different workers.
+    Stale rows are purged by TTL every PURGE_EVERY_WRITES saves.
+    """
+
+    PURGE_EVERY_WRITES = 100
+    NATIVE_UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+    def __init__(self, engine_factory, name='database', ttl_seconds=3600, max_turns=20):
+        self.engine_factory = engine_factory
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.table = ConversationSession.__table__
+        self._engine = None
+        self.engine_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.reads = 0
+        self.rows_written = 0
+        self.write_errors = 0
+        self.purged = 0
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self.engine_lock:
+                if self._engine is None:
+                    engine = self.engine_factory()
+                    self.table.create(engine, checkfirst=True)
+                    self._engine = engine
+        return self._engine
+
+    def load(self, session_id):
+        """The session's state, or None if it is unknown or expired - one SELECT"""
+        with self.stats_lock:
+            self.reads += 1
+        with self.engine.connect() as conn:
+            row = conn.execute(select(self.table.c.state, self.table.c.updated_at)
+                               .where(self.table.c.session_id == session_id)).first()
+        if row is None or time.time() - row.updated_at > self.ttl_seconds:
+            return None
+        return ConversationState.from_dict(json.loads(row.state), self.max_turns)
+
+    def save(self, session_id, state):
+        """Upsert the state and commit before returning, so every other worker sees it"""
+        row = {'session_id': session_id, 'state': json.dumps(state.to_dict(), ensure_ascii=False),
+               'updated_at': time.time()}
+        with self.stats_lock:
+            purge = self.rows_written % self.PURGE_EVERY_WRITES == 0
+        try:
+            with self.engine.begin() as conn:
+                self._upsert(conn, [row])
+                if purge:
+                    purged = conn.execute(delete(self.table).where(
+                        self.table.c.updated_at < time.time() - self.ttl_seconds))
+            with self.stats_lock:
+                self.rows_written += 1
+                if purge:
+                    self.purged += purged.rowcount or 0
+        except Exception as e:
+            with self.stats_lock:
+                self.write_errors += 1
+            print(f"⚠️ Session backend write failed for session {session_id}: {e}")
+
+    def _upsert(self, conn, rows):
+        dialect = conn.dialect.name
+        if dialect in self.NATIVE_UPSERT_DIALECTS:
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            statement = insert(self.table)
+            statement = statement.on_conflict_do_update(
+                index_elements=['session_id'],
+                set_={'state': statement.excluded.state, 'updated_at': statement.excluded.updated_at})
+            conn.execute(statement, rows)
         else:
-            return "Respond naturally to what they're sharing. Match their energy level and be a supportive friend."
+            for row in rows:
+                self._portable_upsert(conn, row)
+
+    def _portable_upsert(self, conn, row):
+        """UPDATE, else INSERT in a savepoint - if a concurrent turn inserted the row first, UPDATE it"""
+        changes = update(self.table).where(self.table.c.session_id == row['session_id']) \
+            .values(state=row['state'], updated_at=row['updated_at'])
+        if conn.execute(changes).rowcount:
+            return
+        try:
+            with conn.begin_nested():
+                conn.execute(self.table.insert(), [row])
+        except IntegrityError:
+            conn.execute(changes)
+
+    def get_history(self, session_id, limit=3):
+        state = self.load(session_id)
+        return state.history(limit) if state is not None else []
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                'backend': self.name,
+                'ttl_seconds': self.ttl_seconds,
+                'max_turns_per_session': self.max_turns,
+                'reads': self.reads,
+                'rows_written': self.rows_written,
+                'write_errors': self.write_errors,
+                'purged': self.purged
+            }
+
+def _app_database_engine():
+    with app.app_context():
+        return db.engine
+
+def create_session_backend():
+    """Session backend from SESSION_BACKEND: memory (default), sqlite (local file) or database (app DB)"""
+    kind = os.getenv('SESSION_BACKEND', 'memory').lower()
+    ttl_seconds = float(os.getenv('SESSION_TTL_SECONDS', '3600'))
+    max_turns = int(os.getenv('SESSION_MAX_TURNS', '20'))
+    
+    if kind == 'sqlite':
+        path = os.getenv('SESSION_SQLITE_PATH') or os.path.join(app.instance_path, 'sessions.db')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        print(f"🗂️ Conversation sessions stored in SQLite file {path}")
+        return SQLSessionBackend(lambda: create_tuned_engine(f'sqlite:///{path}', db_engine_profile,
+                                                             connect_args={'timeout': 30}),
+                                 name='sqlite', ttl_seconds=ttl_seconds, max_turns=max_turns)
+    if kind == 'database':
+        print("🗂️ Conversation sessions stored in the app database")
+        return SQLSessionBackend(_app_database_engine, name='database',
+                                 ttl_seconds=ttl_seconds, max_turns=max_turns)
+    snapshot_path = os.getenv('SESSION_SNAPSHOT_PATH') or None
+    if snapshot_path:
+        os.makedirs(os.path.dirname(os.path.abspath(snapshot_path)), exist_ok=True)
+    store = SessionStore(max_sessions=int(os.getenv('SESSION_MAX_COUNT', '10000')),
+                         ttl_seconds=ttl_seconds, max_turns=max_turns, snapshot_path=snapshot_path)
+    store.start_persistence(float(os.getenv('SESSION_SNAPSHOT_INTERVAL_SECONDS', '0')))
+    return store
+
+def record_chat_stats(connection, rows):
+    """Fold ChatHistory rows about to be inserted into their users' UserChatStats (same transaction)
+
+    Run before the rows are inserted: a chat on a day before the user's latest chat only adds an
+    active day if no chat exists on that day yet, checked on the (user_id, timestamp) index.
+    """
+    stats_table, chats = UserChatStats.__table__, ChatHistory.__table__
+    timestamps = {}
+    for row in rows:
+        timestamps.setdefault(row['user_id'], []).append(row['timestamp'])
+    
+    for user_id, times in timestamps.items():
+        # Create the row if missing, then lock it so concurrent writers count each new day once
+        dialect = connection.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+            connection.execute(insert(stats_table).values(user_id=user_id, total_chats=0, active_days=0)
+                               .on_conflict_do_nothing(index_elements=['user_id']))
+        elif connection.execute(select(stats_table.c.user_id).where(stats_table.c.user_id == user_id)).first() is None:
+            try:
+                with connection.begin_nested():
+                    connection.execute(stats_table.insert().values(user_id=user_id, total_chats=0, active_days=0))
+            except IntegrityError:
+                pass  # a concurrent writer created it first
+        stats = connection.execute(select(stats_table).where(stats_table.c.user_id == user_id)
+                                   .with_for_update()).one()
+        
+        last_day = stats.last_chat_at.date() if stats.last_chat_at else None
+        new_days = 0
+        for day in {timestamp.date() for timestamp in times}:
+            if last_day is None or day > last_day:
+                new_days += 1
+            elif day < last_day:
+                start = datetime.combine(day, datetime.min.time())
+                seen = connection.execute(select(chats.c.id).where(
+                    chats.c.user_id == user_id, chats.c.timestamp >= start,
+                    chats.c.timestamp < start + timedelta(days=1)).limit(1)).first()
+                new_days += seen is None
+        
+        connection.execute(update(stats_table).where(stats_table.c.user_id == user_id).values(
+            total_chats=stats.total_chats + len(times),
+            active_days=stats.active_days + new_days,
+            first_chat_at=min([stats.first_chat_at, *times] if stats.first_chat_at else times),
+            last_chat_at=max([stats.last_chat_at, *times] if stats.last_chat_at else times)))
+
+class ChatHistorySpool:
+    """Append-only local file of the rows queued in a ChatHistoryWriter, so a crash does not lose them
+
+    Each process appends to its own file (path.<pid>), holding a lock on it while it runs: one
+    JSON line per queued row, then {"done": n} once the writer has committed (or dropped) the
+    next n rows - the queue is first in, first out, so the rows still owed are everything after
+    the acknowledged prefix. The file is emptied whenever the queue drains and rewritten with
+    just the owed rows once it grows past max_bytes. At startup replay() inserts the rows owed
+    by files of processes that have exited. A crash between a commit and its acknowledgement
+    replays that batch, so rows are written at least once.
+    """
+
+    def __init__(self, path, max_bytes=4 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+        self.file_pid = None
+        self.appended = 0
+        self.replayed = 0
+        self.errors = 0
+
+    @staticmethod
+    def _encode(row):
+        return json.dumps(dict(row, timestamp=row['timestamp'].isoformat()), ensure_ascii=False) + '\n'
+
+    @staticmethod
+    def _lock(f):
+        """Take the file's lock without waiting; False if another process holds it"""
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def _worker_file(self):
+        """This process's spool file, opened on first use - workers forked after import each get their own"""
+        if self.file_pid != os.getpid():
+            self.file = open(f"{self.path}.{os.getpid()}", 'a', encoding='utf-8')
+            self._lock(self.file)
+            self.file_pid = os.getpid()
+        return self.file
+
+    def _write(self, text):
+        try:
+            f = self._worker_file()
+            f.write(text)
+            f.flush()  # in the OS page cache, so a crash or SIGKILL of this process keeps it
+        except OSError as e:
+            self.errors += 1
+            print(f"⚠️ Chat spool write failed: {e}")
+
+    def append(self, row):
+        self._write(self._encode(row))
+        self.appended += 1
+
+    def acknowledge(self, count, pending):
+        """The oldest count rows are in the database; pending are the rows still queued, oldest first"""
+        if not pending or self._worker_file().tell() > self.max_bytes:
+            try:
+                self.file.seek(0)
+                self.file.truncate()
+            except OSError as e:
+                self.errors += 1
+                print(f"⚠️ Chat spool truncate failed: {e}")
+                return
+            if pending:
+                self._write(''.join(self._encode(row) for row in pending))
+        else:
+            self._write(json.dumps({'done': count}) + '\n')
+
+    def replay(self, engine, insert_rows):
+        """Write the rows owed by spool files of exited processes with insert_rows(conn, rows), then remove the files"""
+        replayed = 0
+        prefix = self.path + '.'
+        for path in glob.glob(glob.escape(prefix) + '*'):
+            pid = path[len(prefix):]
+            if not pid.isdigit() or (fcntl is None and int(pid) == os.getpid()):
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    # Skip running workers' files, and files another starting worker just replayed
+                    if not self._lock(f) or not os.path.exists(path) or \
+                            os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                        continue
+                    rows, done = [], 0
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue  # a line torn by the crash
+                        if 'done' in entry:
+                            done += entry['done']
+                        else:
+                            entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+                            rows.append(entry)
+                    owed = rows[done:]
+                    if owed:
+                        with engine.begin() as conn:
+                            insert_rows(conn, owed)
+                    os.remove(path)
+                replayed += len(owed)
+            except FileNotFoundError:
+                continue
+        self.replayed += replayed
+        return replayed
+
+class ChatHistoryWriter:
+    """Write-behind queue for ChatHistory rows, keeping the insert off the /chat response path
+
+    Rows are queued in memory (bounded) and a background thread commits them in batches -
+    one multi-row INSERT and one commit per batch instead of one per message - as soon as
+    batch_size rows are waiting or linger_seconds after the first one, and at shutdown.
+    When the queue is full the row is written synchronously; failed batches are retried,
+    then salvaged row by row. Readers call flush_user() to see their own chats.
+
+    With a spool (ChatHistorySpool) every queued row is also appended to a local file, and
+    rows a crashed process never committed are replayed at the next startup. Serverless
+    platforms may freeze the process after the response with no local disk to replay from,
+    so there the writer is disabled by default.
+    """
+
+    MAX_BATCH_ATTEMPTS = 3
+    RETRY_DELAY_SECONDS = 1.0
+
+    def __init__(self, engine_factory, max_pending=1000, batch_size=100, linger_seconds=0.05, enabled=True,
+                 spool=None):
+        self.engine_factory = engine_factory
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.enabled = enabled
+        self.spool = spool if enabled else None
+        self.table = ChatHistory.__table__
+        self._engine = None
+        self.engine_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.pending = deque()
+        self.writing = []
+        self.writer = None
+        self.failed_attempts = 0
+        self.queued = 0
+        self.sync_writes = 0
+        self.rows_written = 0
+        self.write_batches = 0
+        self.write_errors = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self.engine_lock:
+                if self._engine is None:
+                    self._engine = self.engine_factory()
+        return self._engine
+
+    def submit(self, user_id, message, response, mood=None, session_id=None):
+        """Queue one chat for the background writer; returns False if it had to be written synchronously"""
+        row = {'user_id': user_id, 'message': message, 'response': response, 'mood': mood,
+               'session_id': session_id, 'timestamp': datetime.utcnow()}
+        if self.enabled:
+            with self.condition:
+                if len(self.pending) < self.max_pending:
+                    self.pending.append(row)
+                    if self.spool:
+                        self.spool.append(row)
+                    self.queued += 1
+                    if self.writer is None:
+                        self.writer = threading.Thread(target=self._write_loop, name='chat-history-writer',
+                                                       daemon=True)
+                        self.writer.start()
+                    self.condition.notify()
+                    return True
+        self._write_sync(row)
+        return False
+
+    def submit_after_response(self, user_id, message, response, mood=None, session_id=None):
+        """Save a chat only once the current response has been sent - no DB work before it goes out"""
+        self.after_response(lambda: {'user_id': user_id, 'message': message, 'response': response,
+                                     'mood': mood, 'session_id': session_id})
+
+    def after_response(self, chat):
+        """Save chat() - submit() keyword arguments, or None to skip - when the current response is closed
+
+        Runs after the body was sent (or the client went away), so even a synchronous write
+        does not delay the response.
+        """
+        def save():
+            row = chat()
+            if row is not None:
+                with app.app_context():  # the request context is gone once the response is closed
+                    self.submit(**row)
+
+        def save_on_close(http_response):
+            http_response.call_on_close(save)
+            return http_response
+        after_this_request(save_on_close)
+
+    def insert_rows(self, conn, rows):
+        """Insert chats and update their users' UserChatStats in the caller's transaction"""
+        record_chat_stats(conn, rows)
+        conn.execute(self.table.insert(), rows)
+
+    def _write_sync(self, row):
+        if self.enabled:
+            with self.engine.begin() as conn:
+                self.insert_rows(conn, [row])
+        else:
+            self.insert_rows(db.session.connection(), [row])
+            db.session.commit()
+        with self.condition:
+            self.sync_writes += 1
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                filling = len(self.pending) < self.batch_size
+            if filling and self.linger_seconds:
+                time.sleep(self.linger_seconds)  # let concurrent chats join this batch
+            if not self._write_batch():
+                time.sleep(self.RETRY_DELAY_SECONDS)
+
+    def _write_batch(self):
+        """Commit up to batch_size queued rows in one transaction; False if the batch was requeued"""
+        with self.write_lock:
+            with self.condition:
+                batch = [self.pending.popleft() for _ in range(min(self.batch_size, len(self.pending)))]
+                self.writing = batch
+            if not batch:
+                return True
+            try:
+                with self.engine.begin() as conn:
+                    self.insert_rows(conn, batch)
+                self.rows_written += len(batch)
+                self.write_batches += 1
+                self.failed_attempts = 0
+                self._acknowledge(len(batch))
+                return True
+            except Exception as e:
+                self.write_errors += 1
+                self.failed_attempts += 1
+                print(f"⚠️ Chat history write failed ({len(batch)} rows, attempt {self.failed_attempts}): {e}")
+                if self.failed_attempts < self.MAX_BATCH_ATTEMPTS:
+                    with self.condition:
+                        self.pending.extendleft(reversed(batch))
+                    return False
+                self.failed_attempts = 0
+                self._salvage(batch)
+                self._acknowledge(len(batch))
+                return True
+            finally:
+                with self.condition:
+                    self.writing = []
+
+    def _acknowledge(self, count):
+        """The oldest count queued rows are done with - tell the spool, which may then shrink"""
+        if self.spool:
+            with self.condition:
+                self.spool.acknowledge(count, self.pending)
+
+    def replay_spool(self):
+        """At startup: write the queued rows that a crashed process never committed"""
+        if not self.spool:
+            return 0
+        try:
+            replayed = self.spool.replay(self.engine, self.insert_rows)
+        except Exception as e:
+            print(f"⚠️ Chat spool replay failed: {e}")
+            return 0
+        if replayed:
+            print(f"♻️ Replayed {replayed} queued chat(s) left by a stopped worker")
+        return replayed
+
+    def _salvage(self, batch):
+        """Write a repeatedly failing batch row by row so one bad row cannot block the queue"""
+        for row in batch:
+            try:
+                with self.engine.begin() as conn:
+                    self.insert_rows(conn, [row])
+                self.rows_written += 1
+            except Exception as e:
+                self.dropped += 1
+                print(f"⚠️ Dropped chat history row for user {row['user_id']}: {e}")
+
+    def flush(self):
+        """Write everything queued so far (at shutdown, in tests and before reading a user's chats)"""
+        while True:
+            with self.condition:
+                if not self.pending:
+                    break
+            self._write_batch()
+        with self.write_lock:
+            pass  # wait for a batch the background thread is still committing
+
+    def flush_user(self, user_id):
+        """Flush if any of this user's chats are still queued, so their own reads see them"""
+        with self.condition:
+            waiting = any(row['user_id'] == user_id for row in self.pending) or \
+                      any(row['user_id'] == user_id for row in self.writing)
+        if waiting:
+            self.flush()
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'write_behind': self.enabled,
+                'max_pending': self.max_pending,
+                'batch_size': self.batch_size,
+                'pending': len(self.pending),
+                'queued': self.queued,
+                'sync_writes': self.sync_writes,
+                'rows_written': self.rows_written,
+                'write_batches': self.write_batches,
+                'write_errors': self.write_errors,
+                'dropped': self.dropped,
+                'spool': {'path': self.spool.path, 'appended': self.spool.appended,
+                          'replayed': self.spool.replayed, 'errors': self.spool.errors} if self.spool else None
+            }
+
+def create_chat_history_writer():
+    """ChatHistory writer from CHAT_WRITE_BEHIND (on by default, off on Vercel)
+
+    Serverless invocations may be frozen as soon as the response is returned, so there chats are
+    written synchronously unless CHAT_WRITE_BEHIND=true is set explicitly. An in-memory SQLite
+    database is private to one connection, so it is always written synchronously. Queued rows
+    are spooled to CHAT_WRITE_SPOOL_PATH (instance/chat_spool by default; empty disables it).
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    in_memory = url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+    default = 'false' if os.getenv('VERCEL') else 'true'
+    enabled = os.getenv('CHAT_WRITE_BEHIND', default).lower() == 'true' and not in_memory
+    spool = None
+    spool_path = os.getenv('CHAT_WRITE_SPOOL_PATH', os.path.join(app.instance_path, 'chat_spool'))
+    if enabled:
+        print("📝 Chat history persisted by the background write-behind queue")
+        if spool_path:
+            os.makedirs(os.path.dirname(os.path.abspath(spool_path)), exist_ok=True)
+            spool = ChatHistorySpool(spool_path)
+    return ChatHistoryWriter(_app_database_engine,
+                             max_pending=int(os.getenv('CHAT_WRITE_QUEUE_SIZE', '1000')),
+                             batch_size=int(os.getenv('CHAT_WRITE_BATCH_SIZE', '100')),
+                             linger_seconds=float(os.getenv('CHAT_WRITE_LINGER_SECONDS', '0.05')),
+                             enabled=enabled, spool=spool)
+
+def _deep_sizeof(obj, seen=None):
+    """sys.getsizeof of obj plus everything it references through containers and object attributes"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_deep_sizeof(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    elif hasattr(obj, '__dict__'):
+        size += _deep_sizeof(vars(obj), seen)
+    return size
 
 class SaharaAI:
     def __init__(self):
         self.responses = responses_data
         self.conversation_memory = {}
-        self.user_sessions = {}
-        self.gemini_ai = GeminiAI()  # Initialize Gemini integration
+        # Bounded conversation state - in memory by default, or shared across workers (SESSION_BACKEND)
+        self.user_sessions = create_session_backend()
+        self.summary_token_budget = int(os.getenv('SUMMARY_TOKEN_BUDGET', '80'))
+        self.crisis_detector = CrisisDetector(resources_data.get('crisis_support'))
+        self.gemini_ai = GeminiAI(self.crisis_detector)  # Initialize Gemini integration
         
         # Enhanced context understanding with more nuanced patterns
         self.context_patterns = {
@@ -258,11 +2433,54 @@ class SaharaAI:
                 'casual_expressions': ['no idea what to do', 'everyone else seems sorted', 'feeling so lost', 'koi direction nahi hai']
             }
         }
-    
+
+        self.question_indicators = ['how', 'what', 'why', 'कैसे', 'क्या', 'कैसा', '?']
+        self.negative_indicators = ['not', 'no', 'nahi', 'नहीं', 'cant', 'unable', 'difficult']
+        self.concern_patterns = {
+            'academic': ['marks kam', 'fail', 'competition', 'pressure', 'study'],
+            'family': ['parents angry', 'expectations', 'disappointed', 'ghar mein'],
+            'social': ['friends', 'lonely', 'talk nahi kar', 'awkward'],
+            'emotional': ['sad', 'depressed', 'anxious', 'worried', 'upset']
+        }
+        self.academic_follow_up_words = ['physics', 'maths', 'chemistry', 'study', 'exam', 'subject']
+        self.emotional_follow_up_words = ['sad', 'upset', 'depressed', 'worried', 'anxious']
+
+        self._compile_phrase_tables()
+
+    def _compile_phrase_tables(self):
+        """Build the phrase matcher and per-phrase scoring tables once at startup"""
+        # phrase -> [(context index, group rank, position, context name, phrase)], where
+        # group rank 0 = keywords, 1 = emotional indicators, 2 = Hindi/mixed language
+        self.context_phrase_hits = {}
+        for context_index, (context_name, patterns) in enumerate(self.context_patterns.items()):
+            for group_rank, group in enumerate(('keywords', 'emotional_indicators', 'language_mix')):
+                for position, phrase in enumerate(patterns[group]):
+                    self.context_phrase_hits.setdefault(phrase, []).append(
+                        (context_index, group_rank, position, context_name, phrase))
+
+        # phrase -> [(concern index, position, concern type)]
+        self.concern_phrase_hits = {}
+        for concern_index, (concern_type, indicators) in enumerate(self.concern_patterns.items()):
+            for position, phrase in enumerate(indicators):
+                self.concern_phrase_hits.setdefault(phrase, []).append((concern_index, position, concern_type))
+
+        all_phrases = set(self.context_phrase_hits) | set(self.concern_phrase_hits)
+        all_phrases.update(self.question_indicators, self.negative_indicators,
+                           self.academic_follow_up_words, self.emotional_follow_up_words)
+        for cues, _ in GeminiAI.EMOTIONAL_STYLES:
+            all_phrases.update(cues)
+
+        self.phrase_matcher = PhraseMatcher(all_phrases)
+        self.question_phrases = frozenset(self.question_indicators)
+        self.negative_phrases = frozenset(self.negative_indicators)
+        self.academic_follow_up_phrases = frozenset(self.academic_follow_up_words)
+        self.emotional_follow_up_phrases = frozenset(self.emotional_follow_up_words)
+
     def understand_message_deeply(self, message, session_id=None):
         """Advanced message understanding with context awareness"""
         message_lower = message.lower()
-        
+        matched_phrases = self.phrase_matcher.find(message_lower)
+
         # Initialize analysis
         analysis = {
             'main_topic': None,
@@ -272,39 +2490,23 @@ class SaharaAI:
             'needs_follow_up': False,
             'context_clues': [],
             'sentiment_score': 0,
-            'user_state': 'exploring'
+            'user_state': 'exploring',
+            'matched_phrases': matched_phrases
         }
         
-        # Detect primary context
-        context_scores = {}
-        for context_name, patterns in self.context_patterns.items():
-            score = 0
-            matched_elements = []
-            
-            # Check keywords
-            for keyword in patterns['keywords']:
-                if keyword in message_lower:
-                    score += 2
-                    matched_elements.append(keyword)
-            
-            # Check emotional indicators
-            for emotion in patterns['emotional_indicators']:
-                if emotion in message_lower:
-                    score += 3  # Emotions get higher weight
-                    analysis['emotion'] = emotion
-            
-            # Check Hindi/mixed language
-            for hindi_phrase in patterns['language_mix']:
-                if hindi_phrase in message_lower:
-                    score += 2
-                    matched_elements.append(hindi_phrase)
-            
-            if score > 0:
-                context_scores[context_name] = {
-                    'score': score,
-                    'elements': matched_elements
-                }
-        
+        # Detect primary context - hits are replayed in table order so ties and the
+        # last-matching emotion resolve exactly as a scan of each group would
+        context_scores = {}
+        context_hits = sorted(hit for phrase in matched_phrases for hit in self.context_phrase_hits.get(phrase, ()))
+        for _, group_rank, _, context_name, phrase in context_hits:
+            scores = context_scores.setdefault(context_name, {'score': 0, 'elements': []})
+            if group_rank == 1:
+                scores['score'] += 3  # Emotions get higher weight
+                analysis['emotion'] = phrase
+            else:
+                scores['score'] += 2
+                scores['elements'].append(phrase)
+        
         # Determine main topic
         if context_scores:
             analysis['main_topic'] = max(context_scores.keys(), key=lambda x: context_scores[x]['score'])
@@ -312,104 +2514,130 @@ class SaharaAI:
             analysis['sentiment_score'] = context_scores[analysis['main_topic']]['score']
         
         # Determine user state and needs
-        question_indicators = ['how', 'what', 'why', 'कैसे', 'क्या', 'कैसा', '?']
-        if any(q in message_lower for q in question_indicators):
+        if not matched_phrases.isdisjoint(self.question_phrases):
             analysis['user_state'] = 'seeking_guidance'
             analysis['needs_follow_up'] = True
         
-        negative_indicators = ['not', 'no', 'nahi', 'नहीं', 'cant', 'unable', 'difficult']
-        if any(neg in message_lower for neg in negative_indicators):
+        if not matched_phrases.isdisjoint(self.negative_phrases):
             analysis['user_state'] = 'struggling'
             analysis['needs_follow_up'] = True
         
         # Extract specific concerns
-        concern_patterns = {
-            'academic': ['marks kam', 'fail', 'competition', 'pressure', 'study'],
-            'family': ['parents angry', 'expectations', 'disappointed', 'ghar mein'],
-            'social': ['friends', 'lonely', 'talk nahi kar', 'awkward'],
-            'emotional': ['sad', 'depressed', 'anxious', 'worried', 'upset']
-        }
-        
-        for concern_type, indicators in concern_patterns.items():
-            for indicator in indicators:
-                if indicator in message_lower:
-                    analysis['specific_concerns'].append(concern_type)
+        concern_hits = sorted(hit for phrase in matched_phrases for hit in self.concern_phrase_hits.get(phrase, ()))
+        analysis['specific_concerns'] = [concern_type for _, _, concern_type in concern_hits]
         
         return analysis
 
     def generate_intelligent_response(self, message, session_id=None, mood_context=None, user_context=None):
         """Generate contextually intelligent responses using Gemini AI with local fallback"""
         
-        # Deep analysis of the message
-        analysis = self.understand_message_deeply(message, session_id)
-        
-        # Enhance analysis with mood context if available
-        if mood_context and mood_context.get('has_recent_data'):
-            analysis['mood_context'] = mood_context
-            analysis['user_emotional_state'] = mood_context['recent_emotion']
-            analysis['user_wellness_trend'] = mood_context['wellness_trend']
-        
         # Handle crisis immediately - always use local crisis response
-        crisis_words = ['suicide', 'kill myself', 'end it all', 'want to die', 'मरना चाहता हूं', 'जिंदगी से परेशान']
-        if any(word in message.lower() for word in crisis_words):
-            return {
-                'message': f"मैं समझ सकता हूं कि आप बहुत कठिन समय से गुजर रहे हैं। आपकी जिंदगी मायने रखती है। 🤗\n\n🚨 तुरंत मदद:\n• Aasra: 91-9820466726\n• Sneha: 91-44-24640050\n• आप अकेले नहीं हैं।",
-                'context': 'crisis',
-                'urgent': True,
-                'source': 'local_crisis'
-            }
+        if self.crisis_detector.is_crisis(message):
+            return self.crisis_detector.get_response()
         
-        # Get conversation history for context
-        conversation_history = []
-        if session_id and session_id in self.user_sessions:
-            conversation_history = [msg['user'] for msg in self.user_sessions[session_id]['messages'][-3:]]
+        analysis, conversation_history, session_state = self._prepare_analysis(message, session_id, mood_context)
         
         # Try Gemini AI first
         gemini_response = self.gemini_ai.get_gemini_response(message, analysis, conversation_history)
         
         if gemini_response:
             # Store conversation context
-            self._store_conversation_context(message, analysis, session_id)
+            self._store_conversation_context(message, analysis, session_id, session_state)
             return gemini_response
         
         # Fallback to local intelligent responses
-        response = self._craft_contextual_response(message, analysis, session_id, user_context)
+        response = self._craft_contextual_response(message, analysis, session_id, user_context, session_state)
         response['source'] = 'local_intelligent'
         
         # Store conversation context
-        self._store_conversation_context(message, analysis, session_id)
+        self._store_conversation_context(message, analysis, session_id, session_state)
         
         return response
     
-    def _store_conversation_context(self, message, analysis, session_id):
+    def stream_intelligent_response(self, message, session_id=None, mood_context=None, user_context=None):
+        """Stream a response as ('token', text) events followed by one ('done', response) event"""
+        
+        # Handle crisis immediately - always use local crisis response
+        if self.crisis_detector.is_crisis(message):
+            yield from self.stream_local_response(self.crisis_detector.get_response())
+            return
+        
+        analysis, conversation_history, session_state = self._prepare_analysis(message, session_id, mood_context)
+        
+        # Try Gemini AI first, forwarding text as soon as each chunk arrives
+        streamed_text = []
+        try:
+            for text in self.gemini_ai.stream_gemini_response(message, analysis, conversation_history):
+                streamed_text.append(text)
+                yield 'token', text
+        except StreamInterruptedError as e:
+            # The partial reply is dropped: 'done' carries a complete local reply, which replaces
+            # the tokens already shown, and is what gets stored
+            print(f"Gemini API stream interrupted ({e}) - replacing it with a local response")
+            response = self._craft_contextual_response(message, analysis, session_id, user_context, session_state)
+            response['source'] = 'local_intelligent'
+            response['replaces_partial'] = True
+            self._store_conversation_context(message, analysis, session_id, session_state)
+            yield 'done', response
+            return
+        
+        if streamed_text:
+            response = {
+                'message': ''.join(streamed_text).strip(),
+                'context': analysis.get('main_topic', 'gemini_response'),
+                'source': 'gemini'
+            }
+            self._store_conversation_context(message, analysis, session_id, session_state)
+            yield 'done', response
+            return
+        
+        # Fallback to local intelligent responses, sent through the same stream
+        response = self._craft_contextual_response(message, analysis, session_id, user_context, session_state)
+        response['source'] = 'local_intelligent'
+        self._store_conversation_context(message, analysis, session_id, session_state)
+        yield from self.stream_local_response(response)
+    
+    def stream_local_response(self, response):
+        """Stream an already complete response word by word so clients have one code path"""
+        for piece in re.findall(r'\s*\S+\s*', response['message']) or [response['message']]:
+            yield 'token', piece
+        yield 'done', response
+    
+    def _prepare_analysis(self, message, session_id=None, mood_context=None):
+        """Analyze the message and collect the conversation history used for the reply"""
+        
+        # Deep analysis of the message
+        analysis = self.understand_message_deeply(message, session_id)
+        
+        # Enhance analysis with mood context if available
+        if mood_context and mood_context.get('has_recent_data'):
+            analysis['mood_context'] = mood_context
+            analysis['user_emotional_state'] = mood_context['recent_emotion']
+            analysis['user_wellness_trend'] = mood_context['wellness_trend']
+        
+        # Get conversation history for context
+        # One load of the session state per turn - reused for the reply and the save afterwards
+        session_state = self.user_sessions.load(session_id) if session_id else None
+        conversation_history = session_state.history(3) if session_state else []
+        
+        # Whole-conversation context for Gemini at a fixed prompt cost
+        analysis['conversation_summary'] = (session_state.summary.render(self.summary_token_budget)
+                                            if session_state else '')
+        
+        return analysis, conversation_history, session_state
+    
+    def _store_conversation_context(self, message, analysis, session_id, session_state=None):
         """Store conversation context for continuity"""
         if session_id:
-            if session_id not in self.user_sessions:
-                self.user_sessions[session_id] = {
-                    'messages': [],
-                    'topics_discussed': set(),
-                    'emotional_journey': [],
-                    'rapport_level': 0
-                }
-            
-            self.user_sessions[session_id]['messages'].append({
-                'user': message,
-                'analysis': analysis,
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            if analysis['main_topic']:
-                self.user_sessions[session_id]['topics_discussed'].add(analysis['main_topic'])
-            
-            self.user_sessions[session_id]['emotional_journey'].append(analysis['emotion'])
-            self.user_sessions[session_id]['rapport_level'] += 1
+            session_state = session_state or ConversationState(self.user_sessions.max_turns)
+            session_state.record_turn(message, analysis)
+            self.user_sessions.save(session_id, session_state)
     
-    def _craft_contextual_response(self, message, analysis, session_id=None, user_context=None):
+    def _craft_contextual_response(self, message, analysis, session_id=None, user_context=None, session_state=None):
         """Craft intelligent, contextual responses based on deep analysis"""
         
         # Get session context if available
-        session_context = self.user_sessions.get(session_id, {}) if session_id else {}
-        is_continuing_conversation = len(session_context.get('messages', [])) > 0
+        is_continuing_conversation = session_state is not None and session_state.turn_count > 0
         
         # Get mood context from analysis if available
         mood_context = analysis.get('mood_context', {})
@@ -468,7 +2696,7 @@ class SaharaAI:
             
         # Generate mood-aware greeting
         recent_emotion = mood_context.get('recent_emotion', 'neutral').lower()
-        recent_rating = mood_context.get('recent_rating', 5)
+        recent_rating = mood_context.get('recent_rating') or 5
         trend = mood_context.get('wellness_trend', 'stable')
         
         greeting_variants = {
@@ -516,7 +2744,7 @@ class SaharaAI:
         # Default mood-aware greeting for other emotions
         if recent_rating >= 7:
             return f"Hi! 😊 I can see you've been feeling pretty good lately ({recent_rating}/10). That's great!"
-        elif recent_rating <= 4:
+        elif recent_rating <= 4 and not is_positive_mood(recent_emotion):
             return f"Hey there. 🤗 I see you've been having some rough days recently ({recent_rating}/10). I'm here to listen."
         else:
             return f"Hello! 😌 I noticed you've been tracking your mood - that's a great step for self-awareness."
@@ -527,13 +2755,15 @@ class SaharaAI:
             return ""
             
         recent_emotion = mood_context.get('recent_emotion', 'neutral').lower()
-        recent_rating = mood_context.get('recent_rating', 5)
+        recent_rating = mood_context.get('recent_rating') or 5
         trend = mood_context.get('wellness_trend', 'stable')
+        # recent_rating is the 1-10 intensity of the latest mood; it only signals distress for negative moods
+        rated_low = not is_positive_mood(recent_emotion)
         
         # Generate contextual enhancement based on mood
-        if recent_emotion in ['sad', 'depressed', 'anxious', 'overwhelmed', 'hopeless'] or recent_rating <= 4:
+        if recent_emotion in ['sad', 'depressed', 'anxious', 'overwhelmed', 'hopeless'] or (rated_low and recent_rating <= 4):
             return " Given that you've been going through some tough times lately, I want you to know that what you're feeling is completely valid."
-        elif recent_emotion in ['stressed', 'overwhelmed', 'pressured', 'burnt out'] or recent_rating == 5:
+        elif recent_emotion in ['stressed', 'overwhelmed', 'pressured', 'burnt out'] or (rated_low and recent_rating == 5):
             return " I can see you've been dealing with some stress recently, so let's focus on practical steps that won't add more pressure."
         elif recent_emotion in ['angry', 'frustrated', 'irritated']:
             return " I noticed you've been feeling frustrated lately - sometimes academic pressure can build up and make everything feel more intense."
@@ -614,11 +2844,12 @@ class SaharaAI:
         has_tracked_mood = user_context.get('has_tracked_mood', False) if user_context else False
         
         # Check if it's a follow-up about academic topics
-        if any(word in message.lower() for word in ['physics', 'maths', 'chemistry', 'study', 'exam', 'subject']):
+        matched_phrases = analysis['matched_phrases']
+        if not matched_phrases.isdisjoint(self.academic_follow_up_phrases):
             return self._handle_academic_stress(message, analysis, is_continuing, mood_context)
         
         # Check for emotional words
-        if any(word in message.lower() for word in ['sad', 'upset', 'depressed', 'worried', 'anxious']):
+        if not matched_phrases.isdisjoint(self.emotional_follow_up_phrases):
             return self._handle_general_sadness(message, analysis, is_continuing, mood_context)
             
         if is_continuing:
@@ -651,6 +2882,11 @@ class SaharaAI:
         
         return response
     
+    def stream_response(self, message, user_context=None, mood_context=None):
+        """Streaming counterpart of get_response - yields ('token', text) then ('done', response)"""
+        session_id = user_context.get('session_id', 'anonymous') if user_context else 'anonymous'
+        return self.stream_intelligent_response(message, session_id, mood_context, user_context)
+    
     def get_relevant_resources(self, context):
         resource_mapping = {
             'academic_pressure': ['study_techniques', 'stress_management', 'breathing_exercises'],
@@ -663,8 +2899,57 @@ class SaharaAI:
         return resource_mapping.get(context, ['general_wellness'])
 
 # Mood Context Functions
-def get_mood_context(user=None):
-    """Get recent mood context for AI chat enhancement"""
+class MoodContextCache:
+    """Each user's most recent mood entries, cached for get_mood_context and written through by /mood
+
+    Holds the last RECENT_ENTRIES (mood_label, mood_intensity) pairs per user, newest first
+    (an empty tuple for users with none), so a chat turn reads its mood context without a
+    query. Other workers pick up a new entry within the TTL.
+    """
+
+    RECENT_ENTRIES = 5
+
+    def __init__(self, max_entries=4096, ttl_seconds=300):
+        self.cache = ResponseCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.lock = threading.Lock()
+        self.db_loads = 0
+        self.write_throughs = 0
+
+    def recent(self, user_id):
+        entries = self.cache.get(user_id)
+        if entries is None:
+            rows = db.session.query(MoodEntry.mood_label, MoodEntry.mood_intensity)\
+                             .filter(MoodEntry.user_id == user_id)\
+                             .order_by(MoodEntry.timestamp.desc())\
+                             .limit(self.RECENT_ENTRIES).all()
+            entries = tuple((label, intensity) for label, intensity in rows)
+            self.cache.put(user_id, entries)
+            with self.lock:
+                self.db_loads += 1
+        return entries
+
+    def record(self, user_id, mood_label, mood_intensity):
+        """Put a just-committed entry at the front of the user's cached window"""
+        newest = (mood_label, mood_intensity)
+        if self.cache.update(user_id, lambda entries: (newest,) + entries[:self.RECENT_ENTRIES - 1]):
+            with self.lock:
+                self.write_throughs += 1
+
+    def get_stats(self):
+        stats = self.cache.get_stats()
+        with self.lock:
+            stats.update({'db_loads': self.db_loads, 'write_throughs': self.write_throughs})
+        return stats
+
+mood_context_cache = MoodContextCache(max_entries=int(os.getenv('MOOD_CONTEXT_CACHE_SIZE', '4096')),
+                                      ttl_seconds=float(os.getenv('MOOD_CONTEXT_TTL_SECONDS', '300')))
+
+def summarize_mood_context(recent_entries):
+    """Mood context for the chat engine from (mood_label, mood_intensity) pairs, newest first
+
+    recent_rating is the latest entry's 1-10 mood_intensity, the same value the frontend sends for
+    anonymous users; the wellness trend compares emotion-aware mood_score values.
+    """
     mood_context = {
         'has_recent_data': False,
         'recent_rating': None,
@@ -673,56 +2958,43 @@ def get_mood_context(user=None):
         'wellness_trend': 'stable',
         'context_summary': ''
     }
-    
-    try:
-        if user and user.is_authenticated:
-            # Get user's recent mood entries from database
-            recent_entries = MoodEntry.query.filter_by(user_id=user.id)\
-                           .order_by(MoodEntry.timestamp.desc())\
-                           .limit(5).all()
-                           
-            if recent_entries:
-                mood_context['has_recent_data'] = True
-                latest = recent_entries[0]
-                mood_context['recent_rating'] = latest.rating
-                mood_context['recent_emotion'] = latest.emotion
-                
-                # Analyze dominant emotions
-                emotions = [entry.emotion for entry in recent_entries]
-                emotion_counts = {}
-                for emotion in emotions:
-                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-                mood_context['dominant_emotions'] = sorted(emotion_counts.keys(), 
-                                                         key=emotion_counts.get, reverse=True)[:3]
-                
-                # Determine wellness trend
-                ratings = [entry.rating for entry in recent_entries]
-                if len(ratings) >= 2:
-                    if ratings[0] > ratings[-1]:
-                        mood_context['wellness_trend'] = 'improving'
-                    elif ratings[0] < ratings[-1]:
-                        mood_context['wellness_trend'] = 'declining' 
-                
-        else:
-            # For anonymous users, check localStorage equivalent
-            # This will be handled on frontend and passed to chat endpoint
-            pass
-            
-        # Generate context summary
-        if mood_context['has_recent_data']:
-            emotion = mood_context['recent_emotion']
-            rating = mood_context['recent_rating']
-            trend = mood_context['wellness_trend']
-            
-            mood_context['context_summary'] = f"Recent mood: {emotion} ({rating}/10), trend: {trend}"
-            
-    except Exception as e:
-        print(f"Error getting mood context: {e}")
-        
+    if not recent_entries:
+        return mood_context
+    
+    scores = [mood_score(label, intensity) for label, intensity in recent_entries]
+    mood_context['has_recent_data'] = True
+    mood_context['recent_emotion'], mood_context['recent_rating'] = recent_entries[0]
+    
+    # Most frequent recent labels (ties keep the most recent first)
+    emotion_counts = {}
+    for label, _ in recent_entries:
+        emotion_counts[label] = emotion_counts.get(label, 0) + 1
+    mood_context['dominant_emotions'] = sorted(emotion_counts, key=emotion_counts.get, reverse=True)[:3]
+    
+    # Latest mood score against the oldest in the window
+    if len(scores) >= 2:
+        if round(scores[0]) > round(scores[-1]):
+            mood_context['wellness_trend'] = 'improving'
+        elif round(scores[0]) < round(scores[-1]):
+            mood_context['wellness_trend'] = 'declining'
+    
+    mood_context['context_summary'] = (f"Recent mood: {mood_context['recent_emotion']} "
+                                       f"({mood_context['recent_rating']}/10), trend: {mood_context['wellness_trend']}")
     return mood_context
 
+def get_mood_context(user=None):
+    """Get recent mood context for AI chat enhancement - served from mood_context_cache"""
+    if user and user.is_authenticated:
+        try:
+            return summarize_mood_context(mood_context_cache.recent(user.id))
+        except Exception as e:
+            print(f"Error getting mood context: {e}")
+    # Anonymous users' mood data comes from the frontend (see prepare_chat_context)
+    return summarize_mood_context(())
+
 # Initialize AI
 sahara_ai = SaharaAI()
+chat_history_writer = create_chat_history_writer()
 
 # Authentication Routes
 @app.route('/register', methods=['GET', 'POST'])
@@ -773,6 +3045,8 @@ def login():
 @app.route('/logout', methods=['GET', 'POST'])
 @login_required
 def logout():
+    if current_user.is_authenticated:
+        user_identity_cache.invalidate(current_user.id)
     logout_user()
     
     # Handle AJAX requests (POST from Alpine.js)
@@ -794,27 +3068,55 @@ def logout():
         else:
             return redirect(url_for('landing'))
 
+PROFILE_PAGE_SIZE = 20
+PROFILE_MAX_PAGE_SIZE = 100
+
+def parse_chat_cursor(value):
+    """Parse a '<iso timestamp>,<id>' keyset cursor into (timestamp, id) - raises ValueError if malformed"""
+    timestamp, _, chat_id = value.rpartition(',')
+    return datetime.fromisoformat(timestamp), int(chat_id)
+
+def format_chat_cursor(chat):
+    return f"{chat.timestamp.isoformat()},{chat.id}"
+
+def chat_activity_stats(user_id):
+    """(total chats, distinct active days, first chat time) for a user in one aggregate query
+
+    Plain COUNT / COUNT(DISTINCT date()) / MIN so it runs unchanged on SQLite and PostgreSQL,
+    reading only the (user_id, timestamp) index rather than loading every chat.
+    """
+    return tuple(db.session.query(
+        db.func.count(ChatHistory.id),
+        db.func.count(db.distinct(db.func.date(ChatHistory.timestamp))),
+        db.func.min(ChatHistory.timestamp)
+    ).filter(ChatHistory.user_id == user_id).one())
+
 @app.route('/profile')
 @login_required
 def profile():
-    user_chats = ChatHistory.query.filter_by(user_id=current_user.id).order_by(ChatHistory.timestamp.desc()).all()
-    
-    # Generate insights
-    total_chats = len(user_chats)
-    recent_moods = [chat.mood for chat in user_chats[:10] if chat.mood]
-    common_topics = ['stress', 'anxiety', 'studies', 'family', 'relationships']
-    
-    # Basic mood analysis
-    mood_distribution = {}
-    for mood in recent_moods:
-        mood_distribution[mood] = mood_distribution.get(mood, 0) + 1
-    
-    insights = {
-        'total_conversations': total_chats,
-        'active_days': len(set(chat.timestamp.date() for chat in user_chats)),
-        'most_common_mood': max(mood_distribution, key=mood_distribution.get) if mood_distribution else None,
-        'improvement_trend': 'positive' if len([m for m in recent_moods[-5:] if m in ['happy', 'excited', 'calm']]) > 2 else 'stable'
-    }
+    """Profile and one page of chats - newest first, paged with ?before=<timestamp,id>&limit=
+
+    Every page costs the same however long the history is: insights (first page only) read the
+    user's maintained UserChatStats row and the last ten moods.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', PROFILE_PAGE_SIZE)), 1), PROFILE_MAX_PAGE_SIZE)
+        before = parse_chat_cursor(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+    
+    chat_history_writer.flush_user(current_user.id)  # include chats still in the write-behind queue
+    
+    # Keyset pagination on (timestamp, id) - served by the (user_id, timestamp) index at any depth
+    query = ChatHistory.query.filter(ChatHistory.user_id == current_user.id)
+    if before:
+        before_timestamp, before_id = before
+        query = query.filter(db.or_(ChatHistory.timestamp < before_timestamp,
+                                    db.and_(ChatHistory.timestamp == before_timestamp,
+                                            ChatHistory.id < before_id)))
+    page = query.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc()).limit(limit + 1).all()
+    has_more = len(page) > limit
+    page = page[:limit]
     
     return jsonify({
         'user': {
@@ -823,21 +3125,48 @@ def profile():
             'joined': current_user.created_at.strftime('%B %Y')
         },
         'chats': [{
+            'id': chat.id,
             'message': chat.message,
             'response': chat.response,
             'timestamp': chat.timestamp.strftime('%Y-%m-%d %H:%M'),
             'mood': chat.mood
-        } for chat in user_chats],
-        'insights': insights
+        } for chat in page],
+        'pagination': {
+            'limit': limit,
+            'has_more': has_more,
+            'next_before': format_chat_cursor(page[-1]) if has_more else None
+        },
+        'insights': None if before else profile_insights(current_user.id)
     })
 
+def profile_insights(user_id):
+    """Whole-history insights for the first /profile page - counters from UserChatStats, not a scan"""
+    stats = db.session.get(UserChatStats, user_id)
+    total_chats, active_days = (stats.total_chats, stats.active_days) if stats else (0, 0)
+    recent_moods = [mood for (mood,) in db.session.query(ChatHistory.mood)
+                    .filter(ChatHistory.user_id == user_id)
+                    .order_by(ChatHistory.timestamp.desc()).limit(10) if mood]
+    
+    # Basic mood analysis
+    mood_distribution = {}
+    for mood in recent_moods:
+        mood_distribution[mood] = mood_distribution.get(mood, 0) + 1
+    
+    return {
+        'total_conversations': total_chats,
+        'active_days': active_days,
+        'most_common_mood': max(mood_distribution, key=mood_distribution.get) if mood_distribution else None,
+        'improvement_trend': 'positive' if len([m for m in recent_moods[-5:] if m in ['happy', 'excited', 'calm']]) > 2 else 'stable'
+    }
+
 @app.route('/user-insights')
 @login_required 
 def user_insights():
     """Get personalized insights for the user"""
-    user_chats = ChatHistory.query.filter_by(user_id=current_user.id).all()
+    chat_history_writer.flush_user(current_user.id)
+    total_conversations, active_days, first_chat = chat_activity_stats(current_user.id)
     
-    if not user_chats:
+    if not total_conversations:
         return jsonify({
             'message': 'Start chatting to see your personalized insights!',
             'tips': [
@@ -848,16 +3177,14 @@ def user_insights():
         })
     
     # Analyze conversation patterns
-    total_conversations = len(user_chats)
-    dates_active = set(chat.timestamp.date() for chat in user_chats)
-    consistency_score = len(dates_active) / max(1, (datetime.now().date() - min(dates_active)).days) * 100
+    consistency_score = active_days / max(1, (datetime.now().date() - first_chat.date()).days) * 100
     
     # Generate personalized message
     insights_message = f"""
     🌟 आपकी Sahara journey: 
     
     📊 आपने {total_conversations} बातचीत की हैं
-    📅 {len(dates_active)} दिनों में active रहे हैं  
+    📅 {active_days} दिनों में active रहे हैं  
     💪 Consistency: {consistency_score:.1f}%
     
     Keep growing with Sahara! आप बहुत अच्छा कर रहे हैं। 💚
@@ -867,7 +3194,7 @@ def user_insights():
         'message': insights_message,
         'stats': {
             'total_chats': total_conversations,
-            'active_days': len(dates_active),
+            'active_days': active_days,
             'consistency': round(consistency_score, 1)
         }
     })
@@ -937,21 +3264,8 @@ def modern():
 def classic():
     return render_template('index.html')
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    data = request.get_json()
-    message = data.get('message', '')
-    user_context = data.get('context', {})
-    anonymous_mood_data = data.get('mood_data', {})  # For anonymous users
-    
-    if not message:
-        return jsonify({'error': 'No message provided'}), 400
-    
-    # Add session management for conversation continuity
-    if 'session_id' not in user_context:
-        import uuid
-        user_context['session_id'] = str(uuid.uuid4())
-    
+def prepare_chat_context(user_context, anonymous_mood_data):
+    """Build the mood context and fill journey details into user_context for a chat turn"""
     # Get mood context for AI enhancement
     mood_context = get_mood_context(current_user if current_user.is_authenticated else None)
     
@@ -977,23 +3291,140 @@ def chat():
     user_context['has_tracked_mood'] = user_journey.get('has_tracked_mood', False)
     user_context['session_duration'] = user_journey.get('session_duration', 0)
     
-    response = sahara_ai.get_response(message, user_context, mood_context)
+    return mood_context
+
+def overloaded_response():
+    """503 telling the client when to retry because the model call pool is saturated"""
+    retry_after = sahara_ai.gemini_ai.retry_after
+    response = jsonify({'error': 'Sahara is very busy right now, please try again shortly',
+                        'retry_after': retry_after})
+    return response, 503, {'Retry-After': str(retry_after)}
+
+def format_sse(event, data):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    data = request.get_json()
+    message = data.get('message', '')
+    user_context = data.get('context', {})
+    anonymous_mood_data = data.get('mood_data', {})  # For anonymous users
+    
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    # Add session management for conversation continuity
+    if 'session_id' not in user_context:
+        import uuid
+        user_context['session_id'] = str(uuid.uuid4())
+    
+    # Crisis fast path - answer before any mood lookup, analysis or Gemini call
+    if sahara_ai.crisis_detector.is_crisis(message):
+        response = sahara_ai.crisis_detector.get_response()
+        response['session_id'] = user_context['session_id']
+        # Logged-in crisis exchanges are kept, but written only after the helplines are sent
+        if current_user.is_authenticated:
+            chat_history_writer.submit_after_response(
+                user_id=current_user.id,
+                message=message,
+                response=response['message'],
+                mood=user_context.get('mood'),
+                session_id=user_context['session_id']
+            )
+        return jsonify(response)
+    
+    mood_context = prepare_chat_context(user_context, anonymous_mood_data)
+    
+    try:
+        response = sahara_ai.get_response(message, user_context, mood_context)
+    except ModelOverloadedError:
+        return overloaded_response()
     response['session_id'] = user_context['session_id']  # Return session ID for frontend
     
-    # Save chat history for logged-in users
+    # Save chat history for logged-in users (queued - written in the background)
     if current_user.is_authenticated:
-        chat_history = ChatHistory(
+        chat_history_writer.submit(
             user_id=current_user.id,
             message=message,
-            response=response.get('response', ''),
+            response=response['message'],
             mood=user_context.get('mood'),
             session_id=user_context['session_id']
         )
-        db.session.add(chat_history)
-        db.session.commit()
     
     return jsonify(response)
 
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream the chat response as Server-Sent Events: 'token' frames, then one 'done' frame"""
+    data = request.get_json()
+    message = data.get('message', '')
+    user_context = data.get('context', {})
+    anonymous_mood_data = data.get('mood_data', {})  # For anonymous users
+    
+    if not message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    # Add session management for conversation continuity
+    if 'session_id' not in user_context:
+        user_context['session_id'] = str(uuid.uuid4())
+    
+    # Crisis fast path - same as /chat, no mood lookup, analysis or Gemini call
+    if sahara_ai.crisis_detector.is_crisis(message):
+        events = sahara_ai.stream_local_response(sahara_ai.crisis_detector.get_response())
+    elif sahara_ai.gemini_ai.should_shed_load():
+        return overloaded_response()
+    else:
+        mood_context = prepare_chat_context(user_context, anonymous_mood_data)
+        events = sahara_ai.stream_response(message, user_context, mood_context)
+    
+    reply = {}
+    
+    def generate():
+        for event, payload in events:
+            if event == 'done':
+                payload['session_id'] = user_context['session_id']  # Return session ID for frontend
+                reply.update(payload)
+                yield format_sse('done', payload)
+            else:
+                yield format_sse(event, {'text': payload})
+    
+    # Save chat history for logged-in users when the stream is closed - also if the client
+    # disconnected after the reply was complete; a reply that never completed is not stored
+    if current_user.is_authenticated:
+        user_id = current_user.id
+        chat_history_writer.after_response(lambda: {
+            'user_id': user_id,
+            'message': message,
+            'response': reply['message'],
+            'mood': user_context.get('mood'),
+            'session_id': user_context['session_id']
+        } if reply else None)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _locked_mood_rollup(user_id, day):
+    """This user's rollup row for day, created if missing and locked until the transaction ends"""
+    table = MoodDailyRollup.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+        db.session.execute(insert(table).values(user_id=user_id, day=day)
+                           .on_conflict_do_nothing(index_elements=['user_id', 'day']))
+    elif db.session.get(MoodDailyRollup, (user_id, day)) is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(MoodDailyRollup.empty(user_id, day))
+        except IntegrityError:
+            pass  # a concurrent request created it first
+    return db.session.get(MoodDailyRollup, (user_id, day), with_for_update=True, populate_existing=True)
+
+def record_mood_rollup(mood_entry):
+    """Add a new MoodEntry to its day's rollup in the current transaction (commit both together)"""
+    _locked_mood_rollup(mood_entry.user_id, mood_entry.timestamp.date()).add(
+        mood_entry.mood_label, mood_entry.mood_intensity)
+
 @app.route('/mood', methods=['POST'])
 def track_mood():
     data = request.get_json()
@@ -1012,11 +3443,14 @@ def track_mood():
                 mood_label=mood_label,
                 mood_intensity=int(mood_intensity),
                 notes=notes,
+                timestamp=datetime.utcnow(),
                 session_id=session_id
             )
             
             db.session.add(mood_entry)
+            record_mood_rollup(mood_entry)
             db.session.commit()
+            mood_context_cache.record(current_user.id, mood_entry.mood_label, mood_entry.mood_intensity)
             
             response_data = mood_entry.to_dict()
         else:
@@ -1065,6 +3499,31 @@ def generate_mood_insight(mood_label, intensity, is_authenticated):
     else:
         return f"आपका आज का मूड: {mood_label}। धन्यवाद कि आपने अपनी भावनाओं को साझा किया। हर दिन अलग होता है! 🌟"
 
+MOOD_ANALYTICS_DAYS = 30          # default /mood-history analytics window
+MOOD_ANALYTICS_MAX_DAYS = 3650
+
+def load_mood_rollups(user_id, days=MOOD_ANALYTICS_DAYS):
+    """The user's daily mood rollups for the last `days` days (all time if None), newest first"""
+    query = MoodDailyRollup.query.filter(MoodDailyRollup.user_id == user_id)
+    if days is not None:
+        query = query.filter(MoodDailyRollup.day >= datetime.utcnow().date() - timedelta(days=days - 1))
+    return query.order_by(MoodDailyRollup.day.desc()).all()
+
+def load_mood_rollup_rows(user_id, days=None):
+    """Same rollups as plain column tuples for vectorized_mood_analytics - no ORM objects"""
+    table = MoodDailyRollup.__table__
+    query = select(table.c.day, table.c.entry_count, table.c.score_sum, table.c.min_intensity,
+                   table.c.max_intensity, table.c.label_counts).where(table.c.user_id == user_id)
+    if days is not None:
+        query = query.where(table.c.day >= datetime.utcnow().date() - timedelta(days=days - 1))
+    return db.session.execute(query.order_by(table.c.day.desc())).all()
+
+def user_mood_analytics(user_id, days):
+    """(analytics, engine) - windows longer than the default use NumPy when it is installed"""
+    if (days is None or days > MOOD_ANALYTICS_DAYS) and load_numpy() is not None:
+        return vectorized_mood_analytics(load_mood_rollup_rows(user_id, days)), 'vectorized'
+    return generate_mood_analytics(load_mood_rollups(user_id, days)), 'scalar'
+
 @app.route('/mood-history')
 def get_mood_history():
     """Get mood history - only for authenticated users"""
@@ -1073,11 +3532,20 @@ def get_mood_history():
             mood_entries = MoodEntry.query.filter_by(user_id=current_user.id)\
                                         .order_by(MoodEntry.timestamp.desc())\
                                         .limit(30).all()
+            # ?days=N (default 30, e.g. 90 or 365) or ?days=all
+            if request.args.get('days') == 'all':
+                days = None
+            else:
+                days = request.args.get('days', MOOD_ANALYTICS_DAYS, type=int)
+                days = min(max(days, 1), MOOD_ANALYTICS_MAX_DAYS)
+            analytics, engine = user_mood_analytics(current_user.id, days)
             
             return jsonify({
                 'success': True,
                 'mood_entries': [entry.to_dict() for entry in mood_entries],
-                'analytics': generate_mood_analytics(mood_entries),
+                'analytics': analytics,
+                'analytics_days': days or 'all',
+                'analytics_engine': engine,
                 'is_authenticated': True
             })
         else:
@@ -1121,276 +3589,242 @@ def mood_analytics_dashboard():
     }
     return render_template('mood_analytics_dashboard.html', user=user_data)
 
-def generate_mood_analytics(mood_entries):
-    """Generate comprehensive analytics from mood entries"""
-    from datetime import datetime, timedelta
-    
-    if not mood_entries:
-        return {
-            'total_entries': 0,
-            'average_intensity': 0.0,
-            'current_streak': 0,
-            'wellness_score': 0.0,
-            'mood_distribution': {},
-            'trend': 'No data available',
-            'streak_message': 'Start tracking to build your streak!',
-            'wellness_message': 'Begin your wellness journey'
-        }
-    
-    total_entries = len(mood_entries)
-    
-    # Calculate emotion-aware average mood score (considering emotion type + intensity)
-    def calculate_mood_score(entry):
-        """Calculate actual mood score considering emotion valence and intensity"""
-        emotion_valence = {
-            'happy': 1.0, 'excited': 1.0, 'content': 0.8, 'calm': 0.7,
-            'hopeful': 0.9, 'grateful': 0.9, 'neutral': 0.5, 'tired': 0.3,
-            'bored': 0.4, 'confused': 0.3, 'worried': 0.2, 'stressed': 0.2,
-            'anxious': 0.1, 'sad': 0.1, 'angry': 0.0, 'frustrated': 0.1,
-            'depressed': 0.0, 'overwhelmed': 0.1
-        }
-        
-        valence = emotion_valence.get(entry.mood_label.lower(), 0.5)
-        
-        if valence >= 0.5:  # Positive emotion
-            return valence * entry.mood_intensity
-        else:  # Negative emotion - higher intensity = worse mood
-            return valence * (11 - entry.mood_intensity)
-    
-    # Calculate proper average mood considering emotion types
-    mood_scores = [calculate_mood_score(entry) for entry in mood_entries]
-    avg_intensity = sum(mood_scores) / len(mood_scores)
-    
-    # Count mood distribution
+EMPTY_MOOD_ANALYTICS = {
+    'total_entries': 0,
+    'average_intensity': 0.0,
+    'current_streak': 0,
+    'wellness_score': 0.0,
+    'mood_distribution': {},
+    'trend': 'No data available',
+    'streak_message': 'Start tracking to build your streak!',
+    'wellness_message': 'Begin your wellness journey'
+}
+
+def generate_mood_analytics(rollups, now=None):
+    """Every dashboard metric from daily mood rollups (newest day first) in a single pass
+
+    Distribution, intensity range, average score, streak, wellness and trend are accumulated
+    together; the trend signals only need per-day totals for the six most recent active days.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    recent_cutoff = (now - timedelta(days=7)).date()
+    one_day = timedelta(days=1)
+    
+    total_count, total_score = 0, 0.0
+    recent_count, recent_score = 0, 0.0
+    today_count, today_score = 0, 0.0
+    head_counts, head_scores = [], []   # the six most recent active days, for trend signals
     mood_counts = {}
-    for entry in mood_entries:
-        mood_counts[entry.mood_label] = mood_counts.get(entry.mood_label, 0) + 1
-    
-    # Calculate current streak (consecutive days with entries)
-    current_streak = calculate_mood_streak(mood_entries)
-    
-    # Calculate wellness score (based on intensity, consistency, and positive trends)
-    wellness_score = calculate_wellness_score(mood_entries)
-    
-    # Determine trend
-    trend = calculate_mood_trend(mood_entries)
+    low = high = None
+    streak, expected_day = 0, None
+    
+    for rollup in rollups:
+        count = rollup.entry_count
+        if not count:
+            continue
+        day, score = rollup.day, rollup.score_sum
+        total_count += count
+        total_score += score
+        for label, label_count in rollup.labels().items():
+            mood_counts[label] = mood_counts.get(label, 0) + label_count
+        low = rollup.min_intensity if low is None else min(low, rollup.min_intensity)
+        high = rollup.max_intensity if high is None else max(high, rollup.max_intensity)
+        
+        # Streak: consecutive days back from today or yesterday
+        if expected_day is None:
+            if day in (today, today - one_day):
+                streak, expected_day = 1, day - one_day
+            else:
+                expected_day = False
+        elif expected_day and day == expected_day:
+            streak += 1
+            expected_day = day - one_day
+        else:
+            expected_day = False
+        
+        if day >= recent_cutoff:
+            recent_count += count
+            recent_score += score
+            if day == today:
+                today_count += count
+                today_score += score
+        if len(head_counts) < 6:
+            head_counts.append(count)
+            head_scores.append(score)
+    
+    if not total_count:
+        return dict(EMPTY_MOOD_ANALYTICS)
+    return _finish_mood_analytics(total_count, total_score, recent_count, recent_score, today_count, today_score,
+                                  head_counts, head_scores, mood_counts, [low, high], streak)
+
+def _finish_mood_analytics(total_count, total_score, recent_count, recent_score, today_count, today_score,
+                           head_counts, head_scores, mood_counts, intensity_range, streak):
+    """Wellness, trend and messages from the accumulated totals (shared by the scalar and NumPy engines)"""
+    def average(start, stop):
+        count = sum(head_counts[start:stop])
+        return sum(head_scores[start:stop]) / count if count else 0.0
+    
+    def clamp(score):
+        return min(max(score, 0), 10)
+    
+    active_days = len(head_counts)
+    
+    # Wellness (0-10): recent days 70% (today weighted heavily), 2-day trend 20%, consistency 10%
+    if recent_count:
+        recent_avg = clamp(recent_score / recent_count)
+        if today_count:
+            recent_avg = (recent_avg * 0.3) + (clamp(today_score / today_count) * 0.7)
+        wellness = recent_avg * 0.7
+    else:
+        wellness = clamp(total_score / total_count) * 0.5
+    if active_days >= 4:
+        latest, previous = clamp(average(0, 2)), clamp(average(2, 4))
+        if latest > previous + 1:
+            trend_score = 2.0
+        elif latest > previous:
+            trend_score = 1.0
+        elif latest == previous:
+            trend_score = 0.5
+        else:
+            trend_score = 0
+    else:
+        trend_score = 0.5
+    wellness += trend_score * 0.2
+    wellness += min((recent_count or total_count) / 7.0, 1.0) * 0.1
+    wellness_score = min(round(wellness, 1), 10.0)
     
-    # Generate motivational messages
-    streak_message = get_streak_message(current_streak)
-    wellness_message = get_wellness_message(wellness_score)
+    # Trend: the 3 most recent active days against the 3 before them
+    if total_count < 3:
+        trend = "Building data"
+    else:
+        recent_avg = average(0, 3)
+        if active_days >= 6:
+            diff = recent_avg - average(3, 6)
+            if diff > 1:
+                trend = "Significantly improving"
+            elif diff > 0.5:
+                trend = "Improving"
+            elif diff < -1:
+                trend = "Needs attention"
+            elif diff < -0.5:
+                trend = "Declining"
+            else:
+                trend = "Stable"
+        elif recent_avg >= 7:
+            trend = "Doing well"
+        elif recent_avg >= 5:
+            trend = "Moderate"
+        else:
+            trend = "Needs support"
     
     return {
-        'total_entries': total_entries,
-        'average_intensity': round(avg_intensity, 1),
-        'current_streak': current_streak,
+        'total_entries': total_count,
+        'average_intensity': round(total_score / total_count, 1),
+        'current_streak': streak,
         'wellness_score': round(wellness_score, 1),
         'mood_distribution': mood_counts,
+        'intensity_range': intensity_range,
         'trend': trend,
-        'streak_message': streak_message,
-        'wellness_message': wellness_message
+        'streak_message': get_streak_message(streak),
+        'wellness_message': get_wellness_message(wellness_score)
     }
 
-def calculate_mood_streak(mood_entries):
-    """Calculate current consecutive day streak"""
-    if not mood_entries:
-        return 0
-    
-    from datetime import datetime, timedelta
-    
-    # Sort entries by date (newest first)
-    sorted_entries = sorted(mood_entries, key=lambda x: x.timestamp, reverse=True)
-    
-    # Get unique dates (in case multiple entries per day)
-    unique_dates = []
-    seen_dates = set()
-    
-    for entry in sorted_entries:
-        date_only = entry.timestamp.date()
-        if date_only not in seen_dates:
-            unique_dates.append(date_only)
-            seen_dates.add(date_only)
-    
-    if not unique_dates:
-        return 0
-    
-    # Calculate streak starting from most recent date
-    today = datetime.now().date()
-    streak = 0
-    
-    # Check if there's an entry today or yesterday
-    most_recent = unique_dates[0]
-    if most_recent == today:
-        streak = 1
-        check_date = today - timedelta(days=1)
-    elif most_recent == today - timedelta(days=1):
-        streak = 1
-        check_date = most_recent - timedelta(days=1)
-    else:
-        return 0  # No recent activity
-    
-    # Count consecutive days backwards
-    for date in unique_dates[1:]:
-        if date == check_date:
-            streak += 1
-            check_date = check_date - timedelta(days=1)
-        else:
-            break
-    
-    return streak
-
-def calculate_wellness_score(mood_entries):
-    """Calculate wellness score based on current mental state considering both emotion type and intensity (0-10 scale)"""
-    if not mood_entries:
-        return 0.0
-    
-    from datetime import datetime, timedelta
-    
-    # Define emotion valence (how positive/negative each emotion is)
-    emotion_valence = {
-        'happy': 1.0,    # Very positive
-        'excited': 1.0,  # Very positive  
-        'content': 0.8,  # Positive
-        'calm': 0.7,     # Positive
-        'hopeful': 0.9,  # Very positive
-        'grateful': 0.9, # Very positive
-        'neutral': 0.5,  # Neutral
-        'tired': 0.3,    # Slightly negative
-        'bored': 0.4,    # Slightly negative
-        'confused': 0.3, # Slightly negative
-        'worried': 0.2,  # Negative
-        'stressed': 0.2, # Negative
-        'anxious': 0.1,  # Very negative
-        'sad': 0.1,      # Very negative
-        'angry': 0.0,    # Very negative
-        'frustrated': 0.1, # Very negative
-        'depressed': 0.0,  # Very negative
-        'overwhelmed': 0.1 # Very negative
-    }
-    
-    def calculate_entry_wellness(entry):
-        """Calculate wellness score for a single entry (0-10)"""
-        # Get emotion valence (default to neutral if unknown emotion)
-        valence = emotion_valence.get(entry.mood_label.lower(), 0.5)
-        
-        # Convert intensity (1-10) to wellness impact
-        # For positive emotions: higher intensity = better wellness
-        # For negative emotions: higher intensity = worse wellness  
-        if valence >= 0.5:  # Positive or neutral emotion
-            wellness = valence * entry.mood_intensity
-        else:  # Negative emotion
-            # For negative emotions, higher intensity means worse wellness
-            # angry with intensity 10 = extremely angry = very bad wellness (near 0)
-            # angry with intensity 1 = slightly angry = somewhat bad wellness 
-            wellness = valence * (11 - entry.mood_intensity)
-        
-        return min(max(wellness, 0), 10)  # Ensure 0-10 range
-    
-    # Prioritize recent entries (last 7 days) - 70% weight
-    recent_cutoff = datetime.now() - timedelta(days=7)
-    recent_entries = [e for e in mood_entries if e.timestamp >= recent_cutoff]
-    
-    if recent_entries:
-        # Calculate wellness for recent entries
-        recent_wellness_scores = [calculate_entry_wellness(entry) for entry in recent_entries]
-        recent_avg = sum(recent_wellness_scores) / len(recent_wellness_scores)
-        
-        # Today's mood (if exists) gets extra weight
-        today = datetime.now().date()
-        today_entries = [e for e in recent_entries if e.timestamp.date() == today]
-        if today_entries:
-            today_wellness_scores = [calculate_entry_wellness(entry) for entry in today_entries]
-            today_avg = sum(today_wellness_scores) / len(today_wellness_scores)
-            recent_score = (recent_avg * 0.3) + (today_avg * 0.7)  # Heavily weight today's mood
-        else:
-            recent_score = recent_avg
-        
-        recent_weighted = recent_score * 0.7
-    else:
-        # No recent data, use overall average with penalty
-        all_wellness_scores = [calculate_entry_wellness(entry) for entry in mood_entries]
-        recent_weighted = (sum(all_wellness_scores) / len(all_wellness_scores)) * 0.5
-    
-    # Overall trend factor - 20% weight
-    trend_score = 0
-    if len(mood_entries) >= 4:
-        # Compare last 2 entries with previous 2 entries
-        recent_two = mood_entries[:2]
-        previous_two = mood_entries[2:4]
-        
-        recent_wellness = sum(calculate_entry_wellness(e) for e in recent_two) / len(recent_two)
-        previous_wellness = sum(calculate_entry_wellness(e) for e in previous_two) / len(previous_two)
-        
-        if recent_wellness > previous_wellness + 1:
-            trend_score = 2.0  # Significant improvement
-        elif recent_wellness > previous_wellness:
-            trend_score = 1.0  # Improving
-        elif recent_wellness == previous_wellness:
-            trend_score = 0.5  # Stable
-        else:
-            trend_score = 0  # Declining (concerning)
+def vectorized_mood_analytics(rows, now=None):
+    """generate_mood_analytics() plus long-horizon series, computed with NumPy array operations
+
+    rows are (day, entry_count, score_sum, min_intensity, max_intensity, label_counts) tuples,
+    newest day first, as returned by load_mood_rollup_rows(). Headline metrics equal the scalar
+    engine's exactly (prefix sums keep its summation order); 'series' adds a dense 7-day rolling
+    average score from the first active day to today, Monday-based weekly wellness buckets and
+    the trend slope in score per week.
+    """
+    np = load_numpy()
+    now = now or datetime.now()
+    rows = [row for row in rows if row[1]]
+    if not rows:
+        analytics = dict(EMPTY_MOOD_ANALYTICS)
+        analytics['series'] = {'rolling_average_7d': {'start': None, 'values': []}, 'weekly': [],
+                               'trend_slope_per_week': 0.0}
+        return analytics
+    
+    days, counts, scores, lows, highs, labels = zip(*rows)
+    ordinals = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(days))
+    counts = np.asarray(counts, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    count_totals, score_totals = np.cumsum(counts), np.cumsum(scores)
+    today = now.date().toordinal()
+    
+    # Streak: leading run of consecutive days, starting today or yesterday
+    if ordinals[0] in (today, today - 1):
+        breaks = np.flatnonzero(ordinals[:-1] - ordinals[1:] != 1)
+        streak = int(breaks[0]) + 1 if breaks.size else len(ordinals)
     else:
-        # Not enough data, give neutral score
-        trend_score = 0.5
-    
-    trend_weighted = trend_score * 0.2
-    
-    # Consistency factor - 10% weight (minimal impact)
-    consistency_score = min(len(recent_entries if recent_entries else mood_entries) / 7.0, 1.0) * 1.0
-    consistency_weighted = consistency_score * 0.1
+        streak = 0
     
-    # Calculate final score
-    final_score = recent_weighted + trend_weighted + consistency_weighted
+    # Days are sorted newest first, so the last week is a prefix
+    recent_days = int(np.count_nonzero(ordinals >= (now - timedelta(days=7)).date().toordinal()))
+    recent_count = int(count_totals[recent_days - 1]) if recent_days else 0
+    recent_score = float(score_totals[recent_days - 1]) if recent_days else 0.0
+    today_index = np.flatnonzero(ordinals == today)
+    today_count = int(counts[today_index[0]]) if today_index.size else 0
+    today_score = float(scores[today_index[0]]) if today_index.size else 0.0
     
-    return min(round(final_score, 1), 10.0)
+    # All histograms decoded in one parse
+    mood_counts = {}
+    for histogram in json.loads('[' + ','.join(labels) + ']'):
+        for label, label_count in histogram.items():
+            mood_counts[label] = mood_counts.get(label, 0) + label_count
+    
+    analytics = _finish_mood_analytics(
+        int(count_totals[-1]), float(score_totals[-1]), recent_count, recent_score, today_count, today_score,
+        counts[:6].tolist(), scores[:6].tolist(), mood_counts, [int(min(lows)), int(max(highs))], streak)
+    analytics['series'] = _mood_series(np, ordinals, counts, scores, max(int(ordinals[0]), today))
+    return analytics
 
-def calculate_mood_trend(mood_entries):
-    """Calculate mood trend description using emotion-aware scoring"""
-    if len(mood_entries) < 3:
-        return "Building data"
-    
-    # Define emotion valence for proper mood scoring
-    emotion_valence = {
-        'happy': 1.0, 'excited': 1.0, 'content': 0.8, 'calm': 0.7,
-        'hopeful': 0.9, 'grateful': 0.9, 'neutral': 0.5, 'tired': 0.3,
-        'bored': 0.4, 'confused': 0.3, 'worried': 0.2, 'stressed': 0.2,
-        'anxious': 0.1, 'sad': 0.1, 'angry': 0.0, 'frustrated': 0.1,
-        'depressed': 0.0, 'overwhelmed': 0.1
-    }
-    
-    def calculate_mood_score(entry):
-        valence = emotion_valence.get(entry.mood_label.lower(), 0.5)
-        if valence >= 0.5:
-            return valence * entry.mood_intensity
-        else:
-            return valence * (11 - entry.mood_intensity)
-    
-    # Compare recent entries with older ones using proper mood scores
-    recent_scores = [calculate_mood_score(e) for e in mood_entries[:3]]
-    recent_avg = sum(recent_scores) / len(recent_scores)
-    
-    if len(mood_entries) >= 6:
-        older_scores = [calculate_mood_score(e) for e in mood_entries[3:6]]
-        older_avg = sum(older_scores) / len(older_scores)
-        diff = recent_avg - older_avg
-        
-        if diff > 1:
-            return "Significantly improving"
-        elif diff > 0.5:
-            return "Improving"
-        elif diff < -1:
-            return "Needs attention"
-        elif diff < -0.5:
-            return "Declining"
-        else:
-            return "Stable"
-    else:
-        # Not enough data for comparison
-        if recent_avg >= 7:
-            return "Doing well"
-        elif recent_avg >= 5:
-            return "Moderate"
-        else:
-            return "Needs support"
+def _mood_series(np, ordinals, counts, scores, last_ordinal):
+    """Rolling, weekly and slope series over a dense calendar from the first active day to last_ordinal"""
+    first_ordinal = int(ordinals.min())
+    span = last_ordinal - first_ordinal + 1
+    daily_counts = np.zeros(span, dtype=np.int64)
+    daily_scores = np.zeros(span, dtype=np.float64)
+    daily_counts[ordinals - first_ordinal] = counts
+    daily_scores[ordinals - first_ordinal] = scores
+    
+    # 7-day rolling average score (entry-weighted) from cumulative sums
+    cumulative_counts = np.concatenate(([0], np.cumsum(daily_counts)))
+    cumulative_scores = np.concatenate(([0.0], np.cumsum(daily_scores)))
+    window_start = np.maximum(np.arange(span) - 6, 0)
+    window_counts = cumulative_counts[1:] - cumulative_counts[window_start]
+    window_scores = cumulative_scores[1:] - cumulative_scores[window_start]
+    rolling = np.divide(window_scores, window_counts, out=np.full(span, np.nan), where=window_counts > 0)
+    rolling_average = {'start': datetime.fromordinal(first_ordinal).date().isoformat(),
+                       'values': [None if value != value else value for value in np.round(rolling, 2).tolist()]}
+    
+    # Weekly buckets (ordinal 1 is a Monday): entries, average score and clamped wellness
+    weeks = (ordinals - 1) // 7
+    first_week = int(weeks.min())
+    week_counts = np.bincount(weeks - first_week, weights=counts)
+    week_scores = np.bincount(weeks - first_week, weights=scores)
+    active = np.flatnonzero(week_counts)
+    averages = week_scores[active] / week_counts[active]
+    # datetime64 counts days from 1970-01-01, which is ordinal 719163
+    week_starts = ((active + first_week) * 7 + 1 - 719163).astype('datetime64[D]').astype(str)
+    weekly = [{'week_start': week_start, 'entries': entries, 'average_score': average, 'wellness': wellness}
+              for week_start, entries, average, wellness in zip(
+                  week_starts.tolist(), week_counts[active].astype(np.int64).tolist(),
+                  np.round(averages, 2).tolist(), np.round(np.clip(averages, 0.0, 10.0), 1).tolist())]
+    
+    # Entry-weighted least-squares slope of the daily average score, per week
+    weights = counts.astype(np.float64)
+    daily_average = scores / weights
+    mean_day = np.dot(weights, ordinals) / weights.sum()
+    mean_score = np.dot(weights, daily_average) / weights.sum()
+    spread = np.dot(weights, (ordinals - mean_day) ** 2)
+    slope = np.dot(weights, (ordinals - mean_day) * (daily_average - mean_score)) / spread if spread else 0.0
+    
+    return {'rolling_average_7d': rolling_average, 'weekly': weekly,
+            'trend_slope_per_week': round(float(slope) * 7, 3)}
 
 def get_streak_message(streak):
     """Get motivational streak message"""
@@ -1467,6 +3901,17 @@ def analytics():
     
     return jsonify({'status': 'recorded'})
 
+@app.route('/ai-status')
+def ai_status():
+    """Gemini circuit breaker state - shows when chat is degraded to local responses"""
+    status = sahara_ai.gemini_ai.get_status()
+    status['session_store'] = sahara_ai.user_sessions.get_stats()
+    status['chat_history_writer'] = chat_history_writer.get_stats()
+    status['db_engine_profile'] = db_engine_profile
+    status['user_identity_cache'] = user_identity_cache.get_stats()
+    status['mood_context_cache'] = mood_context_cache.get_stats()
+    return jsonify(status)
+
 @app.route('/manifest.json')
 def manifest():
     """Serve PWA manifest"""
@@ -1477,10 +3922,143 @@ def service_worker():
     """Serve service worker"""
     return send_from_directory('static', 'sw.js')
 
+def _create_hot_query_indexes(connection):
+    for model in (ChatHistory, MoodEntry):
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+def rebuild_mood_rollups(connection, user_id=None):
+    """Recompute MoodDailyRollup rows from raw MoodEntry rows (one user, or everyone); returns rows written"""
+    rollup_table, entries = MoodDailyRollup.__table__, MoodEntry.__table__
+    query = select(entries.c.user_id, entries.c.timestamp, entries.c.mood_label, entries.c.mood_intensity)\
+        .where(entries.c.user_id.isnot(None), entries.c.timestamp.isnot(None))
+    clear = delete(rollup_table)
+    if user_id is not None:
+        query = query.where(entries.c.user_id == user_id)
+        clear = clear.where(rollup_table.c.user_id == user_id)
+    
+    rollups = {}
+    for row in connection.execute(query):
+        key = (row.user_id, row.timestamp.date())
+        if key not in rollups:
+            rollups[key] = MoodDailyRollup.empty(*key)
+        rollups[key].add(row.mood_label, row.mood_intensity)
+    
+    connection.execute(clear)
+    rows = [{column.name: getattr(rollup, column.name) for column in rollup_table.columns}
+            for rollup in rollups.values()]
+    for offset in range(0, len(rows), 1000):
+        connection.execute(rollup_table.insert(), rows[offset:offset + 1000])
+    return len(rows)
+
+def _backfill_mood_rollups(connection):
+    MoodDailyRollup.__table__.create(connection, checkfirst=True)
+    rebuild_mood_rollups(connection)
+
+def rebuild_chat_stats(connection, user_id=None):
+    """Recompute UserChatStats rows from ChatHistory (one user, or everyone); returns rows written"""
+    stats_table, chats = UserChatStats.__table__, ChatHistory.__table__
+    query = select(chats.c.user_id, db.func.count(chats.c.id),
+                   db.func.count(db.distinct(db.func.date(chats.c.timestamp))),
+                   db.func.min(chats.c.timestamp), db.func.max(chats.c.timestamp)).group_by(chats.c.user_id)
+    clear = delete(stats_table)
+    if user_id is not None:
+        query = query.where(chats.c.user_id == user_id)
+        clear = clear.where(stats_table.c.user_id == user_id)
+    
+    rows = [{'user_id': user, 'total_chats': total, 'active_days': days,
+             'first_chat_at': first, 'last_chat_at': last}
+            for user, total, days, first, last in connection.execute(query)]
+    connection.execute(clear)
+    for offset in range(0, len(rows), 1000):
+        connection.execute(stats_table.insert(), rows[offset:offset + 1000])
+    return len(rows)
+
+def _backfill_chat_stats(connection):
+    UserChatStats.__table__.create(connection, checkfirst=True)
+    rebuild_chat_stats(connection)
+
+# db.create_all() only creates missing tables - changes to existing tables are applied here.
+# Each migration runs once per database and must be idempotent; append new ones, never reorder.
+SCHEMA_MIGRATIONS = [
+    ('0001_hot_query_indexes', 'Add (user_id, timestamp) and session_id indexes to chat_history and mood_entry',
+     _create_hot_query_indexes),
+    ('0002_mood_daily_rollups', 'Create mood_daily_rollup and backfill it from mood_entry',
+     _backfill_mood_rollups),
+    ('0003_user_chat_stats', 'Create user_chat_stats and backfill it from chat_history',
+     _backfill_chat_stats),
+]
+
+def run_schema_migrations(engine=None):
+    """Apply pending SCHEMA_MIGRATIONS to engine (the app database by default), returning the ids applied"""
+    if engine is None:
+        with app.app_context():
+            engine = db.engine
+    
+    table = SchemaMigration.__table__
+    table.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        done = set(connection.execute(select(table.c.id)).scalars())
+    
+    applied = []
+    for migration_id, description, migrate in SCHEMA_MIGRATIONS:
+        if migration_id in done:
+            continue
+        if _apply_schema_migration(engine, migration_id, description, migrate):
+            print(f"🛠️ Applied schema migration {migration_id}: {description}")
+            applied.append(migration_id)
+        else:
+            print(f"⏭️ Schema migration {migration_id} already applied by another worker")
+    return applied
+
+def _apply_schema_migration(engine, migration_id, description, migrate):
+    """Run one migration in a transaction that claims its schema_migration row first
+
+    Workers starting together all try to insert the row; the others block on it until the
+    first commits and then get an IntegrityError, so each migration runs exactly once.
+    Returns False if another worker had already claimed it.
+    """
+    table = SchemaMigration.__table__
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(table.insert().values(id=migration_id, description=description,
+                                                     applied_at=datetime.utcnow()))
+        except IntegrityError:
+            transaction.rollback()
+            return False
+        try:
+            migrate(connection)
+        except Exception:
+            transaction.rollback()
+            raise
+        transaction.commit()
+    return True
+
+@app.cli.command('migrate-db')
+def migrate_db_command():
+    """Create missing tables and apply pending schema migrations"""
+    with app.app_context():
+        db.create_all()
+    applied = run_schema_migrations()
+    print(f"✅ Database up to date ({len(applied)} migration(s) applied)")
+
+@app.cli.command('backfill-mood-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rollups')
+def backfill_mood_rollups_command(user_id):
+    """Rebuild daily mood rollups from raw mood entries"""
+    with app.app_context():
+        MoodDailyRollup.__table__.create(db.engine, checkfirst=True)
+        with db.engine.begin() as connection:
+            written = rebuild_mood_rollups(connection, user_id)
+    print(f"✅ Rebuilt {written} daily mood rollup(s)")
+
 # Initialize database tables
 try:
     with app.app_context():
         db.create_all()
+    run_schema_migrations()
+    chat_history_writer.replay_spool()
 except Exception as e:
     print(f"Database initialization error: {e}")
 
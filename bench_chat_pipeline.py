@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /chat throughput and degradation against the fake Gemini backend
+Runs the whole chat pipeline offline - tune the backend with the FAKE_GEMINI_*
+variables (see .env.example) and the load with the arguments below, e.g.
+
+    FAKE_GEMINI_ERROR_RATE=0.2 python bench_chat_pipeline.py --concurrency 32 --requests 400
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('GEMINI_BACKEND', 'fake')
+os.environ.setdefault('FAKE_GEMINI_LATENCY_MS', '300')
+os.environ.setdefault('FAKE_GEMINI_LATENCY_JITTER_MS', '150')
+
+from app import app, sahara_ai
+from conftest import SAMPLE_MESSAGES
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_load(concurrency, total):
+    """Fire total /chat requests from concurrency threads, returning (latencies ms, sources, elapsed s)"""
+    latencies, sources = [], Counter()
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker(worker_id):
+        client = app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            message = SAMPLE_MESSAGES[index % len(SAMPLE_MESSAGES)]
+            start = time.perf_counter()
+            response = client.post('/chat', json={'message': message,
+                                                  'context': {'session_id': f'bench-{worker_id}'}})
+            elapsed = (time.perf_counter() - start) * 1000
+            source = response.get_json().get('source', 'error') if response.status_code == 200 \
+                else f'http_{response.status_code}'
+            with lock:
+                latencies.append(elapsed)
+                sources[source] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sources, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    status = sahara_ai.gemini_ai.get_status()
+    print("⏱️  /chat pipeline benchmark")
+    print("=" * 50)
+    print(f"Backend: {status['backend']} {status['fake_backend'] or ''}")
+    print(f"Load: {args.requests} requests from {args.concurrency} concurrent clients")
+
+    latencies, sources, elapsed = run_load(args.concurrency, args.requests)
+
+    status = sahara_ai.gemini_ai.get_status()
+    print(f"   Throughput : {len(latencies) / elapsed:8.1f} req/s")
+    print(f"   Latency    : p50 {percentile(latencies, 50):.0f} ms, p95 {percentile(latencies, 95):.0f} ms, "
+          f"p99 {percentile(latencies, 99):.0f} ms, mean {statistics.mean(latencies):.0f} ms")
+    print(f"   Sources    : {dict(sources)}")
+    print(f"   Breaker    : {status['circuit_breaker']['state']}, degraded={status['degraded']}")
+    print(f"   Call pool  : {status['call_pool']}")
+    print(f"   Cache      : hit rate {status['response_cache']['hit_rate']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold-start import cost of app.py (what api/index.py pays on every Vercel cold start)
+Runs `python -X importtime -c "import app"` in a fresh interpreter and reports the
+total and the heaviest imports against IMPORT_BUDGET_MS.
+"""
+
+import sys
+
+from conftest import measure_import
+
+IMPORT_BUDGET_MS = 1000     # whole `import app`, cold interpreter, Gemini disabled
+HEAVY_MODULES = ('google.generativeai', 'grpc', 'google.protobuf')
+
+
+def main():
+    timings = measure_import()
+    total_ms = timings['app'] / 1000
+    print("⏱️  Cold-start import benchmark")
+    print("=" * 50)
+    print(f"   import app          : {total_ms:8.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    top_level = sorted(((us, name) for name, us in timings.items() if '.' not in name and name != 'app'),
+                       reverse=True)[:8]
+    for us, name in top_level:
+        print(f"     {name:18s}: {us / 1000:8.1f} ms")
+    loaded_heavy = [name for name in HEAVY_MODULES if name in timings]
+    print(f"   Gemini SDK imported : {'yes - ' + ', '.join(loaded_heavy) if loaded_heavy else 'no'}")
+
+    sdk_ms = measure_import(module='google.generativeai')['google.generativeai'] / 1000
+    print(f"   Deferred SDK import : {sdk_ms:8.1f} ms (paid on first Gemini call only)")
+    print("   ✅ Within budget" if total_ms < IMPORT_BUDGET_MS else "   ❌ Over budget")
+    return total_ms < IMPORT_BUDGET_MS
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
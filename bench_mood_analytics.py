@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Benchmark: mood dashboard analytics over daily rollups
+Compares the single-pass generate_mood_analytics against the original four separate
+scans (generate/streak/wellness/trend) for 30-day, 1-year and 10-year histories.
+"""
+
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import generate_mood_analytics
+from conftest import make_rollups, legacy_generate_mood_analytics
+
+HISTORY_DAYS = [30, 365, 3650]
+
+
+def time_per_call(func, rollups, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(rollups)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    print("⏱️  Mood analytics benchmark")
+    print("=" * 60)
+    print(f"{'days':>6} | {'four scans (µs)':>15} | {'single pass (µs)':>16} | {'speedup':>7}")
+    for days in HISTORY_DAYS:
+        rollups = make_rollups(days)
+        assert generate_mood_analytics(rollups) == legacy_generate_mood_analytics(rollups)
+        rounds = max(20, 20000 // days)
+        legacy = time_per_call(legacy_generate_mood_analytics, rollups, rounds)
+        single = time_per_call(generate_mood_analytics, rollups, rounds)
+        print(f"{days:>6} | {legacy:>15.1f} | {single:>16.1f} | {legacy / single:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
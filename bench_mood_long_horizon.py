@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /mood-history analytics for a user with 10 years of mood tracking
+Compares the scalar engine over ORM rollups against the NumPy engine over plain
+rollup rows for 90-day, 1-year and all-time windows.
+"""
+
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, generate_mood_analytics, vectorized_mood_analytics, load_mood_rollups, load_mood_rollup_rows
+from conftest import create_user_with_mood_history
+
+HISTORY_DAYS = 3650
+WINDOWS = [90, 365, None]
+
+
+def scalar_analytics(user_id, days):
+    return generate_mood_analytics(load_mood_rollups(user_id, days))
+
+
+def vectorized_analytics(user_id, days):
+    return vectorized_mood_analytics(load_mood_rollup_rows(user_id, days))
+
+
+def time_call(func, user_id, days, rounds):
+    with app.app_context():
+        func(user_id, days)   # warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func(user_id, days)
+        return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(rounds=20):
+    print("⏱️  Long-horizon mood analytics benchmark")
+    print("=" * 50)
+    user_id, entries = create_user_with_mood_history('bench_long_horizon', HISTORY_DAYS)
+    print(f"History: {HISTORY_DAYS} days, {entries} mood entries")
+
+    for days in WINDOWS:
+        scalar = time_call(scalar_analytics, user_id, days, rounds)
+        vectorized = time_call(vectorized_analytics, user_id, days, rounds)
+        label = f"{days} days" if days else "all time"
+        print(f"   {label:>9} | scalar {scalar:7.2f} ms | NumPy (with series) {vectorized:7.2f} ms"
+              f" | {scalar / vectorized:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
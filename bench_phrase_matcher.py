@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-message cost of SaharaAI message analysis
+Compares the single-pass PhraseMatcher against the original per-phrase `in` loops
+"""
+
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import sahara_ai, GeminiAI
+from conftest import SAMPLE_MESSAGES, legacy_understand_message
+
+LEGACY_CRISIS_WORDS = ['suicide', 'kill myself', 'end it all', 'want to die', 'मरना चाहता हूं', 'जिंदगी से परेशान']
+
+
+def legacy_message_pipeline(ai, message):
+    """Original per-message work: analysis plus the crisis, style and follow-up word scans"""
+    analysis = legacy_understand_message(ai, message)
+    message_lower = message.lower()
+    any(word in message_lower for word in LEGACY_CRISIS_WORDS)
+    for cues, _ in GeminiAI.EMOTIONAL_STYLES:
+        if any(cue in message_lower for cue in cues):
+            break
+    any(word in message_lower for word in ai.academic_follow_up_words)
+    any(word in message_lower for word in ai.emotional_follow_up_words)
+    return analysis
+
+
+def compiled_message_pipeline(ai, message):
+    """New per-message work: one automaton pass feeds every decision"""
+    analysis = ai.understand_message_deeply(message)
+    hits = analysis['matched_phrases']
+    ai.crisis_detector.is_crisis(message)
+    ai.gemini_ai._get_emotional_response_style(message, analysis['emotion'], hits)
+    hits.isdisjoint(ai.academic_follow_up_phrases)
+    hits.isdisjoint(ai.emotional_follow_up_phrases)
+    return analysis
+
+
+def time_per_message(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in SAMPLE_MESSAGES:
+            func(sahara_ai, message)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(SAMPLE_MESSAGES)) * 1e6
+
+
+def main(rounds=2000):
+    print("⏱️  Message analysis benchmark")
+    print("=" * 50)
+    print(f"Phrases compiled into matcher: {len(sahara_ai.phrase_matcher.phrases)}")
+    print(f"Sample messages: {len(SAMPLE_MESSAGES)} x {rounds} rounds")
+
+    legacy = time_per_message(legacy_message_pipeline, rounds)
+    compiled = time_per_message(compiled_message_pipeline, rounds)
+
+    print(f"   Legacy per-phrase loops : {legacy:8.2f} µs/message")
+    print(f"   Compiled phrase matcher : {compiled:8.2f} µs/message")
+    print(f"   Speedup                 : {legacy / compiled:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
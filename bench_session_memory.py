@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory per active chat session
+Compares the original dict-based session layout (full analysis copy and ISO
+timestamp per turn, unbounded emotional_journey list) with the slot-based
+ConversationState records, at 10k and 100k active sessions.
+"""
+
+import os
+import sys
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from conftest import TURNS_PER_SESSION, build_legacy_sessions, build_session_store, bytes_per_session
+
+SESSION_COUNTS = (10_000, 100_000)
+
+
+def main(counts=SESSION_COUNTS):
+    print("📏 Session memory benchmark")
+    print("=" * 50)
+    print(f"Turns per session: {TURNS_PER_SESSION}")
+    results = {}
+    for count in counts:
+        legacy = bytes_per_session(build_legacy_sessions, count)
+        compact = bytes_per_session(build_session_store, count)
+        results[count] = (legacy, compact)
+        print(f"   {count:>7,} sessions: legacy {legacy:8.0f} B/session ({legacy * count / 2**20:7.1f} MiB), "
+              f"compact {compact:6.0f} B/session ({compact * count / 2**20:6.1f} MiB) - "
+              f"{legacy / compact:.1f}x smaller")
+    return results
+
+
+if __name__ == "__main__":
+    main(tuple(int(arg) for arg in sys.argv[1:]) or SESSION_COUNTS)
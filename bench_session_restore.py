@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Benchmark: snapshot and warm restore of in-memory conversation sessions
+Measures snapshot write time and size, how long a restart blocks boot, how long
+the background restore takes and the cost of decoding a session on first use.
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from conftest import build_session_store, measure_restart
+
+SESSIONS = 50_000
+BOOT_BLOCKING_BUDGET_MS = 50     # start_persistence() must return almost immediately
+RESTORE_BUDGET_MS = 1000         # background restore of SESSIONS until every session is reachable
+
+
+def main(count=SESSIONS):
+    print("♻️  Session snapshot / warm restore benchmark")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        store = build_session_store(count, snapshot_path=path)
+        store.snapshot()
+        snapshot = store.last_snapshot
+        print(f"   Snapshot        : {snapshot['sessions']:,} sessions, {snapshot['bytes'] / 2**20:.1f} MiB "
+              f"in {snapshot['ms']:.0f} ms")
+
+        result = measure_restart(path, count)
+        print(f"   Boot blocked    : {result['boot_ms']:8.1f} ms (budget {BOOT_BLOCKING_BUDGET_MS} ms)")
+        print(f"   Restore ready   : {result['ready_ms']:8.1f} ms (budget {RESTORE_BUDGET_MS} ms)")
+        print(f"   First-use decode: {result['first_use_us']:8.1f} µs/session")
+        print(f"   Sessions found  : {result['restored_fraction']:.0%}")
+    ok = result['boot_ms'] < BOOT_BLOCKING_BUDGET_MS and result['ready_ms'] < RESTORE_BUDGET_MS
+    print("   ✅ Within budget" if ok else "   ❌ Over budget")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(int(sys.argv[1]) if len(sys.argv) > 1 else SESSIONS) else 1)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /user-insights statistics for users with 10, 10k and 100k chats
+Compares loading every ChatHistory row into Python against the single
+COUNT / COUNT(DISTINCT date) / MIN aggregate query.
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, db, chat_activity_stats
+from conftest import create_user_with_chats, legacy_insight_stats
+
+USER_SIZES = [10, 10_000, 100_000]
+
+
+def time_call(func, user_id, rounds):
+    with app.app_context():
+        func(user_id)   # warm up
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func(user_id)
+        return (time.perf_counter() - start) / rounds * 1000
+
+
+def main(sizes=USER_SIZES):
+    with app.app_context():
+        print(f"⏱️  /user-insights benchmark ({db.engine.dialect.name})")
+    print("=" * 60)
+    print(f"{'chats':>8} | {'legacy rows (ms)':>16} | {'SQL aggregate (ms)':>18} | {'speedup':>7}")
+    for size in sizes:
+        user_id = create_user_with_chats(f"insights{size}", size)
+        rounds = 20 if size <= 10_000 else 3
+        with app.app_context():
+            assert chat_activity_stats(user_id) == legacy_insight_stats(user_id)
+        legacy = time_call(legacy_insight_stats, user_id, rounds)
+        aggregate = time_call(chat_activity_stats, user_id, rounds)
+        print(f"{size:>8} | {legacy:>16.2f} | {aggregate:>18.2f} | {legacy / aggregate:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or USER_SIZES)
@@ -0,0 +1,603 @@
+"""
+Shared test helpers
+Logged-in test clients, message analyses, a scripted stand-in for the Gemini model,
+sample messages, synthetic chat, session and mood histories, and the original
+row-loading and loop-per-phrase computations, used as golden references by the tests
+(through the fixtures below) and as workloads by the benchmark scripts.
+"""
+
+import atexit
+import functools
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import (app, db, sahara_ai, User, ChatHistory, MOOD_VALENCE, MoodDailyRollup, ResponseCache,
+                 SessionStore, SingleFlight, get_streak_message, get_wellness_message, rebuild_chat_stats)
+
+LABELS = sorted(MOOD_VALENCE) + ['unlisted']
+
+
+def logged_in_client(user_id):
+    """Test client whose session is logged in as user_id"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def client_for():
+    """client_for(user_id) returns a test client logged in as that user"""
+    return logged_in_client
+
+
+def make_analysis(topic='academic_pressure', emotion='stressed', concerns=(), clues=(), phrases=('exam',)):
+    """An analyze_message() result with just the fields conversation state reads"""
+    return {'main_topic': topic, 'emotion': emotion, 'specific_concerns': list(concerns),
+            'context_clues': list(clues), 'matched_phrases': set(phrases)}
+
+
+@pytest.fixture
+def analysis():
+    """analysis(topic, emotion, concerns=..., clues=...) builds a message analysis"""
+    return make_analysis
+
+
+class FakeResponse:
+    """A Gemini response (or streamed chunk): reply text and, optionally, the reported prompt tokens"""
+
+    class Usage:
+        def __init__(self, prompt_token_count):
+            self.prompt_token_count = prompt_token_count
+
+    def __init__(self, text, prompt_tokens=None):
+        self.text = text
+        if prompt_tokens is not None:
+            self.usage_metadata = FakeResponse.Usage(prompt_tokens)
+
+
+class ScriptedModel:
+    """Stand-in for genai.GenerativeModel whose replies, latency and failures each test scripts
+
+    Every call is recorded in `prompts`. `reply` is the text or a function of the call
+    number; streamed replies come back as `chunks` with `delay` before each one.
+    `error` fails the call outright, `stream_error` after the chunks have been sent,
+    and a `gate` event holds every call until the test sets it.
+    """
+
+    def __init__(self, reply="Haan yaar, I get it."):
+        self.reply = reply
+        self.chunks = None
+        self.delay = 0
+        self.error = None
+        self.stream_error = None
+        self.gate = None
+        self.prompt_tokens = None
+        self.prompts = []
+        self.started = threading.Semaphore(0)
+        self.lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return len(self.prompts)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self.lock:
+            self.prompts.append(prompt)
+            number = len(self.prompts)
+        self.started.release()
+        if self.gate is not None:
+            self.gate.wait(5)
+        text = self.reply(number) if callable(self.reply) else self.reply
+        if stream:
+            return self._stream(self.chunks or [text])
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(''.join(self.chunks or [text]), self.prompt_tokens)
+
+    def _stream(self, chunks):
+        for text in chunks:
+            time.sleep(self.delay)
+            if self.error is not None:
+                raise self.error
+            yield FakeResponse(text, self.prompt_tokens)
+        if self.stream_error is not None:
+            raise self.stream_error
+
+
+@pytest.fixture
+def gemini_model(monkeypatch):
+    """Route Gemini calls to a ScriptedModel, with an empty response cache and fresh single-flight
+
+    Everything is patched through monkeypatch, so the real model is back after the test
+    however it ends. Tests patch timeouts, breakers or pools the same way.
+    """
+    gemini = sahara_ai.gemini_ai
+    model = ScriptedModel()
+    monkeypatch.setattr(gemini, 'use_gemini', True)
+    monkeypatch.setattr(gemini, 'model', model)
+    monkeypatch.setattr(gemini, 'response_cache', ResponseCache(max_entries=0))
+    monkeypatch.setattr(gemini, 'single_flight', SingleFlight())
+    monkeypatch.setattr(gemini, 'token_stats', dict(gemini.token_stats))
+    return model
+
+
+SAMPLE_MESSAGES = [
+    "hi",
+    "hello sahara",
+    "I'm stressed about exams",
+    "padhai nahi ho rahi yaar",
+    "I am so stressed about my jee exams, mummy papa bolte hain padhai karo",
+    "Yaar I feel so lonely, dost baat nahi karte, kya karu samajh nahi aa raha?",
+    "My parents are always on my case about marks, log kya kahenge, I'm so frustrated",
+    "I got selected in the college I wanted!! I'm so happy and excited, bahut accha laga",
+    "मुझे बहुत डर लग रहा है, exam कैसे होगा? मैं बहुत थक गया हूं",
+    "breakup ho gaya, dil toot gaya, I'm heartbroken and crying all night",
+    "no idea what to do with my career, everyone else seems sorted, feeling so lost",
+    "Physics bahut difficult lagta hai, I feel burnt out and exhausted from coaching",
+    "I don't know why but I feel empty and numb these days, kuch acha nahi lagta",
+]
+
+
+@pytest.fixture
+def sample_messages():
+    """Representative Hinglish, Hindi and English user messages"""
+    return list(SAMPLE_MESSAGES)
+
+
+def legacy_understand_message(ai, message):
+    """Reference copy of the original loop-per-phrase analysis (used for timing and parity checks)"""
+    message_lower = message.lower()
+    analysis = {
+        'main_topic': None,
+        'emotion': 'neutral',
+        'intensity': 'moderate',
+        'specific_concerns': [],
+        'needs_follow_up': False,
+        'context_clues': [],
+        'sentiment_score': 0,
+        'user_state': 'exploring'
+    }
+
+    context_scores = {}
+    for context_name, patterns in ai.context_patterns.items():
+        score = 0
+        matched_elements = []
+        for keyword in patterns['keywords']:
+            if keyword in message_lower:
+                score += 2
+                matched_elements.append(keyword)
+        for emotion in patterns['emotional_indicators']:
+            if emotion in message_lower:
+                score += 3
+                analysis['emotion'] = emotion
+        for hindi_phrase in patterns['language_mix']:
+            if hindi_phrase in message_lower:
+                score += 2
+                matched_elements.append(hindi_phrase)
+        if score > 0:
+            context_scores[context_name] = {'score': score, 'elements': matched_elements}
+
+    if context_scores:
+        analysis['main_topic'] = max(context_scores.keys(), key=lambda x: context_scores[x]['score'])
+        analysis['context_clues'] = context_scores[analysis['main_topic']]['elements']
+        analysis['sentiment_score'] = context_scores[analysis['main_topic']]['score']
+
+    if any(q in message_lower for q in ai.question_indicators):
+        analysis['user_state'] = 'seeking_guidance'
+        analysis['needs_follow_up'] = True
+
+    if any(neg in message_lower for neg in ai.negative_indicators):
+        analysis['user_state'] = 'struggling'
+        analysis['needs_follow_up'] = True
+
+    for concern_type, indicators in ai.concern_patterns.items():
+        for indicator in indicators:
+            if indicator in message_lower:
+                analysis['specific_concerns'].append(concern_type)
+
+    return analysis
+
+
+@pytest.fixture
+def legacy_understand():
+    """legacy_understand(ai, message) runs the original loop-per-phrase analysis"""
+    return legacy_understand_message
+
+
+def create_user_with_chats(username, chat_count, chats_per_day=3):
+    """Insert a user and chat_count chats spread chats_per_day per day; returns the user id"""
+    with app.app_context():
+        user = User(username=username, email=f"{username}@example.com")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        start = datetime(2020, 1, 1, 8, 0)
+        rows = [{
+            'user_id': user.id,
+            'message': f"message {i}",
+            'response': f"response {i}",
+            'timestamp': start + timedelta(days=i // chats_per_day, minutes=i % chats_per_day),
+            'session_id': 'bench-insights'
+        } for i in range(chat_count)]
+        for offset in range(0, len(rows), 10_000):
+            db.session.execute(ChatHistory.__table__.insert(), rows[offset:offset + 10_000])
+        rebuild_chat_stats(db.session.connection(), user.id)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def chat_user():
+    """chat_user(username, chat_count, chats_per_day=3) inserts a user with chat history and returns its id"""
+    return create_user_with_chats
+
+
+def legacy_insight_stats(user_id):
+    """Reference copy of the original row-loading computation (used for timing and parity checks)"""
+    user_chats = ChatHistory.query.filter_by(user_id=user_id).all()
+    if not user_chats:
+        return 0, 0, None
+    dates_active = set(chat.timestamp.date() for chat in user_chats)
+    return len(user_chats), len(dates_active), min(chat.timestamp for chat in user_chats)
+
+
+@pytest.fixture
+def legacy_insights():
+    """legacy_insights(user_id) loads every chat row to compute (total, active days, first chat)"""
+    return legacy_insight_stats
+
+
+TURNS_PER_SESSION = 4
+
+
+@functools.lru_cache(maxsize=None)
+def sample_analyses():
+    """One real analysis per sample message, computed on first use"""
+    return tuple(sahara_ai.understand_message_deeply(message) for message in SAMPLE_MESSAGES)
+
+
+def _session_turns(session_index):
+    analyses = sample_analyses()
+    for turn in range(TURNS_PER_SESSION):
+        index = (session_index + turn) % len(SAMPLE_MESSAGES)
+        # Unique text per turn, like real user messages
+        yield f"{SAMPLE_MESSAGES[index]} #{session_index}.{turn}", analyses[index]
+
+
+def _copy_analysis(analysis):
+    copy = dict(analysis)
+    copy['specific_concerns'] = list(analysis['specific_concerns'])
+    copy['context_clues'] = list(analysis['context_clues'])
+    copy['matched_phrases'] = set(analysis['matched_phrases'])
+    return copy
+
+
+def build_legacy_sessions(count):
+    """The original user_sessions dict layout (full analysis copy and ISO timestamp per turn)"""
+    sessions = {}
+    for i in range(count):
+        session = sessions[f"session-{i}"] = {
+            'messages': [], 'topics_discussed': set(), 'emotional_journey': [], 'rapport_level': 0}
+        for message, analysis in _session_turns(i):
+            analysis = _copy_analysis(analysis)
+            session['messages'].append({'user': message, 'analysis': analysis,
+                                        'timestamp': datetime.now().isoformat()})
+            if analysis['main_topic']:
+                session['topics_discussed'].add(analysis['main_topic'])
+            session['emotional_journey'].append(analysis['emotion'])
+            session['rapport_level'] += 1
+    return sessions
+
+
+def build_session_store(count, snapshot_path=None):
+    """SessionStore of count slot-based ConversationState records"""
+    store = SessionStore(max_sessions=count, snapshot_path=snapshot_path)
+    for i in range(count):
+        for message, analysis in _session_turns(i):
+            store.record_turn(f"session-{i}", message, analysis)
+    return store
+
+
+def bytes_per_session(builder, count):
+    """Traced allocation per session for builder(count)"""
+    sample_analyses()                      # shared by both layouts, so not part of either
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = builder(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    return (after - before) / count
+
+
+@pytest.fixture
+def session_bytes():
+    """session_bytes(count) returns (legacy, compact) bytes per session for count sessions"""
+    return lambda count: (bytes_per_session(build_legacy_sessions, count),
+                          bytes_per_session(build_session_store, count))
+
+
+def measure_restart(path, count):
+    """Restart a store from the snapshot at path, returning the timings in ms"""
+    start = time.perf_counter()
+    store = SessionStore(max_sessions=count, snapshot_path=path)
+    store.start_persistence()
+    boot_ms = (time.perf_counter() - start) * 1000
+    atexit.unregister(store._safe_snapshot)   # the snapshot lives in a temp directory
+    store.restore_ready.wait()
+    ready_ms = (time.perf_counter() - start) * 1000
+
+    sample = [f"session-{i}" for i in range(0, count, max(1, count // 1000))]
+    decode_start = time.perf_counter()
+    restored = sum(store.load(session_id) is not None for session_id in sample)
+    decode_us = (time.perf_counter() - decode_start) / len(sample) * 1e6
+    return {'store': store, 'boot_ms': boot_ms, 'ready_ms': ready_ms,
+            'first_use_us': decode_us, 'restored_fraction': restored / len(sample)}
+
+
+@pytest.fixture
+def timed_restart(tmp_path):
+    """timed_restart(count) snapshots count sessions, restarts from the snapshot and returns the timings"""
+    def restart(count):
+        path = str(tmp_path / 'sessions.snapshot')
+        build_session_store(count, snapshot_path=path).snapshot()
+        return measure_restart(path, count)
+    return restart
+
+
+def measure_import(env_overrides=None, module='app'):
+    """Return {module: cumulative µs} from -X importtime for a cold `import module`"""
+    env = dict(os.environ, DATABASE_URL='sqlite://', USE_GEMINI_API='false', **(env_overrides or {}))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+                            capture_output=True, text=True, check=True)
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+    return timings
+
+
+@pytest.fixture
+def import_timings():
+    """import_timings() runs a cold `import app` in a fresh interpreter and returns its -X importtime"""
+    return measure_import
+
+
+def make_rollups(days, seed=3, gap_rate=0.15, max_per_day=4, user_id=1):
+    """Transient rollups for `days` days ending today (newest first), with random gaps"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    rollups = []
+    for offset in range(days):
+        if offset and rng.random() < gap_rate:
+            continue
+        rollup = MoodDailyRollup.empty(user_id, today - timedelta(days=offset))
+        for _ in range(rng.randint(1, max_per_day)):
+            rollup.add(rng.choice(LABELS), rng.randint(1, 10))
+        rollups.append(rollup)
+    return rollups
+
+
+@pytest.fixture
+def rollup_history():
+    """rollup_history(days, seed=..., gap_rate=..., max_per_day=...) builds a synthetic rollup history"""
+    return make_rollups
+
+
+def legacy_generate_mood_analytics(rollups):
+    """Reference copy of the four-scan analytics (used for timing and golden parity checks)"""
+    total_entries = sum(r.entry_count for r in rollups)
+    if not total_entries:
+        return {
+            'total_entries': 0,
+            'average_intensity': 0.0,
+            'current_streak': 0,
+            'wellness_score': 0.0,
+            'mood_distribution': {},
+            'trend': 'No data available',
+            'streak_message': 'Start tracking to build your streak!',
+            'wellness_message': 'Begin your wellness journey'
+        }
+    
+    # Emotion-aware average mood score (considering emotion type + intensity)
+    avg_intensity = sum(r.score_sum for r in rollups) / total_entries
+    
+    # Merge the per-day label histograms
+    mood_counts = {}
+    for rollup in rollups:
+        for label, count in rollup.labels().items():
+            mood_counts[label] = mood_counts.get(label, 0) + count
+    
+    # Calculate current streak (consecutive days with entries)
+    current_streak = legacy_calculate_mood_streak(rollups)
+    
+    # Calculate wellness score (based on intensity, consistency, and positive trends)
+    wellness_score = legacy_calculate_wellness_score(rollups)
+    
+    # Determine trend
+    trend = legacy_calculate_mood_trend(rollups)
+    
+    # Generate motivational messages
+    streak_message = get_streak_message(current_streak)
+    wellness_message = get_wellness_message(wellness_score)
+    
+    return {
+        'total_entries': total_entries,
+        'average_intensity': round(avg_intensity, 1),
+        'current_streak': current_streak,
+        'wellness_score': round(wellness_score, 1),
+        'mood_distribution': mood_counts,
+        'intensity_range': [min(r.min_intensity for r in rollups if r.entry_count),
+                            max(r.max_intensity for r in rollups if r.entry_count)],
+        'trend': trend,
+        'streak_message': streak_message,
+        'wellness_message': wellness_message
+    }
+
+
+def legacy_average_score(rollups):
+    """Mean mood score over every entry in rollups"""
+    count = sum(r.entry_count for r in rollups)
+    return sum(r.score_sum for r in rollups) / count if count else 0.0
+
+
+def legacy_calculate_mood_streak(rollups):
+    """Calculate current consecutive day streak from daily rollups (newest first)"""
+    days = [r.day for r in rollups if r.entry_count]
+    if not days:
+        return 0
+    
+    # Streak must start today or yesterday
+    today = datetime.now().date()
+    if days[0] not in (today, today - timedelta(days=1)):
+        return 0  # No recent activity
+    
+    # Count consecutive days backwards
+    streak = 1
+    for previous, day in zip(days, days[1:]):
+        if previous - day != timedelta(days=1):
+            break
+        streak += 1
+    return streak
+
+
+def legacy_calculate_wellness_score(rollups):
+    """Calculate wellness score from daily rollups, considering both emotion type and intensity (0-10 scale)"""
+    rollups = [r for r in rollups if r.entry_count]
+    if not rollups:
+        return 0.0
+    
+    def clamp(score):
+        return min(max(score, 0), 10)  # Ensure 0-10 range
+    
+    # Prioritize recent days (last 7 days) - 70% weight
+    recent_cutoff = (datetime.now() - timedelta(days=7)).date()
+    recent_days = [r for r in rollups if r.day >= recent_cutoff]
+    
+    if recent_days:
+        recent_avg = clamp(legacy_average_score(recent_days))
+        
+        # Today's mood (if exists) gets extra weight
+        today = datetime.now().date()
+        today_days = [r for r in recent_days if r.day == today]
+        if today_days:
+            today_avg = clamp(legacy_average_score(today_days))
+            recent_score = (recent_avg * 0.3) + (today_avg * 0.7)  # Heavily weight today's mood
+        else:
+            recent_score = recent_avg
+        
+        recent_weighted = recent_score * 0.7
+    else:
+        # No recent data, use overall average with penalty
+        recent_weighted = clamp(legacy_average_score(rollups)) * 0.5
+    
+    # Overall trend factor - 20% weight: last 2 active days against the 2 before them
+    if len(rollups) >= 4:
+        recent_wellness = clamp(legacy_average_score(rollups[:2]))
+        previous_wellness = clamp(legacy_average_score(rollups[2:4]))
+        
+        if recent_wellness > previous_wellness + 1:
+            trend_score = 2.0  # Significant improvement
+        elif recent_wellness > previous_wellness:
+            trend_score = 1.0  # Improving
+        elif recent_wellness == previous_wellness:
+            trend_score = 0.5  # Stable
+        else:
+            trend_score = 0  # Declining (concerning)
+    else:
+        # Not enough data, give neutral score
+        trend_score = 0.5
+    
+    trend_weighted = trend_score * 0.2
+    
+    # Consistency factor - 10% weight (minimal impact)
+    consistency_entries = sum(r.entry_count for r in (recent_days or rollups))
+    consistency_weighted = min(consistency_entries / 7.0, 1.0) * 0.1
+    
+    # Calculate final score
+    final_score = recent_weighted + trend_weighted + consistency_weighted
+    
+    return min(round(final_score, 1), 10.0)
+
+
+def legacy_calculate_mood_trend(rollups):
+    """Calculate mood trend description from daily rollups (newest first)"""
+    rollups = [r for r in rollups if r.entry_count]
+    if sum(r.entry_count for r in rollups) < 3:
+        return "Building data"
+    
+    # Compare the 3 most recent active days with the 3 before them
+    recent_avg = legacy_average_score(rollups[:3])
+    
+    if len(rollups) >= 6:
+        older_avg = legacy_average_score(rollups[3:6])
+        diff = recent_avg - older_avg
+        
+        if diff > 1:
+            return "Significantly improving"
+        elif diff > 0.5:
+            return "Improving"
+        elif diff < -1:
+            return "Needs attention"
+        elif diff < -0.5:
+            return "Declining"
+        else:
+            return "Stable"
+    else:
+        # Not enough days for comparison
+        if recent_avg >= 7:
+            return "Doing well"
+        elif recent_avg >= 5:
+            return "Moderate"
+        else:
+            return "Needs support"
+
+
+def create_user_with_mood_history(username, days, seed=11, max_per_day=6):
+    """Insert a user and `days` days of rollups ending today; returns (user id, total entries)"""
+    with app.app_context():
+        user = User(username=username, email=f"{username}@example.com")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        rows = [{
+            'user_id': user.id,
+            'day': rollup.day,
+            'entry_count': rollup.entry_count,
+            'score_sum': rollup.score_sum,
+            'min_intensity': rollup.min_intensity,
+            'max_intensity': rollup.max_intensity,
+            'label_counts': rollup.label_counts
+        } for rollup in make_rollups(days, seed=seed, max_per_day=max_per_day, user_id=user.id)]
+        db.session.execute(MoodDailyRollup.__table__.insert(), rows)
+        db.session.commit()
+        return user.id, sum(row['entry_count'] for row in rows)
+
+
+@pytest.fixture
+def legacy_mood_analytics():
+    """legacy_mood_analytics(rollups) runs the original four-scan analytics"""
+    return legacy_generate_mood_analytics
+
+
+@pytest.fixture
+def mood_user():
+    """mood_user(username, days) inserts a user with `days` days of rollups; returns (user id, total entries)"""
+    return create_user_with_mood_history
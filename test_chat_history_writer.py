@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Test script for the ChatHistory write-behind queue
+Chats are committed in batches by the background thread, a full queue falls back
+to synchronous writes, failed batches are retried, flush() drains everything,
+/profile sees a user's own queued chats and a crashed worker's queue is replayed
+from its spool.
+"""
+
+import atexit
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import create_engine, event, func, select
+
+from app import app, db, ChatHistory, ChatHistorySpool, ChatHistoryWriter, chat_history_writer, create_chat_history_writer
+
+
+def _file_writer(tmp, **kwargs):
+    engine = create_engine(f"sqlite:///{os.path.join(tmp, 'chats.db')}")
+    db.metadata.create_all(engine)
+    writer = ChatHistoryWriter(lambda: engine, **kwargs)
+    atexit.unregister(writer.flush)
+    return writer, engine
+
+
+def _row_count(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(ChatHistory.__table__)).scalar()
+
+
+def test_background_batches():
+    """Queued chats land in a handful of multi-row commits"""
+    print("🧪 Testing write-behind batching")
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, engine = _file_writer(tmp, batch_size=50, linger_seconds=0.05)
+        commits = []
+        event.listen(engine, 'commit', lambda conn: commits.append(1))
+        for i in range(120):
+            assert writer.submit(1, f"message {i}", f"response {i}", session_id='wb') is True
+        deadline = time.time() + 5
+        while _row_count(engine) < 120 and time.time() < deadline:
+            time.sleep(0.02)
+        stats = writer.get_stats()
+        assert _row_count(engine) == 120
+        assert stats['rows_written'] == 120 and stats['sync_writes'] == 0
+        assert stats['write_batches'] <= 5 and len(commits) <= 5, stats
+        with engine.connect() as connection:
+            messages = connection.execute(select(ChatHistory.message).order_by(ChatHistory.id)).scalars().all()
+        assert messages == [f"message {i}" for i in range(120)]   # insert order preserved
+        engine.dispose()
+    print(f"   ✅ 120 chats in {stats['write_batches']} commits")
+
+
+def test_full_queue_writes_synchronously():
+    """Past max_pending, submit() writes the row itself instead of dropping it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, engine = _file_writer(tmp, max_pending=5, linger_seconds=0)
+        writer.write_lock.acquire()            # stall the background writer
+        try:
+            results = [writer.submit(1, f"m{i}", "r") for i in range(12)]
+            assert _row_count(engine) == len([r for r in results if r is False])
+        finally:
+            writer.write_lock.release()
+        assert results.count(False) >= 6
+        writer.flush()
+        assert _row_count(engine) == 12
+        assert writer.get_stats()['sync_writes'] == results.count(False)
+        engine.dispose()
+    print("   ✅ Full queue falls back to synchronous writes")
+
+
+def test_failed_batches_are_retried():
+    """A transient database error requeues the batch instead of losing it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, engine = _file_writer(tmp, linger_seconds=0)
+        writer.RETRY_DELAY_SECONDS = 0.01
+        failures = [1]
+
+        def fail_once(conn, cursor, statement, *args):
+            if failures and statement.startswith('INSERT'):
+                failures.pop()
+                raise RuntimeError('database is locked')
+
+        event.listen(engine, 'before_cursor_execute', fail_once)
+        for i in range(10):
+            writer.submit(1, f"m{i}", "r")
+        deadline = time.time() + 5
+        while _row_count(engine) < 10 and time.time() < deadline:
+            time.sleep(0.02)
+        stats = writer.get_stats()
+        assert _row_count(engine) == 10 and stats['write_errors'] == 1 and stats['dropped'] == 0, stats
+        engine.dispose()
+    print("   ✅ Failed batch retried")
+
+
+def test_flush_drains_concurrent_submitters():
+    """flush() (as run at shutdown) leaves nothing queued from many threads"""
+    with tempfile.TemporaryDirectory() as tmp:
+        writer, engine = _file_writer(tmp, max_pending=10_000, linger_seconds=0.2)
+        threads = [threading.Thread(target=lambda t=t: [writer.submit(t, f"m{i}", "r") for i in range(200)])
+                   for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        writer.flush()
+        assert _row_count(engine) == 1600 and writer.get_stats()['pending'] == 0
+        engine.dispose()
+    print("   ✅ Shutdown flush drains the queue")
+
+
+def test_profile_sees_queued_chats(client_for, chat_user):
+    """A user's queued chats are flushed before /profile reads them"""
+    user_id = chat_user('writer_profile', 0)
+    original = chat_history_writer.enabled, chat_history_writer.engine_factory, chat_history_writer._engine
+    with app.app_context():
+        engine = db.engine
+    chat_history_writer.enabled, chat_history_writer._engine = True, engine
+    chat_history_writer.write_lock.acquire()   # keep the rows queued until /profile flushes them
+    try:
+        for i in range(3):
+            chat_history_writer.submit(user_id, f"queued {i}", "r")
+        client = client_for(user_id)
+        release = threading.Timer(0.1, chat_history_writer.write_lock.release)
+        release.start()
+        data = client.get('/profile').get_json()
+        release.join()
+    finally:
+        chat_history_writer.enabled, chat_history_writer.engine_factory, chat_history_writer._engine = original
+    assert [chat['message'] for chat in data['chats']] == ['queued 2', 'queued 1', 'queued 0']
+    print("   ✅ Read-your-writes on /profile")
+
+
+def test_chat_reply_stored_by_the_batch_writer(client_for, chat_user):
+    """/chat queues the row with its reply text; closing the response does not commit it early"""
+    print("🧪 Testing /chat rows in the write-behind queue")
+    user_id = chat_user('writer_chat', 0)
+    original = chat_history_writer.enabled, chat_history_writer.engine_factory, chat_history_writer._engine
+    with app.app_context():
+        engine = db.engine
+    chat_history_writer.enabled, chat_history_writer._engine = True, engine
+    chat_history_writer.write_lock.acquire()   # stall the background writer
+    try:
+        response = client_for(user_id).post('/chat', json={'message': 'padhai nahi ho rahi yaar'})
+        reply = response.get_json()['message']
+        response.close()                       # the WSGI server closes the response once it is sent
+        assert chat_history_writer.get_stats()['pending'] == 1   # batching is left to the writer
+    finally:
+        chat_history_writer.write_lock.release()
+        chat_history_writer.flush()
+        chat_history_writer.enabled, chat_history_writer.engine_factory, chat_history_writer._engine = original
+    with engine.connect() as connection:
+        saved = connection.execute(select(ChatHistory.message, ChatHistory.response)
+                                   .where(ChatHistory.user_id == user_id)).all()
+    assert reply and saved == [('padhai nahi ho rahi yaar', reply)]
+    print("   ✅ Reply stored, committed by the batch writer")
+
+
+def _crashing_worker(tmp):
+    """A worker that commits 3 chats, queues 5 more and is killed before writing them"""
+    writer, engine = _file_writer(tmp, spool=ChatHistorySpool(os.path.join(tmp, 'spool')))
+    for i in range(3):
+        writer.submit(1, f"committed {i}", "r")
+    writer.flush()
+    writer.write_lock.acquire()
+    for i in range(5):
+        writer.submit(1, f"queued {i}", "r")
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def test_spool_replays_after_crash():
+    """Rows queued by a killed worker are written at the next startup, exactly once"""
+    print("🧪 Testing spool replay after a crash")
+    with tempfile.TemporaryDirectory() as tmp:
+        worker = multiprocessing.get_context('fork').Process(target=_crashing_worker, args=(tmp,))
+        worker.start()
+        worker.join(30)
+        assert worker.exitcode == -signal.SIGKILL
+
+        writer, engine = _file_writer(tmp, spool=ChatHistorySpool(os.path.join(tmp, 'spool')))
+        assert _row_count(engine) == 3
+        assert writer.replay_spool() == 5 and writer.replay_spool() == 0
+        with engine.connect() as connection:
+            messages = connection.execute(select(ChatHistory.message).order_by(ChatHistory.id)).scalars().all()
+        assert messages == [f"committed {i}" for i in range(3)] + [f"queued {i}" for i in range(5)]
+        assert glob.glob(os.path.join(tmp, 'spool.*')) == []
+        engine.dispose()
+    print("   ✅ 5 queued chats replayed, none duplicated")
+
+
+def test_spool_skips_running_workers_and_stays_small():
+    """A live worker's spool is not replayed, and it is emptied once its queue drains"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'spool')
+        writer, engine = _file_writer(tmp, spool=ChatHistorySpool(path, max_bytes=2000), batch_size=10)
+        writer.write_lock.acquire()
+        try:
+            for i in range(40):
+                writer.submit(1, f"m{i}", "r")
+            assert ChatHistorySpool(path).replay(engine, writer.insert_rows) == 0   # locked by this worker
+        finally:
+            writer.write_lock.release()
+        writer.flush()
+        assert _row_count(engine) == 40
+        assert os.path.getsize(writer.spool.file.name) == 0
+        engine.dispose()
+    print("   ✅ Live spools left alone, drained spool emptied")
+
+
+def test_serverless_defaults_to_synchronous_writes():
+    """On Vercel the writer is synchronous unless CHAT_WRITE_BEHIND is set explicitly"""
+    original_uri, original_env = app.config['SQLALCHEMY_DATABASE_URI'], dict(os.environ)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:////tmp/sahara-writer-default.db'
+    try:
+        os.environ.pop('CHAT_WRITE_BEHIND', None)
+        os.environ.pop('VERCEL', None)
+        writers = [create_chat_history_writer()]
+        os.environ['VERCEL'] = '1'
+        writers.append(create_chat_history_writer())
+        os.environ['CHAT_WRITE_BEHIND'] = 'true'
+        writers.append(create_chat_history_writer())
+    finally:
+        app.config['SQLALCHEMY_DATABASE_URI'] = original_uri
+        os.environ.clear()
+        os.environ.update(original_env)
+    for writer in writers:
+        atexit.unregister(writer.flush)
+    assert [writer.enabled for writer in writers] == [True, False, True]
+    print("   ✅ Synchronous by default on serverless")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All chat history writer tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script for /chat/stream Server-Sent Events
+Checks that Gemini chunks reach the client as they are generated (time to first
+token well below full generation time) and that the local engine and crisis
+responses use the same event stream. A stream that fails midway is replaced by a
+complete local reply and never cached, and logged-in chats are saved when the
+stream closes, even if the client has gone.
+"""
+
+import json
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, ChatHistory, ResponseCache
+
+CHUNK_DELAY = 0.05
+
+
+def _saved_chats(user_id, session_id):
+    with app.app_context():
+        return [chat.response for chat in ChatHistory.query.filter_by(user_id=user_id, session_id=session_id)]
+
+
+def _read_events(response):
+    """Collect (event, data, arrival time) from a streamed SSE response"""
+    events = []
+    buffer = ''
+    for raw in response.response:
+        buffer += raw.decode('utf-8') if isinstance(raw, bytes) else raw
+        while '\n\n' in buffer:
+            frame, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in frame.split('\n'))
+            events.append((fields['event'], json.loads(fields['data']), time.perf_counter()))
+    return events
+
+
+def _post_stream(client, message, session_id):
+    start = time.perf_counter()
+    response = client.post('/chat/stream', json={'message': message, 'context': {'session_id': session_id}},
+                           buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return start, _read_events(response)
+
+
+def test_gemini_tokens_stream_before_generation_finishes(gemini_model):
+    """First token arrives after one chunk, not after the whole reply"""
+    print("🧪 Testing Gemini streaming time-to-first-token")
+    chunks = ['Arre yaar, ', 'that sounds ', 'really tough. ', 'Tell me more?']
+    gemini_model.chunks, gemini_model.delay = chunks, CHUNK_DELAY
+    start, events = _post_stream(app.test_client(), "I'm stressed about exams", 'stream-gemini')
+
+    tokens = [data['text'] for event, data, _ in events if event == 'token']
+    assert tokens == chunks
+    event, done, done_at = events[-1]
+    assert event == 'done' and done['source'] == 'gemini'
+    assert done['message'] == ''.join(chunks).strip()
+    assert done['session_id'] == 'stream-gemini'
+
+    first_token = events[0][2] - start
+    total = done_at - start
+    print(f"   ⏱️  First token {first_token * 1000:.0f} ms, full reply {total * 1000:.0f} ms")
+    assert first_token < total / 2
+    print("   ✅ Tokens delivered as they are generated")
+
+
+def test_local_response_uses_same_stream():
+    """Without Gemini the local reply is streamed and reassembles exactly"""
+    print("🧪 Testing local engine streaming")
+    _, events = _post_stream(app.test_client(), "padhai nahi ho rahi yaar", 'stream-local')
+    tokens = [data['text'] for event, data, _ in events if event == 'token']
+    event, done, _ = events[-1]
+    assert len(tokens) > 1
+    assert event == 'done' and done['source'] == 'local_intelligent'
+    assert ''.join(tokens) == done['message']
+    print("   ✅ Local response streamed")
+
+
+def test_crisis_response_streams():
+    """Crisis messages come back on the stream with the helpline response"""
+    _, events = _post_stream(app.test_client(), "मैं मरना चाहता हूं", 'stream-crisis')
+    event, done, _ = events[-1]
+    assert event == 'done' and done['context'] == 'crisis' and done['urgent'] is True
+    print("   ✅ Crisis response streamed")
+
+
+def test_interrupted_stream_is_replaced_not_stored(client_for, gemini_model, monkeypatch, chat_user):
+    """A Gemini stream that fails midway ends with a complete local reply; the fragment is not kept"""
+    print("🧪 Testing interrupted Gemini stream")
+    user_id = chat_user('stream_broken', 0)
+    gemini_model.chunks, gemini_model.delay = ['Arre yaar, ', 'that sounds '], CHUNK_DELAY
+    gemini_model.stream_error = RuntimeError("connection reset by upstream")
+    monkeypatch.setattr(sahara_ai.gemini_ai, 'response_cache', ResponseCache())
+    response = client_for(user_id).post('/chat/stream', json={
+        'message': "I'm stressed about exams", 'context': {'session_id': 'stream-broken'}}, buffered=False)
+    events = _read_events(response)
+    response.close()                            # the WSGI server closes the response once it is sent
+    cached = sahara_ai.gemini_ai.response_cache.get_stats()['size']
+
+    event, done, _ = events[-1]
+    assert [e for e, _, _ in events[:-1]] == ['token', 'token'] and event == 'done'
+    assert done['source'] == 'local_intelligent' and done['replaces_partial'] is True
+    assert 'that sounds' not in done['message']
+    assert cached == 0
+    assert _saved_chats(user_id, 'stream-broken') == [done['message']]
+    print("   ✅ Partial reply replaced, not cached or stored")
+
+
+def test_chat_saved_when_client_leaves_after_done(client_for, chat_user):
+    """The reply is stored when the stream closes, even if the client stops reading after 'done'"""
+    user_id = chat_user('stream_leaver', 0)
+    client = client_for(user_id)
+
+    response = client.post('/chat/stream', json={'message': "padhai nahi ho rahi yaar",
+                                                 'context': {'session_id': 'stream-leaver'}}, buffered=False)
+    frames = iter(response.response)
+    done = None
+    while done is None:
+        frame = next(frames)
+        frame = frame.decode('utf-8') if isinstance(frame, bytes) else frame
+        if frame.startswith('event: done'):
+            done = json.loads(frame.split('data: ', 1)[1])
+    response.close()                            # client disconnects without reading further
+    assert _saved_chats(user_id, 'stream-leaver') == [done['message']]
+
+    # A client that leaves before the reply is complete leaves nothing behind
+    response = client.post('/chat/stream', json={'message': "padhai nahi ho rahi yaar",
+                                                 'context': {'session_id': 'stream-early'}}, buffered=False)
+    next(iter(response.response))
+    response.close()
+    assert _saved_chats(user_id, 'stream-early') == []
+    print("   ✅ Saved on close, skipped for incomplete replies")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All chat streaming tests passed!")
+    sys.exit(exit_code)
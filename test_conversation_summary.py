@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for the rolling conversation summary
+The per-session summary must track topics, the emotional trajectory and key facts
+incrementally, stay within its token budget, and keep the Gemini prompt the same
+size however long the conversation runs.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, ConversationState, ConversationSummary, GeminiAI
+
+BUDGET = 40
+
+
+def test_summary_tracks_topics_trajectory_and_facts(analysis):
+    """Topics are counted, repeated emotions collapse into runs, facts keep the latest mentions"""
+    print("🧪 Testing incremental summary")
+    summary = ConversationSummary()
+    summary.update(analysis('academic_pressure', 'stressed', clues=['jee']))
+    summary.update(analysis('academic_pressure', 'stressed', concerns=['family_pressure']))
+    summary.update(analysis('family_expectations', 'anxious', clues=['mummy papa']))
+    summary.update(analysis(None, 'hopeful'))
+
+    assert summary.turns == 4
+    assert summary.topics == {'academic_pressure': 2, 'family_expectations': 1}
+    assert summary.trajectory == [('stressed', 2), ('anxious', 1), ('hopeful', 1)]
+    assert summary.facts == ('jee', 'family_pressure', 'mummy papa')
+    text = summary.render(200)
+    assert text == ("4 earlier messages; topics: academic_pressure×2, family_expectations; "
+                    "feelings: stressed×2 → anxious → hopeful; mentioned: jee, family_pressure, mummy papa")
+    assert ConversationSummary().render(200) == ''
+    print(f"   📝 {text}")
+
+
+def test_summary_respects_token_budget(analysis):
+    """However long the conversation, the rendered summary fits the budget"""
+    summary = ConversationSummary()
+    emotions = ['stressed', 'anxious', 'sad', 'hopeful', 'frustrated', 'lonely', 'excited']
+    for i in range(1000):
+        summary.update(analysis(f'topic_{i % 6}', emotions[i % len(emotions)],
+                                 concerns=[f'concern_{i % 11}'], clues=[f'clue_{i % 13}']))
+    assert len(summary.trajectory) <= ConversationSummary.MAX_RUNS
+    assert len(summary.facts) <= ConversationSummary.MAX_FACTS
+    text = summary.render(BUDGET)
+    assert GeminiAI._estimate_tokens(text) <= BUDGET and text.startswith('1000 earlier messages')
+    print(f"   ✅ {GeminiAI._estimate_tokens(text)} tokens after 1000 turns (budget {BUDGET})")
+
+
+def test_summary_survives_serialization(sample_messages):
+    state = ConversationState()
+    for message in sample_messages:
+        state.record_turn(message, sahara_ai.understand_message_deeply(message))
+    restored = ConversationState.from_dict(state.to_dict())
+    assert restored.summary.render(200) == state.summary.render(200)
+    print("   ✅ Summary restored from shared backends")
+
+
+def test_prompt_size_is_constant(gemini_model, sample_messages):
+    """Gemini sees the summary and the prompt stops growing as the conversation does"""
+    print("🧪 Testing prompt size over a long conversation")
+    gemini_model.reply = "I'm here for you."
+    client = app.test_client()
+    for turn in range(120):
+        message = sample_messages[turn % len(sample_messages)]
+        client.post('/chat', json={'message': message, 'context': {'session_id': 'summary-test'}})
+
+    assert "Conversation so far:" not in gemini_model.prompts[0]
+    assert "Conversation so far: 119 earlier messages" in gemini_model.prompts[-1]
+    # Same message at turn 20 and turn 119 - the prompt must not have grown beyond the summary budget
+    late = [prompt for prompt in gemini_model.prompts[20:] if sample_messages[-1] in prompt.split('\n')[0]]
+    sizes = [GeminiAI._estimate_tokens(prompt) for prompt in late]
+    assert max(sizes) - min(sizes) <= sahara_ai.summary_token_budget, sizes
+    print(f"   ✅ Prompt {min(sizes)}-{max(sizes)} tokens from turn 20 to 120")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All conversation summary tests passed!")
+    sys.exit(exit_code)
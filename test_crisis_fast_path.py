@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for the /chat crisis fast path
+Crisis messages must get the helpline response before any database query,
+message analysis or Gemini call, and within a fixed latency budget. Logged-in
+crisis exchanges are still saved, once the response has been sent.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import event
+
+import app as sahara_app
+from app import app, db, sahara_ai, resources_data, ChatHistory
+
+# Latency budgets (generous enough for slow CI machines)
+DETECTOR_BUDGET_US = 200      # per message, crisis detector alone
+REQUEST_BUDGET_MS = 25        # per /chat request through the test client
+
+CRISIS_MESSAGES = [
+    "I want to die",
+    "honestly I just want to END IT ALL",
+    "I've been feeling suicidal lately",
+    "yaar main marna chahta hun",
+    "ab jeena nahi chahti, khudkushi ke baare mein soch rahi hun",
+    "zindagi se pareshan ho gaya hun",
+    "मैं मरना चाहता हूं",
+    "मैं मरना चाहता हूँ",               # chandrabindu spelling
+    "ज़िंदगी से परेशान हूं",            # nukta spelling
+    "आत्महत्या के ख्याल आ रहे हैं",
+]
+
+SAFE_MESSAGES = [
+    "hi",
+    "I'm stressed about exams",
+    "padhai nahi ho rahi",
+    "this movie was to die for",
+    "मुझे बहुत डर लग रहा है",
+]
+
+
+def _fail_if_called(name):
+    def _raise(*args, **kwargs):
+        raise AssertionError(f"{name} must not run for crisis messages")
+    return _raise
+
+
+def test_detector_covers_romanized_and_devanagari():
+    """Every crisis variant is detected and safe messages are not"""
+    print("🧪 Testing crisis detector coverage")
+    detector = sahara_ai.crisis_detector
+    for message in CRISIS_MESSAGES:
+        assert detector.is_crisis(message), message
+    for message in SAFE_MESSAGES:
+        assert not detector.is_crisis(message), message
+    print("   ✅ Romanized and Devanagari variants detected")
+
+
+def test_response_uses_crisis_resources():
+    """Helpline numbers come from resources.json crisis_support"""
+    response = sahara_ai.crisis_detector.get_response()
+    assert response['context'] == 'crisis' and response['urgent'] is True
+    for item in resources_data['crisis_support']['items']:
+        assert item['contact'] in response['message']
+    print("   ✅ Helplines built from resources data")
+
+
+def test_detector_latency_budget():
+    """Crisis detection stays within its per-message budget"""
+    detector = sahara_ai.crisis_detector
+    messages = CRISIS_MESSAGES + SAFE_MESSAGES
+    rounds = 500
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            detector.is_crisis(message)
+    per_message_us = (time.perf_counter() - start) / (rounds * len(messages)) * 1e6
+    print(f"   ⏱️  Detector: {per_message_us:.2f} µs/message (budget {DETECTOR_BUDGET_US} µs)")
+    assert per_message_us < DETECTOR_BUDGET_US
+
+
+def test_chat_fast_path_skips_db_analysis_and_model():
+    """/chat answers crisis messages with zero DB queries, no analysis and no Gemini"""
+    print("🧪 Testing /chat crisis fast path")
+    statements = []
+
+    def count_statement(*args, **kwargs):
+        statements.append(args[2])
+
+    originals = (sahara_app.get_mood_context, sahara_ai.understand_message_deeply,
+                 sahara_ai.gemini_ai.get_gemini_response)
+    sahara_app.get_mood_context = _fail_if_called('get_mood_context')
+    sahara_ai.understand_message_deeply = _fail_if_called('understand_message_deeply')
+    sahara_ai.gemini_ai.get_gemini_response = _fail_if_called('get_gemini_response')
+
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        timings = []
+        for message in CRISIS_MESSAGES:
+            start = time.perf_counter()
+            response = client.post('/chat', json={'message': message, 'context': {'session_id': 'crisis-test'}})
+            timings.append((time.perf_counter() - start) * 1000)
+
+            data = response.get_json()
+            assert response.status_code == 200
+            assert data['context'] == 'crisis', message
+            assert data['session_id'] == 'crisis-test'
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+        (sahara_app.get_mood_context, sahara_ai.understand_message_deeply,
+         sahara_ai.gemini_ai.get_gemini_response) = originals
+
+    assert statements == [], statements
+    worst = max(timings)
+    print(f"   ⏱️  Worst /chat crisis request: {worst:.2f} ms (budget {REQUEST_BUDGET_MS} ms)")
+    assert worst < REQUEST_BUDGET_MS
+    print("   ✅ No DB, analysis or model work on the crisis path")
+
+
+def test_logged_in_crisis_saved_after_response(client_for, chat_user):
+    """A logged-in user's crisis exchange is stored, with no DB work before the response is sent"""
+    print("🧪 Testing crisis chat persistence")
+    user_id = chat_user('crisis_user', 0)
+    client = client_for(user_id)
+    client.post('/chat', json={'message': 'hi'}).close()   # warm the identity cache
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.post('/chat', json={'message': 'I want to die', 'context': {'session_id': 'crisis-saved'}})
+        assert response.get_json()['context'] == 'crisis'
+        assert statements == [], statements
+        response.close()                        # the WSGI server closes the response once it is sent
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    with app.app_context():
+        saved = ChatHistory.query.filter_by(user_id=user_id, session_id='crisis-saved').one()
+    assert saved.message == 'I want to die' and resources_data['crisis_support']['items'][0]['contact'] in saved.response
+    print("   ✅ Crisis exchange saved after the response")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All crisis fast path tests passed!")
+    sys.exit(exit_code)
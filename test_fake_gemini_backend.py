@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for the fake Gemini backend
+The offline stand-in must honour its latency distribution, error rate and reply
+length settings, stream like the SDK, and be picked up by GeminiAI from
+GEMINI_BACKEND=fake.
+"""
+
+import os
+import statistics
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import FakeGeminiModel, FakeGeminiError, GeminiAI
+
+
+def test_latency_distributions():
+    """Sampled latencies match the configured mean for every distribution"""
+    print("🧪 Testing fake latency distributions")
+    for distribution in FakeGeminiModel.LATENCY_DISTRIBUTIONS:
+        model = FakeGeminiModel(latency_ms=100, latency_jitter_ms=30, distribution=distribution, seed=1)
+        samples = [model._sample_latency() * 1000 for _ in range(4000)]
+        mean = statistics.mean(samples)
+        assert 90 < mean < 110, (distribution, mean)
+        assert min(samples) >= 0
+        print(f"   ⏱️  {distribution:9s} mean {mean:6.1f} ms, max {max(samples):6.1f} ms")
+    fixed = FakeGeminiModel(latency_ms=50, distribution='fixed')
+    assert fixed._sample_latency() == 0.05
+    print("   ✅ Latency distributions honoured")
+
+
+def test_error_rate_and_reply_length():
+    """Roughly error_rate of calls fail and replies are about reply_tokens long"""
+    model = FakeGeminiModel(latency_ms=0, latency_jitter_ms=0, distribution='fixed', error_rate=0.25,
+                            reply_tokens=40, reply_tokens_jitter=5, seed=3)
+    lengths, failures = [], 0
+    for _ in range(800):
+        try:
+            lengths.append(len(model.generate_content("hi").text.split()))
+        except FakeGeminiError:
+            failures += 1
+    assert 0.2 < failures / 800 < 0.3, failures
+    assert 37 < statistics.mean(lengths) < 43
+    assert model.get_stats()['simulated_errors'] == failures
+    print("   ✅ Error rate and reply length honoured")
+
+
+def test_streaming_chunks():
+    """Streaming yields several chunks, first one early, that join into a full reply"""
+    print("🧪 Testing fake streaming")
+    model = FakeGeminiModel(latency_ms=100, distribution='fixed', first_token_ratio=0.2,
+                            reply_tokens=40, reply_tokens_jitter=0, chunk_tokens=8, seed=5)
+    start = time.perf_counter()
+    chunks = model.generate_content("hi", stream=True)
+    first = next(chunks)
+    first_at = time.perf_counter() - start
+    rest = list(chunks)
+    total = time.perf_counter() - start
+    assert len(rest) == 4
+    assert len((first.text + ''.join(chunk.text for chunk in rest)).split()) == 40
+    assert first.usage_metadata.prompt_token_count == 0
+    assert first_at < total / 2
+    print(f"   ⏱️  First chunk {first_at * 1000:.0f} ms of {total * 1000:.0f} ms")
+
+
+def test_backend_selected_by_env():
+    """GEMINI_BACKEND=fake gives GeminiAI a working model without an API key"""
+    saved = {key: os.environ.get(key) for key in ('GEMINI_BACKEND', 'FAKE_GEMINI_LATENCY_MS')}
+    os.environ['GEMINI_BACKEND'] = 'fake'
+    os.environ['FAKE_GEMINI_LATENCY_MS'] = '5'
+    try:
+        gemini = GeminiAI()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    assert gemini.use_gemini and isinstance(gemini.model, FakeGeminiModel)
+    response = gemini.get_gemini_response("I'm stressed about exams", {'main_topic': 'academic_pressure'})
+    assert response['source'] == 'gemini' and response['message']
+    status = gemini.get_status()
+    assert status['backend'] == 'fake' and status['fake_backend']['calls'] == 1
+    print("   ✅ Fake backend selected from GEMINI_BACKEND")
+
+
+if __name__ == "__main__":
+    test_latency_distributions()
+    test_error_rate_and_reply_length()
+    test_streaming_chunks()
+    test_backend_selected_by_env()
+    print("🎉 All fake Gemini backend tests passed!")
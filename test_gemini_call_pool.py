@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded Gemini call pool
+Model calls beyond the concurrency limit queue briefly; once the queue is full
+/chat must answer at once from the local engine, or with 503 + Retry-After when
+the reject policy is configured.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, CircuitBreaker, ModelCallPool, ModelOverloadedError
+
+FAST_ANSWER_MS = 200
+
+
+def test_pool_limits_concurrency_and_queue():
+    """Slots are bounded, the queue is bounded, and waits are measured"""
+    print("🧪 Testing bounded call pool")
+    pool = ModelCallPool(max_concurrent=1, max_queue=1, queue_timeout=1.0)
+    pool.acquire()
+
+    queued = threading.Thread(target=lambda: (pool.acquire(), pool.release()))
+    queued.start()
+    while pool.get_stats()['queue_depth'] < 1:
+        time.sleep(0.005)
+    assert pool.is_saturated()
+
+    try:
+        pool.acquire()
+        raise AssertionError("a full queue must reject immediately")
+    except ModelOverloadedError:
+        pass
+
+    time.sleep(0.05)
+    pool.release()
+    queued.join()
+    stats = pool.get_stats()
+    assert stats['active'] == 0 and stats['queue_depth'] == 0
+    assert stats['admitted'] == 2 and stats['rejected_queue_full'] == 1
+    assert stats['peak_queue_depth'] == 1 and stats['max_queue_wait_ms'] >= 40
+    print(f"   ✅ Queue wait recorded: {stats['max_queue_wait_ms']} ms")
+
+
+def test_queue_wait_timeout():
+    """A queued caller gives up after the queue-wait timeout"""
+    pool = ModelCallPool(max_concurrent=1, max_queue=4, queue_timeout=0.05)
+    with pool.slot():
+        start = time.perf_counter()
+        try:
+            pool.acquire()
+            raise AssertionError("queued caller should have timed out")
+        except ModelOverloadedError:
+            pass
+        assert time.perf_counter() - start < 0.5
+    assert pool.get_stats()['rejected_queue_timeout'] == 1
+    print("   ✅ Queue wait timeout honoured")
+
+
+@pytest.fixture
+def saturated_pool(gemini_model, monkeypatch):
+    """saturated_pool(policy) blocks one model call in the only slot, with no room to queue"""
+    gemini = sahara_ai.gemini_ai
+    gemini_model.reply = "Gemini reply"
+    gemini_model.gate = threading.Event()
+    monkeypatch.setattr(gemini, 'call_pool', ModelCallPool(max_concurrent=1, max_queue=0, queue_timeout=0.5))
+    blocker = threading.Thread(target=gemini.get_gemini_response,
+                               args=("occupying the only slot", {'main_topic': None}))
+
+    def saturate(policy):
+        monkeypatch.setattr(gemini, 'overload_policy', policy)
+        blocker.start()
+        gemini_model.started.acquire()
+        return app.test_client()
+
+    yield saturate
+    gemini_model.gate.set()
+    if blocker.is_alive():
+        blocker.join()
+
+
+def _timed_post(client, path, message):
+    start = time.perf_counter()
+    response = client.post(path, json={'message': message, 'context': {'session_id': 'pool-test'}})
+    return response, (time.perf_counter() - start) * 1000
+
+
+def test_saturated_pool_answers_locally(saturated_pool):
+    """With the local policy /chat falls back to the local engine without waiting"""
+    print("🧪 Testing local fallback under saturation")
+    client = saturated_pool('local')
+    response, elapsed = _timed_post(client, '/chat', "I'm stressed about exams")
+    assert response.status_code == 200
+    assert response.get_json()['source'] == 'local_intelligent'
+    stats = sahara_ai.gemini_ai.call_pool.get_stats()
+    assert stats['rejected_queue_full'] == 1
+    print(f"   ⏱️  Local answer in {elapsed:.1f} ms")
+    assert elapsed < FAST_ANSWER_MS
+    print("   ✅ Saturated pool answered locally")
+
+
+def test_saturated_pool_rejects_with_retry_after(saturated_pool):
+    """With the reject policy /chat and /chat/stream return 503 with Retry-After"""
+    print("🧪 Testing 503 under saturation")
+    client = saturated_pool('reject')
+    for path in ('/chat', '/chat/stream'):
+        response, elapsed = _timed_post(client, path, "I'm stressed about exams")
+        assert response.status_code == 503, path
+        assert response.headers['Retry-After'] == str(sahara_ai.gemini_ai.retry_after)
+        assert elapsed < FAST_ANSWER_MS
+    status = client.get('/ai-status').get_json()
+    assert status['call_pool']['active'] == 1
+    print("   ✅ 503 + Retry-After returned")
+
+
+def test_overload_does_not_strand_half_open_probe(gemini_model, monkeypatch):
+    """A caller turned away by the pool never claims the breaker's half-open probe"""
+    print("🧪 Testing half-open probe under saturation")
+    gemini = sahara_ai.gemini_ai
+    monkeypatch.setattr(gemini, 'breaker', CircuitBreaker(failure_threshold=1, window_seconds=60, reset_timeout=30))
+    monkeypatch.setattr(gemini, 'call_pool', ModelCallPool(max_concurrent=1, max_queue=0, queue_timeout=0.5))
+    gemini.breaker.record_failure()
+    gemini.breaker.opened_at -= 30               # reset timeout elapsed - the next call may probe
+    gemini.call_pool.acquire()
+    try:
+        gemini._generate_response("probe", {'main_topic': None})
+        raise AssertionError("a saturated pool must reject the call")
+    except ModelOverloadedError:
+        pass
+    finally:
+        gemini.call_pool.release()
+    assert gemini.breaker.probe_started_at is None
+
+    result = gemini._generate_response("probe", {'main_topic': None})
+    assert result['source'] == 'gemini' and gemini.breaker.state == 'closed'
+    print("   ✅ Probe left for the next caller that gets a slot")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All call pool tests passed!")
+    sys.exit(exit_code)
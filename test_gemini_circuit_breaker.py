@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test script for the Gemini latency budget and circuit breaker
+A hanging model call must be abandoned at the deadline, repeated failures must
+trip the breaker so chat goes straight to local responses, and a half-open
+probe must restore Gemini once it recovers.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, CircuitBreaker, ModelCallPool
+
+
+def _install_breaker(monkeypatch, timeout=0.1, failures=3, reset=0.3):
+    gemini = sahara_ai.gemini_ai
+    monkeypatch.setattr(gemini, 'timeout', timeout)
+    monkeypatch.setattr(gemini, 'breaker', CircuitBreaker(failure_threshold=failures, window_seconds=60,
+                                                          reset_timeout=reset))
+
+
+def test_breaker_state_machine():
+    """closed -> open after threshold, half-open probe, closed on success / open on failure"""
+    print("🧪 Testing circuit breaker state machine")
+    breaker = CircuitBreaker(failure_threshold=2, window_seconds=60, reset_timeout=0.05)
+    assert breaker.allow_request() and breaker.state == 'closed'
+
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure(timed_out=True)
+    assert breaker.state == 'open' and breaker.trip_count == 1
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.allow_request() and breaker.state == 'half_open'
+    assert not breaker.allow_request()  # only one probe at a time
+    breaker.record_failure()
+    assert breaker.state == 'open' and breaker.trip_count == 2
+
+    time.sleep(0.06)
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+    stats = breaker.get_stats()
+    assert stats['timeouts'] == 1 and stats['failures'] == 3 and stats['rejected'] == 2
+    print("   ✅ Breaker transitions correct")
+
+
+def test_rolling_window_forgets_old_failures():
+    """Failures older than the window do not count towards tripping"""
+    breaker = CircuitBreaker(failure_threshold=2, window_seconds=0.05, reset_timeout=1)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    print("   ✅ Rolling window expires old failures")
+
+
+def test_hanging_call_is_abandoned_at_deadline(gemini_model, monkeypatch):
+    """A model call slower than the deadline falls back to the local engine in time"""
+    print("🧪 Testing per-call deadline")
+    gemini_model.delay = 1.0
+    _install_breaker(monkeypatch, timeout=0.1)
+    start = time.perf_counter()
+    response = sahara_ai.generate_intelligent_response("I'm stressed about exams", 'breaker-deadline')
+    elapsed = time.perf_counter() - start
+    print(f"   ⏱️  Fell back after {elapsed * 1000:.0f} ms")
+    assert response['source'] == 'local_intelligent'
+    assert elapsed < 0.5
+
+
+def test_abandoned_call_keeps_its_slot(gemini_model, monkeypatch):
+    """A call still running past the deadline holds its pool slot until it really finishes"""
+    print("🧪 Testing slot accounting for abandoned calls")
+    gemini_model.delay = 0.3
+    _install_breaker(monkeypatch, timeout=0.05)
+    gemini = sahara_ai.gemini_ai
+    monkeypatch.setattr(gemini, 'call_pool', ModelCallPool(max_concurrent=1, max_queue=0))
+    response = sahara_ai.generate_intelligent_response("I'm stressed about exams", 'breaker-slot')
+    assert response['source'] == 'local_intelligent'
+    stats = gemini.call_pool.get_stats()
+    assert stats['active'] == 1 and stats['abandoned_running'] == 1 and gemini.call_pool.is_saturated()
+
+    deadline = time.time() + 2
+    while gemini.call_pool.get_stats()['active'] and time.time() < deadline:
+        time.sleep(0.01)
+    stats = gemini.call_pool.get_stats()
+    assert stats['active'] == 0 and stats['abandoned_running'] == 0
+    print("   ✅ Slot released only when the upstream call ends")
+
+
+def test_open_breaker_skips_gemini_and_probe_restores_it(gemini_model, monkeypatch):
+    """While open, chat never calls the model; a successful probe brings Gemini back"""
+    print("🧪 Testing breaker integration with chat")
+    gemini_model.error = RuntimeError("503 upstream unavailable")
+    _install_breaker(monkeypatch, failures=3, reset=0.2)
+    for _ in range(3):
+        assert sahara_ai.generate_intelligent_response("hi", 'breaker-chat')['source'] == 'local_intelligent'
+    assert sahara_ai.gemini_ai.breaker.state == 'open'
+
+    calls_when_opened = gemini_model.calls
+    start = time.perf_counter()
+    response = sahara_ai.generate_intelligent_response("hi", 'breaker-chat')
+    assert response['source'] == 'local_intelligent'
+    assert gemini_model.calls == calls_when_opened
+    assert time.perf_counter() - start < 0.05
+
+    status = app.test_client().get('/ai-status').get_json()
+    assert status['degraded'] is True
+    assert status['circuit_breaker']['state'] == 'open'
+    assert status['circuit_breaker']['trip_count'] == 1
+
+    # Upstream recovers - the half-open probe closes the breaker
+    gemini_model.error = None
+    time.sleep(0.25)
+    assert sahara_ai.generate_intelligent_response("hi", 'breaker-chat')['source'] == 'gemini'
+    assert sahara_ai.gemini_ai.breaker.state == 'closed'
+    print("   ✅ Open breaker bypasses Gemini, probe restores it")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All circuit breaker tests passed!")
+    sys.exit(exit_code)
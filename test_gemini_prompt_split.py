@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script for the static persona / dynamic prompt split
+The Sahara persona must be configured once as the system instruction and
+each request must only send the parts that change.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, GeminiAI
+
+
+def test_prompt_contains_only_dynamic_parts():
+    """Per-call prompt has the message, emotion, last turn and style - not the persona"""
+    print("🧪 Testing per-call prompt contents")
+    gemini = sahara_ai.gemini_ai
+    analysis = sahara_ai.understand_message_deeply("I'm so stressed about boards")
+    prompt = gemini._build_prompt("I'm so stressed about boards", analysis, ["hi"])
+
+    assert "I'm so stressed about boards" in prompt
+    assert analysis['emotion'] in prompt
+    assert 'Conversation flow: hi' in prompt
+    assert 'BE A REAL FRIEND' not in prompt and 'CULTURAL UNDERSTANDING' not in prompt
+    assert 'BE A REAL FRIEND' in GeminiAI.SAHARA_PERSONA
+
+    before = gemini._estimate_tokens(GeminiAI.SAHARA_PERSONA + prompt)
+    after = gemini._estimate_tokens(prompt)
+    print(f"   📝 Prompt ≈{before} tokens before, ≈{after} tokens after")
+    assert after * 3 < before
+    print("   ✅ Persona removed from per-call prompt")
+
+
+def test_token_usage_is_recorded(gemini_model):
+    """Token counts are logged per call and reported in /ai-status"""
+    gemini_model.reply = "Arre yaar, that sounds tough."
+    gemini_model.prompt_tokens = 42
+    sahara_ai.generate_intelligent_response("hello", 'prompt-split')
+    list(sahara_ai.stream_intelligent_response("hello again", 'prompt-split'))
+    assert len(gemini_model.prompts) == 2
+    assert all('BE A REAL FRIEND' not in prompt for prompt in gemini_model.prompts)
+
+    stats = app.test_client().get('/ai-status').get_json()['prompt_tokens']
+    assert stats['calls'] >= 2
+    assert stats['avg_reported_prompt_tokens'] > 0
+    assert stats['avg_prompt_tokens_before_estimate'] > stats['avg_prompt_tokens_after_estimate']
+    print("   ✅ Token usage recorded")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All prompt split tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the Gemini response cache
+Repeated openers must be served from the LRU+TTL cache, while crisis and
+personally identifying messages must never be cached.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import sahara_ai, ResponseCache
+
+MODEL_LATENCY = 0.02
+
+
+@pytest.fixture
+def gemini(gemini_model, monkeypatch):
+    """Gemini with a numbered-reply model and a real response cache in front of it"""
+    gemini_model.reply = lambda number: f"Reply #{number}"
+    gemini_model.delay = MODEL_LATENCY
+    monkeypatch.setattr(sahara_ai.gemini_ai, 'response_cache', ResponseCache(max_entries=64, ttl_seconds=60))
+    return sahara_ai.gemini_ai
+
+
+def test_lru_eviction_and_ttl():
+    """Least recently used entries are evicted and expired entries are dropped"""
+    print("🧪 Testing LRU + TTL cache")
+    cache = ResponseCache(max_entries=2, ttl_seconds=0.05)
+    cache.put('a', {'message': 'A'})
+    cache.put('b', {'message': 'B'})
+    assert cache.get('a')['message'] == 'A'   # 'a' becomes most recent
+    cache.put('c', {'message': 'C'})          # evicts 'b'
+    assert cache.get('b') is None
+    assert cache.get('c')['message'] == 'C'
+    time.sleep(0.06)
+    assert cache.get('a') is None
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 1
+    assert stats['hits'] == 2 and stats['misses'] == 2
+    print("   ✅ Eviction, expiry and counters correct")
+
+
+def test_repeated_openers_hit_cache(gemini):
+    """Near-identical openers share one upstream call"""
+    print("🧪 Testing opener caching")
+    openers = ["I'm stressed about exams", "i'm stressed about exams!!", "  I'm   STRESSED about exams. "]
+    timings = []
+    for index, opener in enumerate(openers):
+        start = time.perf_counter()
+        response = sahara_ai.generate_intelligent_response(opener, f'cache-opener-{index}')
+        timings.append(time.perf_counter() - start)
+        assert response['source'] == 'gemini'
+        assert response['message'] == 'Reply #1'
+
+    assert gemini.model.calls == 1
+    assert gemini.response_cache.get_stats()['hits'] == 2
+    print(f"   ⏱️  Miss {timings[0] * 1000:.1f} ms, hit {max(timings[1:]) * 1000:.1f} ms")
+    assert max(timings[1:]) < timings[0]
+
+
+def test_key_includes_last_turn(gemini):
+    """The same message after a different previous turn is a different key"""
+    analysis = sahara_ai.understand_message_deeply("okay")
+    gemini.get_gemini_response("okay", analysis, ["hi"])
+    gemini.get_gemini_response("okay", analysis, ["padhai nahi ho rahi"])
+    gemini.get_gemini_response("okay", analysis, ["hi"])
+    assert gemini.model.calls == 2
+    print("   ✅ Last history turn is part of the key")
+
+
+def test_crisis_and_pii_never_cached(gemini):
+    """Crisis text, emails, phone numbers and self-identifying messages skip the cache"""
+    print("🧪 Testing cache exclusions")
+    for message in ["my email is riya@example.com", "call me on 98204 66726", "my name is Riya"]:
+        analysis = sahara_ai.understand_message_deeply(message)
+        gemini.get_gemini_response(message, analysis)
+        gemini.get_gemini_response(message, analysis)
+
+    # A crisis previous turn must not end up in a cache key either
+    analysis = sahara_ai.understand_message_deeply("hmm")
+    gemini.get_gemini_response("hmm", analysis, ["I want to die"])
+    gemini.get_gemini_response("hmm", analysis, ["I want to die"])
+
+    assert gemini.model.calls == 8
+    stats = gemini.response_cache.get_stats()
+    assert stats['size'] == 0 and stats['skipped'] == 8
+    print("   ✅ Crisis and PII content never cached")
+
+
+def test_streaming_shares_cache(gemini):
+    """A streamed reply is cached and replayed for the next identical opener"""
+    first = list(sahara_ai.stream_intelligent_response("hello", 'cache-stream-1'))
+    second = list(sahara_ai.stream_intelligent_response("Hello!", 'cache-stream-2'))
+    assert first[-1][1]['message'] == second[-1][1]['message'] == 'Reply #1'
+    assert gemini.model.calls == 1
+    print("   ✅ Streaming path uses the cache")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All response cache tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for single-flight coalescing of Gemini calls
+Concurrent identical requests must share one upstream call, a leader failure
+must reach every waiting follower, and followers must not wait forever.
+"""
+
+import io
+import os
+import sys
+import threading
+from contextlib import redirect_stdout
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from app import sahara_ai, CircuitBreaker, SingleFlight, SingleFlightTimeout
+
+CONCURRENT_USERS = 8
+MODEL_LATENCY = 0.2
+
+
+@pytest.fixture
+def slow_model(gemini_model):
+    """The scripted model, slow enough for concurrent requests to overlap"""
+    gemini_model.reply = "Hey! Kaise ho?"
+    gemini_model.delay = MODEL_LATENCY
+    return gemini_model
+
+
+def _run_concurrently(target):
+    """Start CONCURRENT_USERS threads at the same moment and collect their results"""
+    results = [None] * CONCURRENT_USERS
+    barrier = threading.Barrier(CONCURRENT_USERS)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(CONCURRENT_USERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_requests_share_one_call(slow_model):
+    """A burst of the same opener makes a single upstream call"""
+    print("🧪 Testing single-flight coalescing")
+    gemini = sahara_ai.gemini_ai
+    results = _run_concurrently(lambda: gemini.get_gemini_response("hi", {'main_topic': None}))
+    stats = gemini.single_flight.get_stats()
+    assert slow_model.calls == 1, slow_model.calls
+    assert all(result and result['message'] == "Hey! Kaise ho?" for result in results)
+    assert stats['leaders'] == 1 and stats['followers'] == CONCURRENT_USERS - 1
+    assert stats['in_flight'] == 0
+    print(f"   ✅ {CONCURRENT_USERS} concurrent requests → {slow_model.calls} upstream call")
+
+
+def test_streamed_duplicates_share_one_call(slow_model):
+    """Streaming followers receive the leader's reply without their own call"""
+    gemini = sahara_ai.gemini_ai
+    results = _run_concurrently(lambda: ''.join(gemini.stream_gemini_response("hi", {'main_topic': None})))
+    assert slow_model.calls == 1, slow_model.calls
+    assert all(text.strip() == "Hey! Kaise ho?" for text in results)
+    print("   ✅ Streamed duplicates coalesced")
+
+
+def test_leader_failure_reaches_followers(slow_model):
+    """When the leader's call fails every follower falls back instead of retrying"""
+    print("🧪 Testing error propagation")
+    slow_model.error = RuntimeError("upstream unavailable")
+    gemini = sahara_ai.gemini_ai
+    results = _run_concurrently(lambda: gemini.get_gemini_response("hi", {'main_topic': None}))
+    assert slow_model.calls == 1, slow_model.calls
+    assert results == [None] * CONCURRENT_USERS
+    print("   ✅ One failure, no retry storm")
+
+
+def test_leader_timeout_is_not_reported_as_follower_timeout(slow_model, monkeypatch):
+    """A leader that hits the model deadline is logged as a timeout, not as a follower giving up"""
+    print("🧪 Testing leader vs follower timeouts")
+    gemini = sahara_ai.gemini_ai
+    monkeypatch.setattr(gemini, 'timeout', 0.05)
+    monkeypatch.setattr(gemini, 'breaker', CircuitBreaker())
+    output = io.StringIO()
+    with redirect_stdout(output):
+        results = _run_concurrently(lambda: gemini.get_gemini_response("hi", {'main_topic': None}))
+    stats, log = gemini.single_flight.get_stats(), output.getvalue()
+    assert slow_model.calls == 1 and results == [None] * CONCURRENT_USERS
+    assert stats['follower_timeouts'] == 0
+    assert "Gemini API timeout after 0.05s" in log and "in-flight duplicate" not in log, log
+    print("   ✅ Leader timeout logged as a model timeout")
+
+
+def test_follower_gives_up_after_timeout():
+    """A follower stops waiting for a stuck leader after its timeout"""
+    flight = SingleFlight()
+    call, is_leader = flight.begin('key')
+    assert is_leader
+    follower, is_leader = flight.begin('key')
+    assert not is_leader and follower is call
+    try:
+        flight.wait(follower, 0.01)
+        raise AssertionError("follower should have timed out")
+    except SingleFlightTimeout as e:
+        assert isinstance(e, FuturesTimeoutError)
+    flight.finish('key', call, result={'message': 'late'})
+    assert flight.get_stats() == {'in_flight': 0, 'leaders': 1, 'followers': 1, 'follower_timeouts': 1}
+
+    # The next request after completion starts a fresh call
+    _, is_leader = flight.begin('key')
+    assert is_leader
+    print("   ✅ Follower timeout honoured")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All single-flight tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the lazy Gemini SDK import
+Importing the app must not load google.generativeai (or grpc/protobuf) and must
+stay within the cold-start budget; the SDK loads on the first model use.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+import app as sahara_app
+
+IMPORT_BUDGET_MS = 1000     # whole `import app`, cold interpreter, Gemini disabled
+HEAVY_MODULES = ('google.generativeai', 'grpc', 'google.protobuf')
+
+
+def test_app_import_skips_sdk():
+    """A cold `import app` leaves the Gemini SDK unloaded, even with Gemini enabled"""
+    print("🧪 Testing lazy SDK import")
+    check = ("import sys, app; "
+             "assert app.genai is None; "
+             f"assert not [m for m in {HEAVY_MODULES!r} if m in sys.modules], 'SDK imported'")
+    for enabled in ('false', 'true'):
+        env = dict(os.environ, DATABASE_URL='sqlite://', USE_GEMINI_API=enabled,
+                   GEMINI_API_KEY='test-key', GEMINI_BACKEND='gemini')
+        subprocess.run([sys.executable, '-c', check], env=env, check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+    print("   ✅ SDK not imported at startup")
+
+
+def test_import_within_budget(import_timings):
+    """Cold import of the app stays under the stated budget"""
+    total_ms = import_timings()['app'] / 1000
+    print(f"   ⏱️  import app: {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    assert total_ms < IMPORT_BUDGET_MS
+
+
+def test_model_built_on_first_use():
+    """The SDK is imported and the model built the first time a model call needs it"""
+    saved = {key: os.environ.get(key) for key in ('USE_GEMINI_API', 'GEMINI_API_KEY', 'GEMINI_BACKEND')}
+    os.environ.update(USE_GEMINI_API='true', GEMINI_API_KEY='test-key', GEMINI_BACKEND='gemini')
+    try:
+        gemini = sahara_app.GeminiAI()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    assert gemini.model is None and gemini.model_pending
+    model = gemini._ensure_model()
+    assert model is not None and gemini.model is model and not gemini.model_pending
+    assert sahara_app.genai is not None and gemini.get_status()['sdk_loaded']
+    assert gemini._ensure_model() is model
+    print("   ✅ Model built lazily on first use")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All lazy import tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass mood analytics engine
+generate_mood_analytics must give exactly the output of the original four separate
+scans (golden parity) on every history shape, and fixed inputs keep their known output.
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import MoodDailyRollup, generate_mood_analytics, mood_score
+
+
+def _rollup(day, *entries):
+    rollup = MoodDailyRollup.empty(1, day)
+    for label, intensity in entries:
+        rollup.add(label, intensity)
+    return rollup
+
+
+def test_matches_four_scan_reference(rollup_history, legacy_mood_analytics):
+    """Identical output to the original functions across random histories"""
+    print("🧪 Testing golden parity with the four-scan analytics")
+    cases = 0
+    for seed in range(150):
+        rng = random.Random(seed)
+        rollups = rollup_history(rng.choice([1, 2, 3, 4, 5, 6, 7, 12, 30, 90]), seed=seed,
+                                 gap_rate=rng.choice([0.0, 0.3, 0.7]), max_per_day=rng.choice([1, 2, 5]))
+        shift = rng.choice([0, 0, 1, 2, 8, 40])       # history ending today, yesterday, or long ago
+        for rollup in rollups:
+            rollup.day -= timedelta(days=shift)
+        if rng.random() < 0.2:
+            rollups.insert(rng.randrange(len(rollups) + 1), MoodDailyRollup.empty(1, rollups[0].day))
+        assert generate_mood_analytics(rollups) == legacy_mood_analytics(rollups), seed
+        cases += 1
+    assert generate_mood_analytics([]) == legacy_mood_analytics([])
+    print(f"   ✅ {cases} random histories identical")
+
+
+def test_golden_output():
+    """A fixed week of moods keeps its exact dashboard output"""
+    now = datetime(2025, 3, 10, 18, 0)
+    today = now.date()
+    rollups = [
+        _rollup(today, ('happy', 8), ('calm', 6)),
+        _rollup(today - timedelta(days=1), ('sad', 7)),
+        _rollup(today - timedelta(days=2), ('stressed', 9), ('stressed', 5)),
+        _rollup(today - timedelta(days=4), ('grateful', 7)),
+        _rollup(today - timedelta(days=5), ('anxious', 3)),
+        _rollup(today - timedelta(days=6), ('happy', 5)),
+    ]
+    analytics = generate_mood_analytics(rollups, now=now)
+    assert analytics == {
+        'total_entries': 8,
+        'average_intensity': 3.3,          # 26.3 / 8
+        'current_streak': 3,
+        'wellness_score': 4.2,             # 0.7 x (0.3 x 3.29 + 0.7 x 6.1) + 0.2 x 2.0 + 0.1
+        'mood_distribution': {'calm': 1, 'happy': 2, 'sad': 1, 'stressed': 2, 'grateful': 1, 'anxious': 1},
+        'intensity_range': [3, 9],
+        'trend': 'Needs attention',        # 14.2 / 5 = 2.84 now vs 12.1 / 3 = 4.03 before
+        'streak_message': 'Amazing! 3 days strong!',
+        'wellness_message': 'Room for improvement'
+    }, analytics
+    assert round(sum(mood_score(l, i) for l, i in [('happy', 8), ('calm', 6), ('sad', 7), ('stressed', 9),
+                                                   ('stressed', 5), ('grateful', 7), ('anxious', 3),
+                                                   ('happy', 5)]) / 8, 1) == 3.3
+    print("   ✅ Golden output unchanged")
+
+
+def test_empty_and_zero_count_days():
+    assert generate_mood_analytics([])['trend'] == 'No data available'
+    today = datetime.now().date()
+    only_empty = [MoodDailyRollup.empty(1, today)]
+    assert generate_mood_analytics(only_empty)['total_entries'] == 0
+    print("   ✅ Empty histories handled")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All mood analytics engine tests passed!")
+    sys.exit(exit_code)
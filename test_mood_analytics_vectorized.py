@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test script for the NumPy long-horizon mood analytics
+vectorized_mood_analytics must give exactly the scalar engine's headline metrics, its
+rolling / weekly / slope series must match straightforward Python loops, and
+/mood-history must pick the engine by window and fall back when NumPy is missing.
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+import app as sahara_app
+from app import app, MoodDailyRollup, generate_mood_analytics, vectorized_mood_analytics
+
+
+def _rows(rollups):
+    return [(r.day, r.entry_count, r.score_sum, r.min_intensity, r.max_intensity, r.label_counts) for r in rollups]
+
+
+def _close(values, expected, tolerance):
+    """Same gaps and values within rounding (cumulative sums add in a different order)"""
+    return len(values) == len(expected) and all(
+        (v is None) == (e is None) and (v is None or abs(v - e) <= tolerance + 1e-9)
+        for v, e in zip(values, expected))
+
+
+def _reference_series(rollups, today):
+    """Day-by-day Python loops for the series the NumPy engine computes with arrays"""
+    active = {r.day: r for r in rollups if r.entry_count}
+    first = min(active)
+    last = max(max(active), today)
+    rolling = []
+    day = first
+    while day <= last:
+        window = [active[d] for d in (day - timedelta(days=k) for k in range(7)) if d in active]
+        count = sum(r.entry_count for r in window)
+        rolling.append(round(sum(r.score_sum for r in window) / count, 2) if count else None)
+        day += timedelta(days=1)
+
+    weeks = {}
+    for rollup in active.values():
+        monday = rollup.day - timedelta(days=rollup.day.weekday())
+        count, score = weeks.get(monday, (0, 0.0))
+        weeks[monday] = (count + rollup.entry_count, score + rollup.score_sum)
+    weekly = [(monday.isoformat(), count, round(score / count, 2), round(min(max(score / count, 0.0), 10.0), 1))
+              for monday, (count, score) in sorted(weeks.items())]
+
+    points = [(r.day.toordinal(), r.score_sum / r.entry_count, r.entry_count) for r in active.values()]
+    total = sum(w for _, _, w in points)
+    mean_x = sum(x * w for x, _, w in points) / total
+    mean_y = sum(y * w for _, y, w in points) / total
+    spread = sum(w * (x - mean_x) ** 2 for x, _, w in points)
+    slope = sum(w * (x - mean_x) * (y - mean_y) for x, y, w in points) / spread if spread else 0.0
+    return first.isoformat(), rolling, weekly, round(slope * 7, 3)
+
+
+def test_headline_matches_scalar_engine(rollup_history):
+    """Same headline metrics as generate_mood_analytics on every history shape"""
+    print("🧪 Testing parity with the scalar analytics engine")
+    cases = 0
+    for seed in range(120):
+        rng = random.Random(seed)
+        rollups = rollup_history(rng.choice([1, 2, 6, 7, 30, 365, 1200]), seed=seed,
+                                 gap_rate=rng.choice([0.0, 0.3, 0.7]), max_per_day=rng.choice([1, 2, 5]))
+        shift = rng.choice([0, 0, 1, 2, 8, 40])
+        for rollup in rollups:
+            rollup.day -= timedelta(days=shift)
+        if rng.random() < 0.2:
+            rollups.insert(rng.randrange(len(rollups) + 1), MoodDailyRollup.empty(1, rollups[0].day))
+        analytics = vectorized_mood_analytics(_rows(rollups))
+        analytics.pop('series')
+        assert analytics == generate_mood_analytics(rollups), seed
+        cases += 1
+    empty = vectorized_mood_analytics([])
+    assert empty.pop('series')['weekly'] == []
+    assert empty == generate_mood_analytics([])
+    print(f"   ✅ {cases} random histories identical")
+
+
+def test_series_match_python_loops(rollup_history):
+    """Rolling average, weekly buckets and slope equal the day-by-day reference"""
+    print("🧪 Testing rolling, weekly and slope series")
+    today = datetime.now().date()
+    for seed in range(25):
+        rng = random.Random(seed)
+        rollups = rollup_history(rng.choice([1, 3, 20, 200]), seed=seed, gap_rate=rng.choice([0.0, 0.5]))
+        shift = rng.choice([0, 3, 30])
+        for rollup in rollups:
+            rollup.day -= timedelta(days=shift)
+        series = vectorized_mood_analytics(_rows(rollups))['series']
+        start, rolling, weekly, slope = _reference_series(rollups, today)
+        assert series['rolling_average_7d']['start'] == start, seed
+        assert _close(series['rolling_average_7d']['values'], rolling, 0.01), seed
+        weeks = series['weekly']
+        assert [(w['week_start'], w['entries']) for w in weeks] == [w[:2] for w in weekly], seed
+        assert _close([w['average_score'] for w in weeks], [w[2] for w in weekly], 0.01), seed
+        assert _close([w['wellness'] for w in weeks], [w[3] for w in weekly], 0.1), seed
+        assert abs(series['trend_slope_per_week'] - slope) <= 0.001, seed
+    print("   ✅ Series identical to Python loops")
+
+
+def test_slope_sign_follows_trend():
+    """A steadily improving history has a positive weekly slope"""
+    today = datetime.now().date()
+    rollups = []
+    for offset in range(60):
+        rollup = MoodDailyRollup.empty(1, today - timedelta(days=offset))
+        rollup.add('happy', max(1, 10 - offset // 7))
+        rollups.append(rollup)
+    assert vectorized_mood_analytics(_rows(rollups))['series']['trend_slope_per_week'] > 0
+    print("   ✅ Improving history has positive slope")
+
+
+def test_mood_history_engine_selection(client_for, mood_user):
+    """Long windows use NumPy, the default window stays scalar, and both agree"""
+    print("🧪 Testing /mood-history engine selection")
+    user_id, entries = mood_user('long_horizon_user', days=800)
+    client = client_for(user_id)
+
+    everything = client.get('/mood-history?days=all').get_json()
+    assert everything['analytics_engine'] == 'vectorized' and everything['analytics_days'] == 'all'
+    assert everything['analytics']['total_entries'] == entries
+    assert len(everything['analytics']['series']['rolling_average_7d']['values']) == 800
+
+    year = client.get('/mood-history?days=365').get_json()
+    assert year['analytics_engine'] == 'vectorized' and year['analytics_days'] == 365
+
+    month = client.get('/mood-history').get_json()
+    assert month['analytics_engine'] == 'scalar' and 'series' not in month['analytics']
+
+    original = sahara_app.load_numpy
+    sahara_app.load_numpy = lambda: None
+    try:
+        fallback = client.get('/mood-history?days=365').get_json()
+    finally:
+        sahara_app.load_numpy = original
+    assert fallback['analytics_engine'] == 'scalar'
+    year['analytics'].pop('series')
+    assert fallback['analytics'] == year['analytics']
+    print("   ✅ Vectorized for long windows, scalar fallback without NumPy")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All vectorized mood analytics tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test script for the cached per-user mood context
+get_mood_context is built from mood_label/mood_intensity, chat turns read it from the
+cache with no mood queries in the steady state, and /mood writes through so the next
+turn sees the new entry.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import event
+
+import app as sahara_app
+from app import app, db, sahara_ai, MoodEntry, mood_context_cache, summarize_mood_context, get_mood_context
+
+
+class _MoodQueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def _record(self, conn, cursor, statement, *args):
+        if statement.lstrip().startswith('SELECT') and 'FROM mood_entry' in statement:
+            self.count += 1
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def _add_moods(user_id, moods):
+    """moods oldest first as (label, intensity)"""
+    start = datetime.utcnow() - timedelta(hours=len(moods))
+    with app.app_context():
+        db.session.add_all([MoodEntry(user_id=user_id, mood_emoji='🙂', mood_label=label, mood_intensity=intensity,
+                                      timestamp=start + timedelta(hours=i))
+                            for i, (label, intensity) in enumerate(moods)])
+        db.session.commit()
+
+
+def test_summary_from_label_and_intensity():
+    """The context uses real MoodEntry fields instead of failing silently"""
+    print("🧪 Testing mood context summary")
+    context = summarize_mood_context((('happy', 8), ('sad', 9), ('sad', 6), ('calm', 5)))
+    assert context['has_recent_data'] and context['recent_emotion'] == 'happy'
+    assert context['recent_rating'] == 8
+    assert context['dominant_emotions'] == ['sad', 'happy', 'calm']
+    assert context['wellness_trend'] == 'improving'          # 8 now vs 3.5 -> 4 oldest
+    assert context['context_summary'] == 'Recent mood: happy (8/10), trend: improving'
+    assert summarize_mood_context((('anxious', 9), ('happy', 7)))['wellness_trend'] == 'declining'
+    assert summarize_mood_context(())['has_recent_data'] is False
+    print("   ✅ Context built from mood_label and mood_intensity")
+
+
+def test_mild_moods_get_no_distress_copy():
+    """A neutral or positive latest mood is never answered as a rough patch, on either path"""
+    print("🧪 Testing mood copy for neutral and positive moods")
+    distress = ("tough times", "rough days", "dealing with some stress")
+    for label in ('neutral', 'happy', 'calm', 'content', 'hopeful', 'grateful', 'excited'):
+        for intensity in range(1, 11):
+            context = summarize_mood_context(((label, intensity), ('sad', 8)))
+            assert context['recent_rating'] == intensity
+            anonymous = dict(context, wellness_trend='stable')   # what the frontend sends
+            for mood_context in (context, anonymous):
+                greeting = sahara_ai._add_mood_aware_greeting('hi', {}, True, mood_context, False)
+                enhancement = sahara_ai._get_mood_enhancement(mood_context)
+                assert not any(phrase in greeting + enhancement for phrase in distress), (label, intensity)
+    low = summarize_mood_context((('sad', 3),))
+    assert 'tough times' in sahara_ai._get_mood_enhancement(low)
+    print("   ✅ Mild moods get neutral or upbeat copy; sad moods still get support")
+
+
+def test_get_mood_context_reads_database_once(chat_user):
+    """First lookup loads the last five entries; later lookups cost no queries"""
+    user_id = chat_user('mood_context_once', 0)
+    _add_moods(user_id, [('sad', 3)] * 4 + [('stressed', 7), ('hopeful', 6)])
+    with app.test_request_context():
+        user = sahara_app.load_user(str(user_id))
+        with _MoodQueryCounter() as counter:
+            contexts = [get_mood_context(user) for _ in range(5)]
+    assert counter.count == 1
+    assert contexts[0]['recent_emotion'] == 'hopeful'
+    assert contexts[0]['dominant_emotions'] == ['sad', 'hopeful', 'stressed']   # ties: newest first
+    assert mood_context_cache.recent(user_id)[:2] == (('hopeful', 6), ('stressed', 7))
+    assert len(mood_context_cache.recent(user_id)) == 5
+    print("   ✅ One query, then served from cache")
+
+
+def test_chat_turns_cost_no_mood_queries(client_for, chat_user):
+    """Steady-state /chat turns never query mood_entry; /mood writes through to the next turn"""
+    print("🧪 Testing chat mood queries")
+    user_id = chat_user('mood_context_chat', 0)
+    _add_moods(user_id, [('tired', 4)])
+    client = client_for(user_id)
+    captured = []
+    original = sahara_app.sahara_ai.get_response
+
+    def capture(message, user_context, mood_context):
+        captured.append(mood_context)
+        return original(message, user_context, mood_context)
+
+    sahara_app.sahara_ai.get_response = capture
+    try:
+        client.post('/chat', json={'message': 'hi', 'context': {'session_id': 'mood-ctx'}})   # warms the cache
+        with _MoodQueryCounter() as counter:
+            for message in ["padhai nahi ho rahi", "I'm stressed about exams", "thanks"]:
+                client.post('/chat', json={'message': message, 'context': {'session_id': 'mood-ctx'}})
+        assert client.post('/mood', json={'mood_emoji': '😊', 'mood_label': 'happy',
+                                          'mood_intensity': 9}).get_json()['success']
+        with _MoodQueryCounter() as after_write:
+            client.post('/chat', json={'message': 'hello again', 'context': {'session_id': 'mood-ctx'}})
+    finally:
+        sahara_app.sahara_ai.get_response = original
+
+    assert counter.count == 0 and after_write.count == 0, (counter.count, after_write.count)
+    assert captured[0]['recent_emotion'] == 'tired'
+    assert captured[-1]['recent_emotion'] == 'happy' and captured[-1]['recent_rating'] == 9
+    assert captured[-1]['wellness_trend'] == 'improving'
+    print("   ✅ Zero mood queries per turn, write-through visible immediately")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All mood context cache tests passed!")
+    sys.exit(exit_code)
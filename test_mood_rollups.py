@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-user daily mood rollups
+/mood updates the day's rollup in the same transaction as the entry, the backfill
+rebuilds identical rollups from raw entries, and /mood-history analytics are
+served from rollups with the same totals as the raw entries.
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import (app, db, User, MoodEntry, MoodDailyRollup, MOOD_VALENCE, mood_score,
+                 rebuild_mood_rollups, load_mood_rollups, generate_mood_analytics)
+
+LABELS = sorted(MOOD_VALENCE) + ['unlisted']
+
+
+def _create_user(username):
+    with app.app_context():
+        user = User(username=username, email=f"{username}@example.com")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def _rollup_rows(user_id):
+    with app.app_context():
+        return [(r.day, r.entry_count, round(r.score_sum, 6), r.min_intensity, r.max_intensity, r.labels())
+                for r in MoodDailyRollup.query.filter_by(user_id=user_id).order_by(MoodDailyRollup.day)]
+
+
+def _post_mood(client, label, intensity):
+    return client.post('/mood', json={'mood_emoji': '🙂', 'mood_label': label, 'mood_intensity': intensity})
+
+
+def test_mood_post_updates_rollup(client_for):
+    """Each /mood entry is folded into today's rollup"""
+    print("🧪 Testing rollup maintenance on /mood")
+    user_id = _create_user('rollup_writer')
+    client = client_for(user_id)
+    for label, intensity in [('happy', 8), ('sad', 3), ('happy', 5)]:
+        assert _post_mood(client, label, intensity).get_json()['success']
+
+    [(day, count, score_sum, low, high, labels)] = _rollup_rows(user_id)
+    assert day == datetime.utcnow().date()
+    assert count == 3 and (low, high) == (3, 8)
+    assert labels == {'happy': 2, 'sad': 1}
+    assert score_sum == round(mood_score('happy', 8) + mood_score('sad', 3) + mood_score('happy', 5), 6)
+    print("   ✅ Count, score sum, intensity range and labels updated")
+
+
+def test_rollup_failure_rolls_back_entry(client_for):
+    """Entry and rollup commit together: if the rollup update fails, no entry is saved"""
+    user_id = _create_user('rollup_atomic')
+    client = client_for(user_id)
+    original = MoodDailyRollup.add
+
+    def broken_add(self, mood_label, mood_intensity):
+        raise RuntimeError('rollup unavailable')
+
+    MoodDailyRollup.add = broken_add
+    try:
+        response = _post_mood(client, 'calm', 6)
+    finally:
+        MoodDailyRollup.add = original
+    assert response.status_code == 500
+    with app.app_context():
+        assert MoodEntry.query.filter_by(user_id=user_id).count() == 0
+    assert all(count == 0 for _, count, *_ in _rollup_rows(user_id))
+    print("   ✅ Entry and rollup are atomic")
+
+
+def test_backfill_matches_incremental_rollups(client_for):
+    """Rebuilding from raw entries gives exactly the rollups maintained on write"""
+    print("🧪 Testing rollup backfill")
+    user_id = _create_user('rollup_backfill')
+    client = client_for(user_id)
+    for i in range(12):
+        _post_mood(client, LABELS[i % len(LABELS)], i % 10 + 1)
+    incremental = _rollup_rows(user_id)
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            assert rebuild_mood_rollups(connection, user_id) == len(incremental)
+    assert _rollup_rows(user_id) == incremental
+    print("   ✅ Backfill reproduces incremental rollups")
+
+
+def test_analytics_from_rollups_match_raw_entries():
+    """Totals, averages, distribution and streak from rollups equal the per-entry computation"""
+    print("🧪 Testing analytics served from rollups")
+    user_id = _create_user('rollup_analytics')
+    rng = random.Random(11)
+    now = datetime.utcnow().replace(hour=12, minute=0)   # minute offsets never cross midnight
+    entries = []   # (label, intensity, timestamp)
+    for days_ago in list(range(0, 5)) + list(range(7, 25)):   # 5-day streak, then a gap
+        for _ in range(rng.randint(1, 4)):
+            entries.append((rng.choice(LABELS), rng.randint(1, 10),
+                            now - timedelta(days=days_ago, minutes=rng.randint(0, 60))))
+    with app.app_context():
+        db.session.add_all([MoodEntry(user_id=user_id, mood_emoji='🙂', mood_label=label,
+                                      mood_intensity=intensity, timestamp=timestamp)
+                            for label, intensity, timestamp in entries])
+        db.session.commit()
+        with db.engine.begin() as connection:
+            rebuild_mood_rollups(connection, user_id)
+        rollups = load_mood_rollups(user_id, days=30)
+        analytics = generate_mood_analytics(rollups)
+
+    assert len(rollups) == 23
+    expected_average = sum(mood_score(label, intensity) for label, intensity, _ in entries) / len(entries)
+    expected_labels = {}
+    for label, _, _ in entries:
+        expected_labels[label] = expected_labels.get(label, 0) + 1
+    assert analytics['total_entries'] == len(entries)
+    assert analytics['average_intensity'] == round(expected_average, 1)
+    assert analytics['mood_distribution'] == expected_labels
+    intensities = [intensity for _, intensity, _ in entries]
+    assert analytics['intensity_range'] == [min(intensities), max(intensities)]
+    assert analytics['current_streak'] == 5
+    assert 0 <= analytics['wellness_score'] <= 10
+    print("   ✅ Rollup analytics agree with raw entries")
+
+
+def test_mood_history_window(client_for):
+    """/mood-history serves analytics for the requested day window"""
+    user_id = _create_user('rollup_history')
+    client = client_for(user_id)
+    _post_mood(client, 'grateful', 9)
+    data = client.get('/mood-history?days=7').get_json()
+    assert data['success'] and data['analytics_days'] == 7
+    assert data['analytics']['total_entries'] == 1
+    assert data['analytics']['current_streak'] == 1
+    assert client.get('/mood-history?days=0').get_json()['analytics_days'] == 1
+    empty = client_for(_create_user('rollup_empty')).get('/mood-history').get_json()
+    assert empty['analytics']['total_entries'] == 0
+    print("   ✅ Day window honoured")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All mood rollup tests passed!")
+    sys.exit(exit_code)
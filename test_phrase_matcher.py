@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass PhraseMatcher
+Verifies the compiled automaton gives exactly the same hits and message analysis
+as the original per-phrase substring scans.
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import PhraseMatcher, GeminiAI, sahara_ai
+
+
+def _random_messages(count=300, seed=7):
+    """Random mixes of known phrases, fragments and noise to stress overlapping matches"""
+    rng = random.Random(seed)
+    phrases = sorted(sahara_ai.phrase_matcher.phrases)
+    noise = ['yaar', 'the', 'a', 'हूं', '?', '!!', 'xo', 'ing', 'nahin', 'know', 'studying']
+    messages = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(1, 8)):
+            word = rng.choice(phrases + noise)
+            if rng.random() < 0.3 and len(word) > 2:
+                cut = rng.randint(1, len(word) - 1)
+                word = word[:cut] if rng.random() < 0.5 else word[cut:]
+            parts.append(word)
+        messages.append(rng.choice(['', ' ']).join(parts))
+    return messages
+
+
+def test_matcher_matches_naive_scan(sample_messages):
+    """Every phrase reported by the automaton (and only those) occurs in the text"""
+    print("🧪 Testing PhraseMatcher against naive substring scan")
+    matcher = sahara_ai.phrase_matcher
+    for message in sample_messages + _random_messages():
+        text = message.lower()
+        expected = {phrase for phrase in matcher.phrases if phrase in text}
+        assert matcher.find(text) == expected, message
+    print("   ✅ Automaton hits identical to substring scan")
+
+
+def test_overlapping_phrases():
+    """Nested and overlapping phrases are all reported"""
+    matcher = PhraseMatcher(['he', 'she', 'his', 'hers', 'exam', 'exams', 'am'])
+    assert matcher.find('ushers') == {'she', 'he', 'hers'}
+    assert matcher.find('exams') == {'exam', 'exams', 'am'}
+    assert matcher.find('') == set()
+    assert matcher.find('xyz') == set()
+    print("   ✅ Overlapping phrases detected")
+
+
+def test_analysis_matches_legacy_loops(sample_messages, legacy_understand):
+    """understand_message_deeply produces the same analysis as the original loops"""
+    print("🧪 Testing message analysis parity")
+    for message in sample_messages + _random_messages():
+        analysis = sahara_ai.understand_message_deeply(message)
+        analysis.pop('matched_phrases')
+        assert analysis == legacy_understand(sahara_ai, message), message
+    print("   ✅ Analysis identical to legacy loops")
+
+
+def test_emotional_style_uses_matcher_hits(sample_messages):
+    """Response style chosen from matcher hits equals the standalone scan"""
+    gemini = GeminiAI.__new__(GeminiAI)
+    for message in sample_messages + _random_messages(100):
+        hits = sahara_ai.understand_message_deeply(message)['matched_phrases']
+        assert (gemini._get_emotional_response_style(message, 'neutral', hits) ==
+                gemini._get_emotional_response_style(message, 'neutral'))
+    print("   ✅ Emotional style parity")
+
+
+def test_crisis_detection_still_triggers():
+    """Crisis phrases in English and Devanagari get the crisis response"""
+    for message in ["I want to die", "मैं मरना चाहता हूं", "thinking about SUICIDE"]:
+        response = sahara_ai.generate_intelligent_response(message)
+        assert response['context'] == 'crisis', message
+    print("   ✅ Crisis detection intact")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All phrase matcher tests passed!")
+    sys.exit(exit_code)
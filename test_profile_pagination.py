@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Test script for keyset-paginated /profile
+Pages follow ?before=<timestamp,id>&limit= newest first without gaps or repeats,
+insight counters come from the per-user UserChatStats row kept up to date on every
+chat write, and every page - the first included - costs the same whatever the
+length of a user's history.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import event
+
+from app import (app, db, User, ChatHistory, UserChatStats, chat_activity_stats, chat_history_writer,
+                 rebuild_chat_stats)
+
+LIGHT_USER_CHATS = 50
+HEAVY_USER_CHATS = 20_000
+MAX_SLOWDOWN = 4   # heavy user's keyset page vs light user's (loading every row was ~50x slower)
+
+
+def _create_user(username, chat_count, moods=('happy', 'sad', None)):
+    """User with chat_count chats, two per day, with some identical timestamps to exercise tie-breaks"""
+    with app.app_context():
+        user = User(username=username, email=f"{username}@example.com")
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        start = datetime(2024, 1, 1, 9, 0)
+        db.session.execute(ChatHistory.__table__.insert(), [{
+            'user_id': user.id,
+            'message': f"message {i}",
+            'response': f"response {i}",
+            'timestamp': start + timedelta(hours=12 * (i // 2)),   # pairs share a timestamp
+            'mood': moods[i % len(moods)],
+            'session_id': 'profile-test'
+        } for i in range(chat_count)])
+        rebuild_chat_stats(db.session.connection(), user.id)
+        db.session.commit()
+        return user.id
+
+
+def test_pages_walk_history_without_gaps(client_for):
+    """Following next_before visits every chat exactly once, newest first"""
+    print("🧪 Testing keyset pagination")
+    user_id = _create_user('pager', 45)
+    client = client_for(user_id)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        url = '/profile?limit=10' + (f'&before={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        if cursor is None:
+            insights = data['insights']
+        else:
+            assert data['insights'] is None
+        seen.extend(chat['id'] for chat in data['chats'])
+        pages += 1
+        if not data['pagination']['has_more']:
+            assert data['pagination']['next_before'] is None
+            break
+        cursor = data['pagination']['next_before']
+
+    with app.app_context():
+        expected = [chat.id for chat in ChatHistory.query.filter_by(user_id=user_id)
+                    .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())]
+    assert seen == expected and len(seen) == 45 and pages == 5
+    assert insights['total_conversations'] == 45
+    assert insights['active_days'] == 12      # 45 chats, four per day (two shared timestamps each)
+    print(f"   ✅ {pages} pages, {len(seen)} chats, no gaps or repeats")
+
+
+def test_invalid_parameters_rejected(client_for):
+    client = client_for(_create_user('badparams', 3))
+    assert client.get('/profile?before=yesterday').status_code == 400
+    assert client.get('/profile?limit=lots').status_code == 400
+    assert len(client.get('/profile?limit=1000').get_json()['chats']) == 3
+    print("   ✅ Bad cursors rejected, limit clamped")
+
+
+def _second_page_url(client):
+    return f"/profile?before={client.get('/profile').get_json()['pagination']['next_before']}"
+
+
+def _chat_statements(client, url):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2].lower())
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get(url).status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return [statement for statement in statements if 'chat_history' in statement or 'user_chat_stats' in statement]
+
+
+def test_no_page_aggregates_history(client_for):
+    """The first page reads the stats row and ten moods, ?before= pages only the page - no COUNT anywhere"""
+    client = client_for(_create_user('aggregates', 45))
+    first = _chat_statements(client, '/profile')
+    assert len(first) == 3 and not any('count(' in statement for statement in first), first
+    assert sum('from user_chat_stats' in statement for statement in first) == 1
+    later = _chat_statements(client, _second_page_url(client))
+    assert len(later) == 1 and 'count(' not in later[0], later
+    print("   ✅ No page aggregates the chat history")
+
+
+def test_chat_stats_follow_writes():
+    """UserChatStats matches a full aggregate (and the backfill) after chats on new, existing and earlier days"""
+    user_id = _create_user('stats_writes', 7)
+    start = datetime(2024, 1, 1, 9, 0)
+    batches = [
+        [start + timedelta(days=1, hours=13)],                          # same day as the latest chat
+        [start + timedelta(days=5), start + timedelta(days=5, hours=2)],  # a new day, twice
+        [start + timedelta(hours=3)],                                   # an earlier day that has chats
+        [start - timedelta(days=10)],                                   # an earlier day without chats
+    ]
+    with app.app_context():
+        for times in batches:
+            with db.engine.begin() as connection:
+                chat_history_writer.insert_rows(connection, [
+                    {'user_id': user_id, 'message': 'm', 'response': 'r', 'mood': None,
+                     'session_id': 'stats', 'timestamp': timestamp} for timestamp in times])
+        stats = db.session.get(UserChatStats, user_id)
+        total, days, first = chat_activity_stats(user_id)
+        assert (stats.total_chats, stats.active_days, stats.first_chat_at) == (total, days, first)
+        assert (total, days) == (12, 4)
+        assert first == start - timedelta(days=10)
+        incremental = (stats.total_chats, stats.active_days, stats.first_chat_at, stats.last_chat_at)
+        with db.engine.begin() as connection:
+            assert rebuild_chat_stats(connection, user_id) == 1    # the migration's backfill agrees
+        db.session.expire_all()
+        stats = db.session.get(UserChatStats, user_id)
+        assert (stats.total_chats, stats.active_days, stats.first_chat_at, stats.last_chat_at) == incremental
+    print("   ✅ Stats kept exact by each write")
+
+
+def test_response_time_is_flat(client_for):
+    """A heavy user's first and later pages cost about the same as a light user's"""
+    print("🧪 Testing /profile time vs history length")
+
+    def best_time(client, url):
+        timings = []
+        for _ in range(5):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200 and len(response.get_json()['chats']) == 20
+        return min(timings)
+
+    light = client_for(_create_user('light', LIGHT_USER_CHATS))
+    heavy = client_for(_create_user('heavy', HEAVY_USER_CHATS))
+    for page, url_for in (('first page', lambda client: '/profile'), ('later page', _second_page_url)):
+        light_ms, heavy_ms = best_time(light, url_for(light)), best_time(heavy, url_for(heavy))
+        print(f"   ⏱️  {page}: {LIGHT_USER_CHATS} chats {light_ms:.1f} ms, "
+              f"{HEAVY_USER_CHATS:,} chats {heavy_ms:.1f} ms")
+        assert heavy_ms < light_ms * MAX_SLOWDOWN, page
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All profile pagination tests passed!")
+    sys.exit(exit_code)
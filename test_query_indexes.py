@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Test script for the hot-query indexes and schema migrations
+The (user_id, timestamp) and session_id indexes must exist on fresh and migrated
+databases, each migration must run once even when workers start together, and
+SQLite's query planner must use the indexes for the hot query shapes.
+"""
+
+import os
+import tempfile
+import threading
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import create_engine, inspect, text
+
+import app as sahara_app
+from app import app, db, ChatHistory, MoodEntry, SchemaMigration, run_schema_migrations, SCHEMA_MIGRATIONS
+
+EXPECTED_INDEXES = {
+    'chat_history': {'ix_chat_history_user_id_timestamp', 'ix_chat_history_session_id'},
+    'mood_entry': {'ix_mood_entry_user_id_timestamp', 'ix_mood_entry_session_id'},
+}
+
+# Tables as they were created before the indexes existed
+LEGACY_SCHEMA = [
+    """CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+       email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(128), created_at DATETIME)""",
+    """CREATE TABLE chat_history (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user(id),
+       message TEXT NOT NULL, response TEXT NOT NULL, timestamp DATETIME, mood VARCHAR(50),
+       session_id VARCHAR(100))""",
+    """CREATE TABLE mood_entry (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES user(id),
+       mood_emoji VARCHAR(10) NOT NULL, mood_label VARCHAR(50) NOT NULL, mood_intensity INTEGER NOT NULL,
+       notes TEXT, timestamp DATETIME, session_id VARCHAR(100))""",
+]
+
+
+def _index_names(engine, table):
+    return {index['name'] for index in inspect(engine).get_indexes(table)}
+
+
+def _query_plan(query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def test_fresh_database_has_indexes():
+    with app.app_context():
+        for table, expected in EXPECTED_INDEXES.items():
+            assert expected <= _index_names(db.engine, table), table
+    print("   ✅ Indexes created on a fresh database")
+
+
+def test_migration_adds_indexes_to_existing_database():
+    """An old database gains the indexes exactly once, keeping its data"""
+    print("🧪 Testing schema migration on a legacy database")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'legacy.db')}")
+        with engine.begin() as connection:
+            for statement in LEGACY_SCHEMA:
+                connection.execute(text(statement))
+            connection.execute(text("INSERT INTO user (id, username, email) VALUES (1, 'old', 'old@example.com')"))
+            connection.execute(text("INSERT INTO chat_history (user_id, message, response, timestamp) "
+                                    "VALUES (1, 'hi', 'hello', '2024-01-01 10:00:00')"))
+        assert not _index_names(engine, 'chat_history')
+
+        assert run_schema_migrations(engine) == [migration_id for migration_id, _, _ in SCHEMA_MIGRATIONS]
+        for table, expected in EXPECTED_INDEXES.items():
+            assert expected <= _index_names(engine, table), table
+        assert run_schema_migrations(engine) == []     # already applied
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT COUNT(*) FROM chat_history")).scalar() == 1
+        engine.dispose()
+    print("   ✅ Legacy database migrated once")
+
+
+def test_concurrent_workers_apply_each_migration_once():
+    """Workers migrating the same database at once split the work instead of failing"""
+    print("🧪 Testing concurrent schema migrations")
+    runs = []
+
+    def counted(migration_id, migrate):
+        def run(connection):
+            runs.append(migration_id)
+            migrate(connection)
+        return run
+
+    original = sahara_app.SCHEMA_MIGRATIONS
+    sahara_app.SCHEMA_MIGRATIONS = [(migration_id, description, counted(migration_id, migrate))
+                                    for migration_id, description, migrate in original]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'shared.db')}", connect_args={'timeout': 30})
+            with engine.begin() as connection:
+                for statement in LEGACY_SCHEMA:
+                    connection.execute(text(statement))
+            SchemaMigration.__table__.create(engine)    # created by db.create_all() before migrating
+
+            results, errors = [], []
+            barrier = threading.Barrier(4)
+
+            def worker():
+                barrier.wait()
+                try:
+                    results.append(run_schema_migrations(engine))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            engine.dispose()
+    finally:
+        sahara_app.SCHEMA_MIGRATIONS = original
+
+    expected = sorted(migration_id for migration_id, _, _ in original)
+    assert errors == [], errors
+    assert sorted(runs) == expected                                     # each migration ran once
+    assert sorted(sum(results, [])) == expected
+    print("   ✅ Each migration applied by exactly one worker")
+
+
+def test_hot_queries_use_indexes():
+    """The planner searches the new indexes instead of scanning the tables"""
+    print("🧪 Testing query plans")
+    with app.app_context():
+        plans = {
+            'latest moods': (_query_plan(MoodEntry.query.filter_by(user_id=1)
+                                         .order_by(MoodEntry.timestamp.desc()).limit(5)),
+                             'ix_mood_entry_user_id_timestamp'),
+            'chat history': (_query_plan(ChatHistory.query.filter_by(user_id=1)
+                                         .order_by(ChatHistory.timestamp.desc())),
+                             'ix_chat_history_user_id_timestamp'),
+            'chats by session': (_query_plan(ChatHistory.query.filter_by(session_id='abc')),
+                                 'ix_chat_history_session_id'),
+            'moods by session': (_query_plan(MoodEntry.query.filter_by(session_id='abc')),
+                                 'ix_mood_entry_session_id'),
+        }
+    for name, (plan, index) in plans.items():
+        print(f"   🔎 {name}: {plan}")
+        assert index in plan, (name, plan)
+        assert 'TEMP B-TREE' not in plan, (name, plan)   # no separate sort step
+    print("   ✅ Hot queries use their indexes")
+
+
+if __name__ == "__main__":
+    test_fresh_database_has_indexes()
+    test_migration_adds_indexes_to_existing_database()
+    test_concurrent_workers_apply_each_migration_once()
+    test_hot_queries_use_indexes()
+    print("🎉 All query index tests passed!")
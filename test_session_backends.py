@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the pluggable session backends
+Conversation context must survive across workers (separate backend instances on
+one SQLite file or database) as soon as save() returns, and a /chat turn must cost
+one read and one write to the shared store.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import create_engine, event
+
+from app import app, sahara_ai, ConversationState, SessionStore, SQLSessionBackend, create_session_backend
+
+
+def _sqlite_backend(path, ttl_seconds=3600):
+    return SQLSessionBackend(lambda: create_engine(f'sqlite:///{path}'), name='sqlite', ttl_seconds=ttl_seconds)
+
+
+def test_state_round_trips_through_json(analysis):
+    """A serialized state keeps history, topics, emotions and rapport"""
+    state = ConversationState(max_turns=3)
+    for i in range(5):
+        state.record_turn(f"message {i}", analysis(emotion='sad' if i % 2 else 'stressed'))
+    restored = ConversationState.from_dict(state.to_dict(), max_turns=3)
+    assert restored.history(3) == state.history(3) == ['message 2', 'message 3', 'message 4']
+    assert restored.topics_discussed == ('academic_pressure',)
+    assert list(restored.emotional_journey) == list(state.emotional_journey)
+    assert restored.rapport_level == 5
+    print("   ✅ State serializes losslessly for continuity")
+
+
+def test_context_shared_between_workers(analysis):
+    """A turn saved by one worker is visible to another worker's backend as soon as save() returns"""
+    print("🧪 Testing cross-worker continuity")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.db')
+        worker_a, worker_b = _sqlite_backend(path), _sqlite_backend(path)
+
+        state = ConversationState()
+        state.record_turn("I'm stressed about exams", analysis())
+        worker_a.save('shared', state)
+        loaded = worker_b.load('shared')
+        assert loaded.history() == ["I'm stressed about exams"] and loaded.turn_count == 1
+        assert worker_b.load('unknown') is None
+
+        loaded.record_turn("padhai nahi ho rahi", analysis())
+        worker_b.save('shared', loaded)
+        assert worker_a.get_history('shared') == ["I'm stressed about exams", "padhai nahi ho rahi"]
+    print("   ✅ Context visible to another worker immediately")
+
+
+def test_expired_rows_are_ignored():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _sqlite_backend(os.path.join(tmp, 'sessions.db'), ttl_seconds=0.05)
+        backend.save('old', ConversationState())
+        time.sleep(0.08)
+        assert backend.load('old') is None
+    print("   ✅ Expired sessions ignored")
+
+
+def test_chat_costs_one_read_and_one_write():
+    """A /chat turn issues one SELECT and one upsert to the shared store"""
+    print("🧪 Testing round trips per /chat")
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _sqlite_backend(os.path.join(tmp, 'sessions.db'))
+        statements = []
+        engine = backend.engine
+        event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+        saved = sahara_ai.user_sessions
+        sahara_ai.user_sessions = backend
+        try:
+            client = app.test_client()
+            for turn, message in enumerate(["I'm stressed about exams", "padhai nahi ho rahi", "kya karu?"]):
+                before = len(statements)
+                response = client.post('/chat', json={'message': message,
+                                                      'context': {'session_id': 'round-trip'}})
+                assert response.status_code == 200
+                turn_statements = [s.split()[0] for s in statements[before:] if not s.startswith('DELETE')]
+                assert turn_statements == ['SELECT', 'INSERT'], statements[before:]
+            assert backend.get_history('round-trip') == ["I'm stressed about exams", "padhai nahi ho rahi",
+                                                         "kya karu?"]
+        finally:
+            sahara_ai.user_sessions = saved
+        stats = backend.get_stats()
+        assert stats['rows_written'] >= 3 and stats['write_errors'] == 0
+    print("   ✅ One read and one write per /chat")
+
+
+def test_portable_upsert_survives_concurrent_insert(analysis):
+    """Without a native upsert, a row inserted by a concurrent turn is updated instead of failing"""
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = _sqlite_backend(os.path.join(tmp, 'sessions.db'))
+        backend.NATIVE_UPSERT_DIALECTS = ()       # the path for any other database
+        first = ConversationState()
+        first.record_turn("hi", analysis())
+        backend.save('raced', first)
+        statements = []
+
+        def miss_first_update(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.split()[0])
+            if statements == ['UPDATE']:           # another turn inserts the row after this UPDATE
+                parameters = tuple('not-yet' if value == 'raced' else value for value in parameters)
+            return statement, parameters
+
+        event.listen(backend.engine, 'before_cursor_execute', miss_first_update, retval=True)
+        second = backend.load('raced')
+        second.record_turn("still there?", analysis())
+        statements.clear()
+        backend.save('raced', second)
+        event.remove(backend.engine, 'before_cursor_execute', miss_first_update)
+
+        assert statements == ['UPDATE', 'SAVEPOINT', 'INSERT', 'ROLLBACK', 'UPDATE'], statements
+        assert backend.get_history('raced') == ["hi", "still there?"]
+        assert backend.get_stats()['write_errors'] == 0
+    print("   ✅ Portable upsert falls back to UPDATE on a concurrent insert")
+
+
+def test_backend_selected_by_env(analysis):
+    """SESSION_BACKEND picks memory, sqlite file or the app database"""
+    saved = {key: os.environ.get(key) for key in ('SESSION_BACKEND', 'SESSION_SQLITE_PATH')}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.environ['SESSION_SQLITE_PATH'] = os.path.join(tmp, 'sessions.db')
+            for kind, expected in (('memory', SessionStore), ('sqlite', SQLSessionBackend),
+                                   ('database', SQLSessionBackend)):
+                os.environ['SESSION_BACKEND'] = kind
+                backend = create_session_backend()
+                assert isinstance(backend, expected) and backend.name == kind
+                state = ConversationState()
+                state.record_turn("hi", analysis())
+                backend.save(f'env-{kind}', state)
+                assert backend.get_history(f'env-{kind}') == ["hi"]
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    print("   ✅ Backends selectable from SESSION_BACKEND")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All session backend tests passed!")
+    sys.exit(exit_code)
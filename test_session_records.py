@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact per-session conversation records
+Turns and session state are __slots__ records with interned topic/emotion codes,
+epoch timestamps and fixed-capacity buffers, and use far less memory per session
+than the original dict layout.
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import ConversationState, ConversationTurn, RingBuffer
+
+MIN_SAVING = 2.5    # compact layout must be at least this many times smaller
+
+
+def test_records_use_slots():
+    """No per-instance __dict__ on turns or session state"""
+    print("🧪 Testing slot-based records")
+    state = ConversationState()
+    state.record_turn("I'm stressed about exams", {'main_topic': 'academic_pressure', 'emotion': 'stressed'})
+    turn = next(iter(state.messages))
+    for record in (state, turn, state.messages):
+        assert not hasattr(record, '__dict__'), type(record).__name__
+    assert isinstance(turn, ConversationTurn) and isinstance(turn.timestamp, float)
+    print("   ✅ Records use __slots__ and numeric timestamps")
+
+
+def test_codes_are_interned():
+    """Topic and emotion codes are shared objects across sessions"""
+    a, b = ConversationState(), ConversationState()
+    a.record_turn("one", {'main_topic': ''.join(['academic_', 'pressure']), 'emotion': ''.join(['str', 'essed'])})
+    b.record_turn("two", {'main_topic': ''.join(['academic', '_pressure']), 'emotion': ''.join(['stre', 'ssed'])})
+    turn_a, turn_b = next(iter(a.messages)), next(iter(b.messages))
+    assert turn_a.topic is turn_b.topic and turn_a.emotion is turn_b.emotion
+    assert a.topics_discussed[0] is b.topics_discussed[0]
+    print("   ✅ Codes interned")
+
+
+def test_buffers_have_fixed_capacity():
+    """Turns and the derived emotional journey never exceed max_turns"""
+    buffer = RingBuffer(3)
+    for i in range(7):
+        buffer.append(i)
+    assert list(buffer) == [4, 5, 6] and buffer.last(2) == [5, 6] and len(buffer.items) == 3
+
+    state = ConversationState(max_turns=5)
+    for i in range(50):
+        state.record_turn(f"m{i}", {'main_topic': 'relationships', 'emotion': 'sad' if i % 2 else 'lonely'})
+    assert state.turn_count == 5 and len(state.emotional_journey) == 5
+    assert state.history(3) == ['m47', 'm48', 'm49'] and state.rapport_level == 50
+    assert state.topics_discussed == ('relationships',)
+    print("   ✅ Fixed-capacity buffers")
+
+
+def test_memory_per_session_drops(session_bytes):
+    """The compact layout is several times smaller per session than the original"""
+    legacy, compact = session_bytes(2000)
+    print(f"   📏 {legacy:.0f} → {compact:.0f} bytes/session ({legacy / compact:.1f}x)")
+    assert legacy / compact >= MIN_SAVING
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All session record tests passed!")
+    sys.exit(exit_code)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script for session snapshots and warm restore
+Sessions written to the snapshot file on shutdown must come back after a restart,
+lazily and without blocking boot, so mid-conversation users are not greeted as
+new - with the restart of 50k sessions kept within budget.
+"""
+
+import atexit
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import SessionStore
+
+SESSIONS = 50_000
+BOOT_BLOCKING_BUDGET_MS = 50     # start_persistence() must return almost immediately
+RESTORE_BUDGET_MS = 1000         # background restore of SESSIONS until every session is reachable
+
+
+def _restart(path, **kwargs):
+    store = SessionStore(snapshot_path=path, **kwargs)
+    store.start_persistence()
+    atexit.unregister(store._safe_snapshot)   # the temp directory is gone by exit time
+    store.restore_ready.wait(5)
+    return store
+
+
+def test_sessions_survive_restart(analysis):
+    """History, summary and LRU order come back; sessions are decoded only on first use"""
+    print("🧪 Testing snapshot + warm restore")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        store = SessionStore(snapshot_path=path)
+        store.record_turn('tab\tand\nnewline', "I'm stressed about exams", analysis())
+        store.record_turn('tab\tand\nnewline', "padhai nahi ho rahi", analysis())
+        store.record_turn('other', "I feel lonely", analysis('relationships', 'lonely'))
+        assert store.snapshot() == 2
+
+        restored = _restart(path)
+        assert restored.get_stats()['restore_pending'] == 2
+        state = restored.load('tab\tand\nnewline')
+        assert state.history() == ["I'm stressed about exams", "padhai nahi ho rahi"]
+        assert state.summary.turns == 2 and state.rapport_level == 2
+        stats = restored.get_stats()
+        assert stats['restored_used'] == 1 and stats['restore_pending'] == 1
+
+        # Unused restored sessions are carried into the next snapshot
+        assert restored.snapshot() == 2
+        assert _restart(path).get_history('other') == ["I feel lonely"]
+    print("   ✅ Sessions restored")
+
+
+def test_offline_time_counts_towards_ttl(analysis):
+    """Sessions that went idle past the TTL while the app was down are not restored"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        store = SessionStore(snapshot_path=path, ttl_seconds=600)
+        store.record_turn('s1', "hi", analysis())
+        store.snapshot()
+
+        with open(store.worker_snapshot_path(), encoding='utf-8') as f:
+            header, *lines = f.readlines()
+        header = json.loads(header)
+        header['saved_at'] -= 3600          # pretend the snapshot is an hour old
+        with open(store.worker_snapshot_path(), 'w', encoding='utf-8') as f:
+            f.writelines([json.dumps(header) + '\n'] + lines)
+
+        assert _restart(path, ttl_seconds=600).load('s1') is None
+    print("   ✅ Offline time applied to TTL")
+
+
+def _worker_snapshots(path, worker, rounds):
+    """One gunicorn-style worker: its own sessions, snapshotted repeatedly"""
+    store = SessionStore(snapshot_path=path)
+    for i in range(rounds):
+        store.record_turn(f"w{worker}-s{i}", f"worker {worker} turn {i}",
+                          {'main_topic': 'academic_pressure', 'emotion': 'stressed'})
+        store.snapshot()
+
+
+def test_concurrent_workers_keep_all_sessions(analysis):
+    """Workers snapshotting at the same time each keep their sessions; a restore merges them all"""
+    print("🧪 Testing snapshots from several workers")
+    workers, rounds = 4, 25
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=_worker_snapshots, args=(path, worker, rounds))
+                     for worker in range(workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+            assert process.exitcode == 0
+        assert len(glob.glob(path + '.*')) == workers     # one file per worker, no temp files left
+
+        # The same session in two workers' files keeps the most recent copy
+        older = SessionStore(snapshot_path=path)
+        older.record_turn('w0-s0', "older turn", analysis())
+        older.snapshot()
+        os.replace(older.worker_snapshot_path(), path + '.1')
+
+        restored = _restart(path)
+        assert restored.get_stats()['restored_sessions'] == workers * rounds
+        for worker in range(workers):
+            assert restored.get_history(f"w{worker}-s{rounds - 1}") == [f"worker {worker} turn {rounds - 1}"]
+        assert restored.get_history('w0-s0') == ["older turn"]
+    print(f"   ✅ {workers} workers, {workers * rounds} sessions restored")
+
+
+def test_missing_or_corrupt_snapshot_is_harmless():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sessions.snapshot')
+        assert _restart(path).load('anything') is None
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("not a snapshot\n")
+        store = _restart(path)
+        assert store.restore_ready.is_set() and store.load('anything') is None
+    print("   ✅ Missing/corrupt snapshot ignored")
+
+
+def test_restart_budget_at_50k_sessions(timed_restart):
+    """Boot is not blocked and every one of 50k sessions is reachable within the budget"""
+    print(f"🧪 Testing restart with {SESSIONS:,} sessions")
+    result = timed_restart(SESSIONS)
+    print(f"   ⏱️  Boot blocked {result['boot_ms']:.1f} ms, restore ready {result['ready_ms']:.0f} ms, "
+          f"first use {result['first_use_us']:.0f} µs")
+    assert result['boot_ms'] < BOOT_BLOCKING_BUDGET_MS
+    assert result['ready_ms'] < RESTORE_BUDGET_MS
+    assert result['restored_fraction'] == 1
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All session snapshot tests passed!")
+    sys.exit(exit_code)
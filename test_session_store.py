@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for the bounded SessionStore behind SaharaAI.user_sessions
+Sessions must expire after their TTL, be evicted least-recently-used beyond the
+cap, keep only a ring buffer of recent turns, survive concurrent writers and
+report their memory footprint.
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from app import app, sahara_ai, SessionStore
+
+
+def test_ring_buffer_keeps_recent_turns(analysis):
+    """Only the last max_turns turns are kept, in order"""
+    print("🧪 Testing per-session ring buffer")
+    store = SessionStore(max_turns=3)
+    for i in range(10):
+        store.record_turn('s1', f"message {i}", analysis())
+    assert store.turn_count('s1') == 3
+    assert store.get_history('s1', 3) == ['message 7', 'message 8', 'message 9']
+    assert store.get_history('s1', 2) == ['message 8', 'message 9']
+    assert store.get_history('missing') == []
+    print("   ✅ Ring buffer bounded")
+
+
+def test_lru_cap_evicts_least_recent(analysis):
+    """Beyond max_sessions the least recently used session is dropped"""
+    store = SessionStore(max_sessions=2)
+    store.record_turn('a', 'hi', analysis())
+    store.record_turn('b', 'hi', analysis())
+    assert 'a' in store                       # touching 'a' makes 'b' the oldest
+    store.record_turn('c', 'hi', analysis())
+    assert 'b' not in store and 'a' in store and 'c' in store
+    assert store.get_stats()['evictions'] == 1
+    print("   ✅ LRU eviction")
+
+
+def test_ttl_expiry(analysis):
+    """Idle sessions expire after ttl_seconds"""
+    store = SessionStore(ttl_seconds=0.05)
+    store.record_turn('old', 'hi', analysis())
+    time.sleep(0.08)
+    store.record_turn('new', 'hi', analysis())
+    assert 'old' not in store and len(store) == 1
+    assert store.get_stats()['expirations'] == 1
+    print("   ✅ TTL expiry")
+
+
+def test_concurrent_writers(analysis):
+    """Many threads creating and extending sessions never break the store or its bounds"""
+    print("🧪 Testing concurrent access")
+    store = SessionStore(max_sessions=50, max_turns=5)
+    errors = []
+
+    def worker(worker_id):
+        try:
+            for i in range(500):
+                session_id = f"s{(worker_id * 7 + i) % 80}"
+                store.record_turn(session_id, f"m{i}", analysis())
+                store.get_history(session_id)
+                store.turn_count(session_id)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = store.get_stats()
+    assert not errors, errors
+    assert stats['sessions'] <= 50 and stats['turns'] <= 50 * 5
+    print(f"   ✅ {stats['sessions']} sessions, {stats['evictions']} evictions, no errors")
+
+
+def test_size_reporting(analysis):
+    """The store reports an approximate byte footprint that grows with content"""
+    store = SessionStore()
+    assert store.get_stats()['approx_bytes'] == 0
+    for i in range(100):
+        store.record_turn(f"s{i}", "I'm stressed about exams " * 4, analysis())
+    stats = store.get_stats()
+    assert stats['sessions'] == 100 and stats['approx_bytes_per_session'] > 500
+    print(f"   📏 ≈{stats['approx_bytes_per_session']} bytes/session")
+
+
+def test_chat_uses_store_and_reports_it():
+    """Follow-up /chat turns see the stored history and /ai-status reports the store"""
+    client = app.test_client()
+    for message in ["I'm stressed about exams", "padhai nahi ho rahi"]:
+        client.post('/chat', json={'message': message, 'context': {'session_id': 'store-test'}})
+    assert sahara_ai.user_sessions.get_history('store-test') == ["I'm stressed about exams", "padhai nahi ho rahi"]
+    status = client.get('/ai-status').get_json()
+    assert status['session_store']['sessions'] >= 1
+    print("   ✅ /chat continuity through the store")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All session store tests passed!")
+    sys.exit(exit_code)
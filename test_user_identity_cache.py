@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the flask-login identity cache
+Repeated authenticated requests skip the User SELECT, cached users still load their
+relationships, and the cache is invalidated on logout and on User updates.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import event
+
+from app import app, db, User, UserIdentityCache, load_user, user_identity_cache
+
+
+class _UserQueryCounter:
+    """Counts SELECTs against the user table while active"""
+
+    def __init__(self):
+        self.count = 0
+
+    def _record(self, conn, cursor, statement, *args):
+        if statement.lstrip().startswith('SELECT') and 'FROM user' in statement:
+            self.count += 1
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+def test_repeat_requests_skip_user_lookup(client_for, chat_user):
+    """Only the first of many authenticated requests reads the user row"""
+    print("🧪 Testing identity cache hits")
+    user_id = chat_user('identity_hits', 3)
+    client = client_for(user_id)
+    saved_before = user_identity_cache.get_stats()['lookups_saved']
+    with _UserQueryCounter() as counter:
+        for _ in range(10):
+            data = client.get('/user-insights').get_json()
+            assert data['stats']['total_chats'] == 3
+    assert counter.count == 1, counter.count
+    assert user_identity_cache.get_stats()['lookups_saved'] - saved_before >= 9
+    print(f"   ✅ 10 requests, {counter.count} user lookup")
+
+
+def test_cached_user_is_session_bound(chat_user):
+    """A user rebuilt from the cache behaves like a loaded row (attributes and relationships)"""
+    user_id = chat_user('identity_relations', 4)
+    with app.test_request_context():
+        load_user(str(user_id))                 # fill the cache
+    with app.test_request_context():
+        with _UserQueryCounter() as counter:
+            user = load_user(str(user_id))
+            assert user.username == 'identity_relations'
+        assert counter.count == 0
+        assert len(user.chats) == 4             # lazy relationship still loads
+        assert load_user(str(user_id)) is user  # per-request memo
+    print("   ✅ Cached user attached to the request session")
+
+
+def test_update_invalidates_cache(client_for, chat_user):
+    """Profile and password changes are visible on the next request"""
+    print("🧪 Testing invalidation")
+    user_id = chat_user('identity_update', 1)
+    client = client_for(user_id)
+    client.get('/profile')
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.email = 'changed@example.com'
+        user.set_password('new-secret')
+        db.session.commit()
+    assert client.get('/profile').get_json()['user']['email'] == 'changed@example.com'
+    with app.test_request_context():
+        assert load_user(str(user_id)).check_password('new-secret')
+    print("   ✅ Updates invalidate the cached user")
+
+
+def test_logout_invalidates_cache(client_for, chat_user):
+    user_id = chat_user('identity_logout', 1)
+    client = client_for(user_id)
+    client.get('/profile')
+    assert user_id in user_identity_cache.cache.entries
+    client.post('/logout')
+    assert user_id not in user_identity_cache.cache.entries
+    print("   ✅ Logout drops the cached user")
+
+
+def test_ttl_and_size_bound(chat_user):
+    cache = UserIdentityCache(max_entries=2, ttl_seconds=0.05)
+    ids = [chat_user(f"identity_bound{i}", 0) for i in range(3)]
+    for user_id in ids:
+        with app.test_request_context():
+            cache.load(user_id)
+    assert len(cache.cache.entries) == 2 and cache.get_stats()['evictions'] == 1
+    time.sleep(0.06)
+    with app.test_request_context():
+        cache.load(ids[-1])
+    assert cache.get_stats()['expirations'] == 1
+    print("   ✅ Size bound and TTL enforced")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All identity cache tests passed!")
+    sys.exit(exit_code)
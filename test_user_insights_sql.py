@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Test script for SQL-computed /user-insights
+The endpoint reads total chats, active days and the first chat time from one
+aggregate query, matches the old row-loading numbers, and compiles to portable
+SQL on both SQLite and PostgreSQL.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('USE_GEMINI_API', 'false')
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import app, db, ChatHistory
+
+
+def _aggregate_query(user_id):
+    return db.session.query(
+        db.func.count(ChatHistory.id),
+        db.func.count(db.distinct(db.func.date(ChatHistory.timestamp))),
+        db.func.min(ChatHistory.timestamp)
+    ).filter(ChatHistory.user_id == user_id)
+
+
+def test_stats_match_legacy_computation(client_for, chat_user, legacy_insights):
+    """Aggregate stats equal the original Python computation"""
+    print("🧪 Testing insight stats parity")
+    user_id = chat_user('insights_parity', 500, chats_per_day=7)
+    client = client_for(user_id)
+    with app.app_context():
+        total, active_days, first_chat = legacy_insights(user_id)
+
+    data = client.get('/user-insights').get_json()
+    assert data['stats']['total_chats'] == total == 500
+    assert data['stats']['active_days'] == active_days == 72
+    expected = active_days / max(1, (datetime.now().date() - first_chat.date()).days) * 100
+    assert data['stats']['consistency'] == round(expected, 1)
+    print("   ✅ Totals, active days and consistency unchanged")
+
+
+def test_single_query_per_request(client_for, chat_user):
+    """/user-insights issues one statement against chat_history"""
+    user_id = chat_user('insights_queries', 30)
+    client = client_for(user_id)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        if 'chat_history' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        assert client.get('/user-insights').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert len(statements) == 1, statements
+    assert 'count(DISTINCT date(chat_history.timestamp))' in statements[0]
+    print("   ✅ One aggregate query")
+
+
+def test_user_without_chats_gets_tips(client_for, chat_user):
+    """Empty history keeps the onboarding response"""
+    user_id = chat_user('insights_empty', 0)
+    data = client_for(user_id).get('/user-insights').get_json()
+    assert 'tips' in data and 'stats' not in data
+    print("   ✅ Empty history handled")
+
+
+def test_query_is_portable():
+    """The aggregate compiles to the same plain SQL for SQLite and PostgreSQL"""
+    with app.app_context():
+        query = _aggregate_query(1)
+        for dialect in (sqlite.dialect(), postgresql.dialect()):
+            sql = str(query.statement.compile(dialect=dialect))
+            assert 'count(DISTINCT date(chat_history.timestamp))' in sql, sql
+            assert 'min(chat_history.timestamp)' in sql, sql
+    print("   ✅ Portable across SQLite and PostgreSQL")
+
+
+if __name__ == "__main__":
+    exit_code = pytest.main([__file__, '-q', '-s'])
+    if exit_code == 0:
+        print("🎉 All user insights tests passed!")
+    sys.exit(exit_code)